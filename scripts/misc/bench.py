@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# Time the optimised flux routines against their pure-Python fallbacks.
+# Usage: bench.py [nr_samples]
+
+import random, sys, time
+from array import array
+from bitarray import bitarray
+
+from greaseweazle import optimised
+from greaseweazle.codec import bitscan, codec
+from greaseweazle.codec.ibm import ibm
+from greaseweazle.flux import flux_histogram, resample_flux
+from greaseweazle.track import bitcells_to_flux
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    res = fn(*args)
+    return res, time.perf_counter() - start
+
+def without_optimised(names, fn, *args):
+    opts = { name: getattr(optimised, name) for name in names }
+    for name in names:
+        delattr(optimised, name)
+    try:
+        return timed(fn, *args)
+    finally:
+        for name, opt in opts.items():
+            setattr(optimised, name, opt)
+
+def bench(name, fn, *args, names=None):
+    names = names or [name]
+    if not all(hasattr(optimised, x) for x in names):
+        sys.exit('Optimised routines not available')
+    c, c_secs = timed(fn, *args)
+    py, py_secs = without_optimised(names, fn, *args)
+    assert c == py, f'{name}: Mismatched results'
+    print(f'{name:18s} C: {c_secs*1e3:8.1f}ms  Python: {py_secs*1e3:8.1f}ms'
+          f'  ({py_secs/c_secs:.1f}x)')
+
+def main(argv):
+    nr = int(argv[1]) if len(argv) > 1 else 1000000
+    random.seed(0)
+    # 2-8us flux at 25MHz, resampled to Greaseweazle F7 72MHz sample clock.
+    flux = array('d', [random.choice((50, 75, 100)) + random.random()
+                       for _ in range(nr)])
+    print(f'{nr} flux samples:')
+    bench('resample_flux', resample_flux, flux, 72/25)
+    bench('flux_histogram', flux_histogram, flux, 1/5, 600)
+    # MFM-like bitcells: One in three is set.
+    bits = bitarray([random.random() < 1/3 for _ in range(3*nr)],
+                    endian='big')
+    print(f'{len(bits)} bitcells:')
+    bench('bitcells_to_flux', bitcells_to_flux, bits, None)
+    bench('bitcells_to_flux', bitcells_to_flux, bits, [1.0]*len(bits))
+    bench('find_syncs', bitscan.find, bits, [ibm.mfm_iam_sync, ibm.mfm_sync])
+    # IBM MFM primitives, over the data of a 1.44MB disk.
+    dat = random.getrandbits(8*1474560).to_bytes(1474560, 'little')
+    print(f'{len(dat)} bytes (1.44MB disk):')
+    bench('encode_mfm', ibm.encode, dat)
+    bench('insert_mfm_clocks', ibm.mfm_encode, ibm.encode(dat))
+    bench('insert_fm_clocks', ibm.fm_encode, ibm.encode(dat))
+    bench('decode_mfm', ibm.decode, ibm.mfm_encode(ibm.encode(dat)))
+    ranges = [(off, 512) for off in range(0, len(dat), 512)]
+    bench('crc16_ccitt', sector_crcs, dat, ranges)
+    bench('crc16_ccitt_ranges', ibm.crc16_ccitt_ranges, dat, ranges)
+    bench('ibm.1440', ibm_disk, dat,
+          names=['encode_mfm', 'insert_mfm_clocks', 'decode_mfm',
+                 'crc16_ccitt'])
+
+def sector_crcs(dat, ranges):
+    """CRCs of each sector of a disk image, one at a time."""
+    return [ibm.crc16_ccitt(dat[off:off+n]) for off, n in ranges]
+
+def ibm_disk(dat):
+    """Encodes a 1.44MB disk image to bitcells, and decodes it again."""
+    disk = codec.get_diskdef('ibm.1440')
+    assert disk is not None
+    out, tsz = bytearray(), len(dat) // (disk.cyls * disk.heads)
+    for cyl in range(disk.cyls):
+        for head in range(disk.heads):
+            pos = (cyl*disk.heads + head) * tsz
+            t = disk.mk_track(cyl, head)
+            t.set_img_track(dat[pos:pos+tsz])
+            track = t.master_track()
+            t = disk.mk_track(cyl, head)
+            t.decode_flux(track)
+            out += t.get_img_track()
+    return bytes(out)
+
+if __name__ == "__main__":
+    main(sys.argv)
+
+# Local variables:
+# python-indent: 4
+# End:
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# Read a disk through usb.AsyncUnit, and write the decoded tracks to an image.
+# Usage: async_read.py <device> <format> <out_file>
+
+import asyncio, sys
+
+from greaseweazle import usb as USB
+from greaseweazle.codec import codec
+from greaseweazle.tools import util
+
+async def read_disk(unit: USB.AsyncUnit, fmt_cls, image) -> None:
+    await unit.set_bus_type(USB.BusType.IBMPC.value)
+    await unit.drive_select(0)
+    await unit.drive_motor(0, True)
+    try:
+        for t in fmt_cls.tracks:
+            await unit.seek(t.physical_cyl, t.physical_head)
+            flux = await unit.read_track(revs = 2)
+            dat = fmt_cls.decode_flux(t.cyl, t.head, flux)
+            if dat.nr_missing() != 0:
+                sys.exit(f'T{t.cyl}.{t.head}: {dat.nr_missing()} '
+                         'sectors missing')
+            image.emit_track(t.cyl, t.head, dat)
+    finally:
+        await unit.drive_motor(0, False)
+        await unit.drive_deselect()
+
+async def main(argv) -> None:
+    device, format, out_file = argv[1:]
+    fmt_cls = codec.get_diskdef(format)
+    image_class = util.get_image_class(out_file)
+    with image_class.to_file(out_file, fmt_cls, False, {}) as image:
+        async with USB.AsyncUnit(util.usb_open(device)) as unit:
+            await read_disk(unit, fmt_cls, image)
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv))
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# Check that the optimised C routines agree with their pure-Python fallbacks.
+# Usage: parity.py [seed]
+
+import random, sys
+from array import array
+from bitarray import bitarray
+
+from greaseweazle import optimised
+from greaseweazle.codec import bitscan, codec
+from greaseweazle.codec.ibm import ibm
+from greaseweazle.flux import resample_flux
+
+def without_optimised(names, fn, *args):
+    opts = { name: getattr(optimised, name) for name in names }
+    for name in names:
+        delattr(optimised, name)
+    try:
+        return fn(*args)
+    finally:
+        for name, opt in opts.items():
+            setattr(optimised, name, opt)
+
+nr_checks = 0
+
+def check(names, fn, *args):
+    global nr_checks
+    if not all(hasattr(optimised, x) for x in names):
+        sys.exit('Optimised routines not available')
+    c = fn(*args)
+    py = without_optimised(names, fn, *args)
+    if c != py:
+        sys.exit(f'{fn.__name__}{args!r:.200}: C {c!r:.200} != '
+                 f'Python {py!r:.200}')
+    nr_checks += 1
+
+def check_bitscan():
+    syncs = [ibm.mfm_iam_sync, ibm.mfm_sync, ibm.fm_sync_prefix]
+    # Embed sync marks among random bitcells, including at either end.
+    bits = bitarray(endian='big')
+    for _ in range(50):
+        bits += random.choice(syncs)
+        bits += bitarray([random.random() < 1/3
+                          for _ in range(random.randrange(100))])
+    bits += random.choice(syncs)
+    n = len(bits)
+    windows = [(0, None), (0, n), (1, n-1), (-10, None), (0, -10),
+               (-10, -5), (n, None), (n+10, n+20), (100, 50), (0, n+100),
+               (0, 0), (0, 64), (63, 128)]
+    windows += [(random.randrange(-10, n+10), random.randrange(-10, n+10))
+                for _ in range(100)]
+    for start, end in windows:
+        check(['find_syncs'], bitscan.find, bits, syncs, start, end)
+        check(['find_syncs'], bitscan.search, bits, syncs[0], start, end)
+    for offs, nbits in [(0, 0), (0, n), (1, 7), (n-3, 16), (-5, 20),
+                        (n+5, 8), (10, -1)]:
+        check(['extract_bits'], bitscan.extract, bits, offs, nbits)
+
+def check_mfm():
+    dat = random.getrandbits(8*1000).to_bytes(1000, 'little')
+    for d in [b'', dat[:1], dat]:
+        check(['encode_mfm'], ibm.encode, d)
+        check(['insert_mfm_clocks'], ibm.mfm_encode, ibm.encode(d))
+        check(['insert_fm_clocks'], ibm.fm_encode, ibm.encode(d))
+        check(['decode_mfm'], ibm.decode, ibm.mfm_encode(ibm.encode(d)))
+    # An odd number of bytes has no decode for the final byte.
+    check(['decode_mfm'], ibm.decode, dat[:999])
+
+def check_crc():
+    dat = random.getrandbits(8*4096).to_bytes(4096, 'little')
+    for d in [b'', dat[:1], dat[:3], dat]:
+        for crc in [0xffff, 0, 0xcdb4]:
+            check(['crc16_ccitt'], ibm.crc16_ccitt, d, crc)
+    ranges = [(0, 0), (0, 1), (0, 4096), (4095, 1), (4096, 0), (100, 3)]
+    ranges += [(off, 512) for off in range(0, 4096, 512)]
+    for crc in [0xffff, 0]:
+        check(['crc16_ccitt_ranges'], ibm.crc16_ccitt_ranges,
+              dat, ranges, crc)
+        check(['crc16_ccitt_ranges'], ibm.crc16_ccitt_ranges, dat, [], crc)
+
+def check_resample():
+    flux = array('d', [random.choice((50, 75, 100)) + random.random()
+                       for _ in range(10000)])
+    for factor in [72/25, 1.0, 0.5, 1/3]:
+        check(['resample_flux'], resample_flux, flux, factor)
+        check(['resample_flux'], resample_flux, list(flux[:100]), factor)
+    # Flux which rounds to zero, and multiples of the overflow period.
+    small = array('d', [random.random() * 2 for _ in range(1000)])
+    check(['resample_flux'], resample_flux, small, 1.0)
+    check(['resample_flux'], resample_flux, small, 1.0, 1)
+    check(['resample_flux'], resample_flux, flux, 0.5, 25)
+    check(['resample_flux'], resample_flux, flux, 72/25, 250)
+    check(['resample_flux'], resample_flux, [], 2.0, 250)
+
+def main(argv):
+    random.seed(int(argv[1]) if len(argv) > 1 else 0)
+    check_bitscan()
+    check_mfm()
+    check_crc()
+    check_resample()
+    print(f'{nr_checks} checks passed')
+
+if __name__ == "__main__":
+    main(sys.argv)
+
+# Local variables:
+# python-indent: 4
+# End:
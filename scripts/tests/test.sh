@@ -2,6 +2,9 @@ set -e
 
 GW="gw --bt"
 
+# Optimised C routines against their pure-Python fallbacks
+python3 scripts/tests/parity.py
+
 rm -rf .test
 mkdir -p .test
 pushd .test
@@ -14,6 +17,8 @@ $GW convert a.imd a2.hfe
 $GW convert --format=olivetti.m20 a1.hfe a1.img
 $GW convert --format=olivetti.m20 a2.hfe a2.img
 diff -u a1.img a2.img
+$GW convert --jobs=2 --format=olivetti.m20 a1.hfe a3.img
+diff -u a1.img a3.img
 # Punch padding holes in the original IMG before we diff
 for i in 1 3 5 7 9 11 13 15 17 19 21 23 25 27 29 31 ; do
     dd if=/dev/zero of=olivetti_m20.img bs=128 seek=$i count=1 conv=notrunc;
@@ -61,4 +66,28 @@ $GW convert a.fdi a.scp
 $GW convert --format=pc98.2hd a.scp b.img
 diff -u a.img b.img
 
+# Virtual device
+dd if=/dev/urandom of=v.img bs=1024 count=720
+$GW convert --format=ibm.720 v.img v.scp
+python3 ../scripts/tests/async_read.py virtual:v.scp ibm.720 v_async.img
+cmp v.img v_async.img
+$GW rpm --device=virtual:v.scp
+$GW read --device=virtual:v.scp --format=ibm.720 v_read.img
+cmp v.img v_read.img
+$GW read --device=virtual:v.scp --format=ibm.720 --pipeline v_pipe.img
+cmp v.img v_pipe.img
+$GW read --device=virtual:v.scp --format=ibm.720 --adaptive v_adapt.img
+cmp v.img v_adapt.img
+echo | $GW write --device=virtual:::out=v_write.scp --format=ibm.720 \
+    --copies=2 v.img
+$GW convert --format=ibm.720 v_write.scp v_write.img
+cmp v.img v_write.img
+$GW farm --device=virtual:v.scp --device=virtual:v_write.scp \
+    --format=ibm.720 v_farm_{}.img
+cmp v.img v_farm_0.img
+cmp v.img v_farm_1.img
+$GW --record=v.rec read --device=virtual:v.scp --format=ibm.720 v_rec.img
+$GW read --device=replay:v.rec --format=ibm.720 v_replay.img
+cmp v_rec.img v_replay.img
+
 popd
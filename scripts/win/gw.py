@@ -1,3 +1,4 @@
 from greaseweazle import cli
-import sys
+import sys, multiprocessing
+multiprocessing.freeze_support()
 sys.exit(cli.main())
@@ -30,8 +30,11 @@ setup(name = 'greaseweazle',
                     sources = ['src/greaseweazle/optimised/optimised.c',
                                'src/greaseweazle/optimised/apple_gcr_6a2.c',
                                'src/greaseweazle/optimised/apple2.c',
+                               'src/greaseweazle/optimised/bitscan.c',
                                'src/greaseweazle/optimised/c64.c',
+                               'src/greaseweazle/optimised/crc.c',
                                'src/greaseweazle/optimised/mac.c',
+                               'src/greaseweazle/optimised/mfm.c',
                                'src/greaseweazle/optimised/td0_lzss.c'],
                     extra_compile_args = extra_compile_args)
       ],
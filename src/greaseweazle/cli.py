@@ -14,6 +14,7 @@ from greaseweazle import __version__
 
 actions = [ 'info',
             'read',
+            'farm',
             'write',
             'convert',
             'erase',
@@ -28,8 +29,11 @@ actions = [ 'info',
             'align' ]
 
 def usage(argv):
-    print("Usage: %s [--time] [action] [-h] ..." % (argv[0]))
+    print("Usage: %s [--time] [--record=FILE] [action] [-h] ..." % (argv[0]))
     print("  --time      Print elapsed time after action is executed")
+    print("  --record=FILE")
+    print("              Record USB communications to FILE, for replay by "
+          "--device replay:FILE")
     print("  -h, --help  Show help message for specified action")
     print("Actions:")
     for a in actions:
@@ -57,6 +61,9 @@ def main():
             backtrace = True
         elif argv[1] == '--time':
             start_time = time.time()
+        elif argv[1].startswith('--record='):
+            from greaseweazle.tools import util
+            util.record_file = argv[1][9:]
         else:
             return usage(argv)
         argv = [argv[0]] + argv[2:]
@@ -87,6 +94,10 @@ def main():
 
     return res
 
+if __name__ == "__main__":
+    # Allows profiling, eg. python -m cProfile -m greaseweazle.cli ...
+    sys.exit(main())
+
 # Local variables:
 # python-indent: 4
 # End:
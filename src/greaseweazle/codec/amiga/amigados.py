@@ -12,7 +12,7 @@ import itertools as it
 from bitarray import bitarray
 
 from greaseweazle import error
-from greaseweazle.codec import codec
+from greaseweazle.codec import bitscan, codec
 from greaseweazle.codec.ibm import ibm
 from greaseweazle.track import MasterTrack, PLL, PLLTrack
 from greaseweazle.flux import Flux, HasFlux
@@ -81,15 +81,16 @@ class AmigaDOS(codec.Codec):
 
     def decode_flux(self, track: HasFlux, pll: Optional[PLL]=None) -> None:
         raw = PLLTrack(time_per_rev = self.time_per_rev,
-                       clock = self.clock, data = track, pll = pll)
-        bits, _ = raw.get_all_data()
+                       clock = self.clock, data = track, pll = pll,
+                       want_timing = False)
+        bits = raw.get_all_bits()
 
-        for offs in bits.search(sync):
+        for offs in bitscan.search(bits, sync):
 
             if self.nr_missing() == 0:
                 break
 
-            sec = bits[offs:offs+544*16].tobytes()
+            sec = bitscan.extract(bits, offs, 544*16)
             if len(sec) != 1088:
                 continue
 
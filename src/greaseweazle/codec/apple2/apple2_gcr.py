@@ -12,7 +12,7 @@ from bitarray import bitarray
 
 from greaseweazle import error
 from greaseweazle import optimised
-from greaseweazle.codec import codec
+from greaseweazle.codec import bitscan, codec
 from greaseweazle.track import MasterTrack, PLL, PLLTrack
 from greaseweazle.flux import Flux, HasFlux
 
@@ -95,17 +95,17 @@ class Apple2GCR(codec.Codec):
     def decode_flux(self, track: HasFlux, pll: Optional[PLL]=None) -> None:
         raw = PLLTrack(time_per_rev = self.time_per_rev,
                        clock = self.clock, data = track, pll = pll,
-                       lowpass_thresh = 2.5e-6)
-        bits, _ = raw.get_all_data()
+                       lowpass_thresh = 2.5e-6, want_timing = False)
+        bits = raw.get_all_bits()
 
-        for offs in bits.search(addr_sync):
+        for offs in bitscan.search(bits, addr_sync):
 
             if self.nr_missing() == 0:
                 break
 
             # Decode header
             offs += 3*8
-            sec = bits[offs:offs+8*8].tobytes()
+            sec = bitscan.extract(bits, offs, 8*8)
             if len(sec) != 8:
                 continue
             hdr = map(lambda x: (x & x>>7) & 255,
@@ -131,14 +131,14 @@ class Apple2GCR(codec.Codec):
 
             # Find data
             offs += 8*8
-            dat_offs = list(bits[offs:offs+100*8].search(data_sync))
+            dat_offs = bitscan.search(bits, data_sync, offs, offs+100*8)
             if len(dat_offs) != 1:
                 continue
-            offs += dat_offs[0]
+            offs = dat_offs[0]
 
             # Decode data
             sec, csum = optimised.decode_apple2_sector(
-                bits[offs+3*8:offs+400*8].tobytes())
+                bitscan.extract(bits, offs+3*8, 397*8))
             if csum != 0:
                 continue
 
@@ -40,7 +40,7 @@ class BitcellTrack(codec.Codec):
         if self.raw is None:
             s = "Raw Bitcell (empty)"
         else:
-            bits, _ = self.raw.get_revolution(0)
+            bits = self.raw.get_revolution_bits(0)
             s = ("Raw Bitcell (%d bits, %.2fms)"
                  % (len(bits), self.raw.time_per_rev*1000))
         return s
@@ -64,7 +64,8 @@ class BitcellTrack(codec.Codec):
         if time_per_rev is None:
             time_per_rev = flux.time_per_rev
         self.raw = PLLTrack(time_per_rev = time_per_rev,
-                            clock = self.clock, data = flux, pll = pll)
+                            clock = self.clock, data = flux, pll = pll,
+                            want_timing = False)
 
     def master_track(self) -> MasterTrack:
         if self.raw is None:
@@ -74,7 +75,7 @@ class BitcellTrack(codec.Codec):
                                 weak = [(0,nbytes*8)])
             track.force_random_weak = True
             return track
-        bits, _ = self.raw.get_revolution(0)
+        bits = self.raw.get_revolution_bits(0)
         track = MasterTrack(bits = bits, time_per_rev = self.time_per_rev)
         return track
 
@@ -0,0 +1,58 @@
+# greaseweazle/codec/bitscan.py
+#
+# Sync-pattern scanning and byte extraction over bitcell streams.
+#
+# Written & released by Keir Fraser <keir.xen@gmail.com>
+#
+# This is free and unencumbered software released into the public domain.
+# See the file COPYING for more details, or visit <http://unlicense.org>.
+
+from typing import List, Optional, Sequence, Tuple
+
+import heapq
+from bitarray import bitarray
+
+from greaseweazle import optimised
+
+## find:
+## Finds all occurrences of each of @patterns lying wholly within
+## bits[start:end], in a single pass over the bitcell stream. Returns
+## (offset, pattern index) tuples, in order of offset.
+def find(bits: bitarray, patterns: Sequence[bitarray],
+         start: int = 0, end: Optional[int] = None
+         ) -> List[Tuple[int, int]]:
+    start = min(max(start, 0), len(bits))
+    end = len(bits) if end is None else min(max(end, start), len(bits))
+    if bits.endian == 'big':
+        try:
+            return optimised.find_syncs(
+                bits, [(int(p.to01(), 2), len(p)) for p in patterns],
+                start, end)
+        except AttributeError:
+            pass
+    window = bits[start:end]
+    return list(heapq.merge(*[[(offs+start, i) for offs in window.search(p)]
+                              for i, p in enumerate(patterns)]))
+
+## search:
+## Offsets of all occurrences of @pattern lying wholly within bits[start:end].
+def search(bits: bitarray, pattern: bitarray,
+           start: int = 0, end: Optional[int] = None) -> List[int]:
+    return [offs for offs, _ in find(bits, [pattern], start, end)]
+
+## extract:
+## Equivalent to bits[offs:offs+nbits].tobytes(), but copies directly from
+## the bitcell stream, without creating an intermediate bitarray.
+def extract(bits: bitarray, offs: int, nbits: int) -> bytes:
+    offs = min(max(offs, 0), len(bits))
+    nbits = min(max(nbits, 0), len(bits) - offs)
+    if bits.endian == 'big':
+        try:
+            return optimised.extract_bits(bits, offs, nbits)
+        except AttributeError:
+            pass
+    return bits[offs:offs+nbits].tobytes()
+
+# Local variables:
+# python-indent: 4
+# End:
@@ -12,7 +12,7 @@ from bitarray import bitarray
 
 from greaseweazle import error
 from greaseweazle import optimised
-from greaseweazle.codec import codec
+from greaseweazle.codec import bitscan, codec
 from greaseweazle.track import MasterTrack, PLL, PLLTrack
 from greaseweazle.flux import Flux, HasFlux
 
@@ -91,10 +91,10 @@ class C64GCR(codec.Codec):
     def decode_flux(self, track: HasFlux, pll: Optional[PLL]=None) -> None:
         raw = PLLTrack(time_per_rev = self.time_per_rev,
                        clock = self.clock, data = track, pll = pll,
-                       lowpass_thresh = 2.5e-6)
-        bits, _ = raw.get_all_data()
+                       lowpass_thresh = 2.5e-6, want_timing = False)
+        bits = raw.get_all_bits()
 
-        for offs in bits.search(sector_sync):
+        for offs in bitscan.search(bits, sector_sync):
 
             if self.nr_missing() == 0:
                 break
@@ -102,7 +102,7 @@ class C64GCR(codec.Codec):
             # Decode header, 8 bytes (=10 bytes GCR):
             # 0x08, csum, sector, track, disk_id[2], gap[2]
             offs += 10
-            sec = bits[offs:offs+10*8].tobytes()
+            sec = bitscan.extract(bits, offs, 10*8)
             if len(sec) != 10:
                 continue
             hdr = optimised.decode_c64_gcr(sec)
@@ -128,15 +128,15 @@ class C64GCR(codec.Codec):
 
             # Find data
             offs += 8*8
-            dat_offs = list(bits[offs:offs+100*8].search(data_sync))
+            dat_offs = bitscan.search(bits, data_sync, offs, offs+100*8)
             if len(dat_offs) != 1:
                 continue
-            offs += dat_offs[0]
+            offs = dat_offs[0]
 
             # Decode data, 260 bytes (=325 bytes GCR):
             # 0x07, data[256], csum, gap[2]
             offs += 10
-            sec = bits[offs:offs+260*10].tobytes()
+            sec = bitscan.extract(bits, offs, 260*10)
             if len(sec) != 325:
                 continue
             sec = optimised.decode_c64_gcr(sec)
@@ -15,7 +15,7 @@ import itertools as it
 from enum import Enum
 
 from greaseweazle import error
-from greaseweazle.codec import codec
+from greaseweazle.codec import bitscan, codec
 from greaseweazle.codec.ibm.ibm import decode, encode, fm_encode
 from greaseweazle.track import MasterTrack, PLL, PLLTrack
 from greaseweazle.flux import HasFlux
@@ -88,14 +88,15 @@ class DataGeneral(codec.Codec):
             flux.identify_hard_sectors()
         flux.cue_at_index()
         raw = PLLTrack(time_per_rev = self.time_per_rev,
-                       clock = self.clock, data = flux, pll = pll)
+                       clock = self.clock, data = flux, pll = pll,
+                       want_timing = False)
 
         for rev in range(len(raw.revolutions)):
 
             if self.nr_missing() == 0:
                 break
 
-            bits, _ = raw.get_revolution(rev)
+            bits = raw.get_revolution_bits(rev)
 
             hardsector_bits = raw.revolutions[rev].hardsector_bits
             if hardsector_bits is not None:
@@ -117,14 +118,14 @@ class DataGeneral(codec.Codec):
                 # Skip first 352 cells (704us), see Figure G-1
                 s += 352
 
-                offs = bits[s:e].search(sync)
-                if (off := next(offs, None)) is None:
+                offs = bitscan.search(bits, sync, s, e)
+                if not offs:
                     continue
-                off += 2*16
+                off = offs[0] - s + 2*16
                 h_off = off
 
                 # Read and check the preamble
-                preamble = decode(bits[s+off:s+off+2*16].tobytes())
+                preamble = decode(bitscan.extract(bits, s+off, 2*16))
                 if len(preamble) != 2:
                     continue
                 cyl = preamble[0] & 0x7F
@@ -138,13 +139,13 @@ class DataGeneral(codec.Codec):
 
                 # Skip 40 cells (80us) past the preamble word
                 d_off = off + 2*16 + 40
-                offs = bits[s+d_off:e].search(sync)
-                if (off := next(offs, None)) is None:
+                offs = bitscan.search(bits, sync, s+d_off, e)
+                if not offs:
                     continue
-                off += d_off + 2*16
+                off = offs[0] - s + 2*16
 
                 # Read and checksum the data
-                data = decode(bits[s+off:s+off+514*16].tobytes())
+                data = decode(bitscan.extract(bits, s+off, 514*16))
                 if len(data) != 514:
                     continue
                 read_csum = int.from_bytes(data[512:], 'big')
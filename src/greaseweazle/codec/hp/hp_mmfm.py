@@ -26,11 +26,11 @@ from typing import List, Optional
 
 import struct
 from bitarray import bitarray
-import crcmod.predefined
 
 from greaseweazle import error
-from greaseweazle.codec import codec
+from greaseweazle.codec import bitscan, codec
 from greaseweazle.codec.ibm.ibm import decode, encode, sec_map
+from greaseweazle.codec.ibm.ibm import crc16_ccitt
 from greaseweazle.track import MasterTrack, PLL, PLLTrack
 from greaseweazle.flux import HasFlux
 
@@ -50,7 +50,6 @@ sector_sync.frombytes(sector_sync_bytes)
 data_sync = bitarray(endian='big')
 data_sync.frombytes(data_sync_bytes)
 
-crc16 = crcmod.predefined.Crc('crc-ccitt-false')
 
 rev_list = bytearray()
 for x in range(256):
@@ -133,19 +132,20 @@ class HPMMFM(codec.Codec):
 
     def decode_flux(self, track: HasFlux, pll: Optional[PLL]=None) -> None:
         raw = PLLTrack(time_per_rev = self.time_per_rev,
-                       clock = self.clock, data = track, pll = pll)
-        bits, _ = raw.get_all_data()
+                       clock = self.clock, data = track, pll = pll,
+                       want_timing = False)
+        bits = raw.get_all_bits()
 
-        for offs in bits.search(sector_sync):
+        for offs in bitscan.search(bits, sector_sync):
 
             if self.nr_missing() == 0:
                 break
 
             offs += 2*16
-            idam = decode(bits[offs:offs+4*16].tobytes())
+            idam = decode(bitscan.extract(bits, offs, 4*16))
             if len(idam) != 4:
                 continue
-            if crc16.new(idam).crcValue != 0:
+            if crc16_ccitt(idam) != 0:
                 continue
             cyl = bitrev(idam[0])
             sec_id = bitrev(idam[1])
@@ -160,15 +160,15 @@ class HPMMFM(codec.Codec):
 
             # Find data
             offs += 8*16
-            dat_offs = list(bits[offs:offs+50*16].search(data_sync))
+            dat_offs = bitscan.search(bits, data_sync, offs, offs+50*16)
             if len(dat_offs) != 1:
                 continue
-            offs += dat_offs[0] + 2*16
+            offs = dat_offs[0] + 2*16
 
-            sec = decode(bits[offs:offs+258*16].tobytes())
+            sec = decode(bitscan.extract(bits, offs, 258*16))
             if len(sec) != 258:
                 continue
-            if crc16.new(sec).crcValue != 0:
+            if crc16_ccitt(sec) != 0:
                 continue
 
             # bit swap, and byte swap
@@ -192,14 +192,14 @@ class HPMMFM(codec.Codec):
             t += encode(bytes([0xff]*3)) + sector_sync_bytes
             idam = bytes(map(lambda x: bitrev(x),
                              [self.cyl, sec_id | (self.head << 7)]))
-            idam += struct.pack('>H', crc16.new(idam).crcValue)
+            idam += struct.pack('>H', crc16_ccitt(idam))
             t += encode(idam)
             t += encode(bytes(1 + 16 + 4))
             # Data
             t += encode(bytes([0xff]*3)) + data_sync_bytes
             data = struct.pack('<128H', *struct.unpack('>128H', data))
             data = bytes(map(lambda x: bitrev(x), data))
-            data += struct.pack('>H', crc16.new(data).crcValue)
+            data += struct.pack('>H', crc16_ccitt(data))
             t += encode(data)
             t += encode(bytes(1 + 34 + 4))
 
@@ -6,7 +6,8 @@
 # See the file COPYING for more details, or visit <http://unlicense.org>.
 
 from __future__ import annotations
-from typing import Any, List, Optional, Union, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+from typing import Tuple, TypeVar
 
 import re
 import copy, heapq, struct, functools
@@ -15,8 +16,8 @@ from bitarray import bitarray
 from enum import Enum
 import crcmod.predefined
 
-from greaseweazle import error
-from greaseweazle.codec import codec
+from greaseweazle import error, optimised
+from greaseweazle.codec import bitscan, codec
 from greaseweazle.track import MasterTrack, PLL, PLLTrack
 from greaseweazle.flux import Flux, HasFlux
 
@@ -48,6 +49,10 @@ mfm_sync = bitarray(endian='big')
 mfm_sync.frombytes(mfm_sync_bytes)
 
 def fm_encode(dat):
+    try:
+        return optimised.insert_fm_clocks(dat)
+    except AttributeError:
+        pass
     out = bytearray()
     for x in dat:
         if (x & 0xaa) == 0:
@@ -56,6 +61,10 @@ def fm_encode(dat):
     return bytes(out)
 
 def mfm_encode(dat):
+    try:
+        return optimised.insert_mfm_clocks(dat)
+    except AttributeError:
+        pass
     y = 0
     out = bytearray()
     for x in dat:
@@ -75,6 +84,10 @@ for x in range(256):
     encode_list.append(y)
 
 def encode(dat):
+    try:
+        return optimised.encode_mfm(dat)
+    except AttributeError:
+        pass
     out = bytearray()
     for x in dat:
         out += struct.pack('>H', encode_list[x])
@@ -90,12 +103,33 @@ for x in range(0x5556):
     decode_list[index] = y
 
 def decode(dat):
+    try:
+        return optimised.decode_mfm(dat)
+    except AttributeError:
+        pass
     out = bytearray()
     for x,y in zip(dat[::2], dat[1::2]):
         out.append(decode_list[((x<<8)|y)&0x5555])
     return bytes(out)
 
-crc16 = crcmod.predefined.Crc('crc-ccitt-false')
+_crc16 = crcmod.predefined.mkPredefinedCrcFun('crc-ccitt-false')
+
+def crc16_ccitt(dat, crc: int = 0xffff) -> int:
+    try:
+        return optimised.crc16_ccitt(dat, crc)
+    except AttributeError:
+        pass
+    return _crc16(bytes(dat), crc)
+
+# CRCs of the (offset, length) ranges within a single buffer.
+def crc16_ccitt_ranges(dat, ranges: Iterable[Tuple[int, int]],
+                       crc: int = 0xffff) -> List[int]:
+    try:
+        return optimised.crc16_ccitt_ranges(dat, ranges, crc)
+    except AttributeError:
+        pass
+    dat = bytes(dat)
+    return [_crc16(dat[o:o+n], crc) for o,n in ranges]
 
 # Create logical sector map in rotational order
 def sec_map(nsec: int, interleave: int, cskew: int, hskew: int,
@@ -224,6 +258,51 @@ class IAM(TrackArea):
     def __copy__(self):
         return IAM(self.start, self.end)
 
+## CRCChecker:
+## Collects the decoded bytes of IDAMs and DAMs found during a track scan,
+## and fills in all their CRCs with a single call to crc16_ccitt_ranges().
+class CRCChecker:
+    def __init__(self) -> None:
+        self.dat = bytearray()
+        self.ranges: List[Tuple[int, int]] = []
+        self.areas: List[TrackArea] = []
+    def add(self, area: TrackArea, dat: bytes) -> None:
+        self.ranges.append((len(self.dat), len(dat)))
+        self.dat += dat
+        self.areas.append(area)
+    def check(self, areas: List[TrackArea]) -> None:
+        for a, crc in zip(self.areas, crc16_ccitt_ranges(self.dat,
+                                                         self.ranges)):
+            a.crc = crc
+        for a in areas:
+            if isinstance(a, Sector):
+                a.crc = a.idam.crc | a.dam.crc
+
+
+AreaT = TypeVar('AreaT', bound=TrackArea)
+
+# Merge @new track areas into the deduplicated list @areas. An area less than
+# 1000 bitcells from an existing area duplicates the first such area in
+# @areas, which it replaces if replace(existing, new). Areas are indexed by
+# 1000-bitcell bucket, so only the neighbouring buckets need be searched.
+def merge_areas(areas: List[AreaT], new: Iterable[AreaT],
+                replace: Callable[[AreaT, AreaT], bool]) -> None:
+    buckets: Dict[int, List[int]] = dict()
+    for i, x in enumerate(areas):
+        buckets.setdefault(x.start // 1000, []).append(i)
+    for a in new:
+        b = a.start // 1000
+        dupes = [i for k in (b-1, b, b+1) for i in buckets.get(k, [])
+                 if abs(areas[i].start - a.start) < 1000]
+        if not dupes:
+            buckets.setdefault(b, []).append(len(areas))
+            areas.append(a)
+            continue
+        i = min(dupes)
+        if replace(areas[i], a):
+            buckets[areas[i].start // 1000].remove(i)
+            buckets.setdefault(b, []).append(i)
+            areas[i] = a
 
 class DEC_MMFM:
     def __init__(self):
@@ -353,7 +432,7 @@ class IBMTrack(codec.Codec):
                 t += mfm_sync_bytes
                 idam = bytes([0xa1, 0xa1, 0xa1, Mark.IDAM,
                               a.idam.c, a.idam.h, a.idam.r, a.idam.n])
-                idam += struct.pack('>H', crc16.new(idam).crcValue)
+                idam += struct.pack('>H', crc16_ccitt(idam))
                 t += encode(idam[3:])
                 start = a.dam.start//16 - self.gap_presync
                 gap = max(start - len(t)//2, 0)
@@ -361,7 +440,7 @@ class IBMTrack(codec.Codec):
                 t += encode(bytes(self.gap_presync))
                 t += mfm_sync_bytes
                 dam = bytes([0xa1, 0xa1, 0xa1, a.dam.mark]) + a.dam.data
-                dam += struct.pack('>H', crc16.new(dam).crcValue)
+                dam += struct.pack('>H', crc16_ccitt(dam))
                 t += encode(dam[3:])
 
         return t
@@ -381,14 +460,14 @@ class IBMTrack(codec.Codec):
             elif isinstance(a, Sector):
                 idam = bytes([Mark.IDAM,
                               a.idam.c, a.idam.h, a.idam.r, a.idam.n])
-                idam += struct.pack('>H', crc16.new(idam).crcValue)
+                idam += struct.pack('>H', crc16_ccitt(idam))
                 t += sync(idam[0]) + encode(idam[1:])
                 start = a.dam.start//16 - self.gap_presync
                 gap = max(start - len(t)//2, 0)
                 t += encode(bytes([self.gapbyte] * gap))
                 t += encode(bytes(self.gap_presync))
                 dam = bytes([a.dam.mark]) + a.dam.data
-                dam += struct.pack('>H', crc16.new(dam).crcValue)
+                dam += struct.pack('>H', crc16_ccitt(dam))
                 t += sync(dam[0])
                 if ((dam[0] & 0xfb) == Mark.DDAM_DEC_MMFM
                     and mmfm_areas is not None):
@@ -442,34 +521,31 @@ class IBMTrack(codec.Codec):
     @staticmethod
     def mfm_decode_raw(raw: PLLTrack) -> List[TrackArea]:
 
-        bits, _ = raw.get_all_data()
+        bits = raw.get_all_bits()
         areas: List[TrackArea] = []
+        crcs = CRCChecker()
         idam = None
 
         ## 1. Calculate offsets within dump
         
-        for offs in bits.search(mfm_iam_sync):
-            if len(bits) < offs+4*16:
-                continue
-            mark = decode(bits[offs+3*16:offs+4*16].tobytes())[0]
-            if mark == Mark.IAM:
-                areas.append(IAM(offs, offs+4*16))
-
-        for offs in bits.search(mfm_sync):
+        for offs, is_sync in bitscan.find(bits, [mfm_iam_sync, mfm_sync]):
 
             if len(bits) < offs+4*16:
                 continue
-            mark = decode(bits[offs+3*16:offs+4*16].tobytes())[0]
-            if mark == Mark.IDAM:
+            mark = decode(bitscan.extract(bits, offs+3*16, 16))[0]
+            if not is_sync:
+                if mark == Mark.IAM:
+                    areas.append(IAM(offs, offs+4*16))
+            elif mark == Mark.IDAM:
                 s, e = offs, offs+10*16
                 if len(bits) < e:
                     continue
-                b = decode(bits[s:e].tobytes())
+                b = decode(bitscan.extract(bits, s, e-s))
                 c,h,r,n = struct.unpack(">4x4B2x", b)
-                crc = crc16.new(b).crcValue
                 if idam is not None:
                     areas.append(idam)
-                idam = IDAM(s, e, crc, c=c, h=h, r=r, n=n)
+                idam = IDAM(s, e, 0, c=c, h=h, r=r, n=n)
+                crcs.add(idam, b)
             elif mark == Mark.DAM or mark == Mark.DDAM:
                 if idam is None or offs - idam.end > 1000:
                     areas.append(DAM(offs, offs+4*16, 0xffff, mark=mark))
@@ -478,9 +554,9 @@ class IBMTrack(codec.Codec):
                     s, e = offs, offs+(4+sz+2)*16
                     if len(bits) < e:
                         continue
-                    b = decode(bits[s:e].tobytes())
-                    crc = crc16.new(b).crcValue
-                    dam = DAM(s, e, crc, mark=mark, data=b[4:-2])
+                    b = decode(bitscan.extract(bits, s, e-s))
+                    dam = DAM(s, e, 0, mark=mark, data=b[4:-2])
+                    crcs.add(dam, b)
                     areas.append(Sector(idam, dam))
                 idam = None
             else:
@@ -489,6 +565,10 @@ class IBMTrack(codec.Codec):
         if idam is not None:
             areas.append(idam)
 
+        ## 2. Check CRCs of all IDAMs and DAMs together
+
+        crcs.check(areas)
+
         # Convert to offsets within track
         areas.sort(key=lambda x:x.start)
         index = iter([x.nr_bits for x in raw.revolutions])
@@ -509,11 +589,13 @@ class IBMTrack(codec.Codec):
     def fm_decode_raw(raw: PLLTrack,
                       mmfm_raw: Optional[PLLTrack] = None) -> List[TrackArea]:
 
-        bits, times = raw.get_all_data()
+        bits = raw.get_all_bits()
         areas: List[TrackArea] = []
+        crcs = CRCChecker()
         idam = None
 
         if mmfm_raw is not None:
+            times = raw.timearray
             mmfm_bits, mmfm_times = mmfm_raw.get_all_data()
             mmfm_iter = mmfm_bits.search(dec_mmfm.sync_prefix)
             mmfm_offs = next(mmfm_iter, None)
@@ -522,11 +604,12 @@ class IBMTrack(codec.Codec):
 
         ## 1. Calculate offsets within dump
         
-        for offs in bits.search(fm_iam_sync):
-            offs += 16
-            areas.append(IAM(offs, offs+1*16))
+        for offs, is_sync in bitscan.find(bits, [fm_iam_sync, fm_sync_prefix]):
 
-        for offs in bits.search(fm_sync_prefix):
+            if not is_sync:
+                offs += 16
+                areas.append(IAM(offs, offs+1*16))
+                continue
 
             # DEC MMFM track: Ensure this looks like an FM mark even at
             # double rate. This also finds the equivalent point in the
@@ -548,20 +631,20 @@ class IBMTrack(codec.Codec):
             offs += 16
             if len(bits) < offs+1*16:
                 continue
-            mark = decode(bits[offs:offs+1*16].tobytes())[0]
-            clock = decode(bits[offs-1:offs+1*16-1].tobytes())[0]
+            mark = decode(bitscan.extract(bits, offs, 16))[0]
+            clock = decode(bitscan.extract(bits, offs-1, 16))[0]
             if clock != 0xc7:
                 continue
             if mark == Mark.IDAM:
                 s, e = offs, offs+7*16
                 if len(bits) < e:
                     continue
-                b = decode(bits[s:e].tobytes())
+                b = decode(bitscan.extract(bits, s, e-s))
                 c,h,r,n = struct.unpack(">x4B2x", b)
-                crc = crc16.new(b).crcValue
                 if idam is not None:
                     areas.append(idam)
-                idam = IDAM(s, e, crc, c=c, h=h, r=r, n=n)
+                idam = IDAM(s, e, 0, c=c, h=h, r=r, n=n)
+                crcs.add(idam, b)
             elif (mark == Mark.DAM or mark == Mark.DDAM
                   or mark == Mark.DAM_TRS80_DIR
                   or ((mark & 0xfb) == Mark.DDAM_DEC_MMFM
@@ -574,15 +657,15 @@ class IBMTrack(codec.Codec):
                 if (mark & 0xfb) != Mark.DDAM_DEC_MMFM:
                     if len(bits) < e:
                         continue
-                    b = decode(bits[s:e].tobytes())
+                    b = decode(bitscan.extract(bits, s, e-s))
                 else:
                     assert mmfm_offs is not None
                     ds, de = mmfm_offs+64+1, mmfm_offs+64+1+(sz*2+2)*16
                     if len(mmfm_bits) < de:
                         continue
                     b = bytes([mark]) + dec_mmfm.decode(mmfm_bits[ds:de])
-                crc = crc16.new(b).crcValue
-                dam = DAM(s, e, crc, mark=mark, data=b[1:-2])
+                dam = DAM(s, e, 0, mark=mark, data=b[1:-2])
+                crcs.add(dam, b)
                 areas.append(Sector(idam, dam))
                 idam = None
             else:
@@ -591,6 +674,10 @@ class IBMTrack(codec.Codec):
         if idam is not None:
             areas.append(idam)
 
+        ## 2. Check CRCs of all IDAMs and DAMs together
+
+        crcs.check(areas)
+
         # Convert to offsets within track
         areas.sort(key=lambda x:x.start)
         index = iter([x.nr_bits for x in raw.revolutions])
@@ -610,8 +697,10 @@ class IBMTrack(codec.Codec):
     def decode_flux(self, track: HasFlux, pll: Optional[PLL]=None) -> None:
         flux = track.flux()
         flux.cue_at_index()
+        # Bitcell timings are needed only to align DEC MMFM with FM.
         raw = PLLTrack(time_per_rev = self.time_per_rev,
-                       clock = self.clock, data = flux, pll = pll)
+                       clock = self.clock, data = flux, pll = pll,
+                       want_timing = self.mode is Mode.DEC_RX02)
         self.decode_raw(raw, pll, flux)
 
     def decode_raw(self, raw: PLLTrack, pll: Optional[PLL],
@@ -627,22 +716,10 @@ class IBMTrack(codec.Codec):
             areas = self.fm_decode_raw(raw, mmfm_raw)
 
         # Add to the deduped lists
-        for a in areas:
-            dupe = False
-            if isinstance(a, IAM):
-                for iam in self.iams:
-                    if dupe := abs(iam.start - a.start) < 1000:
-                        break
-                if not dupe:
-                    self.iams.append(a)
-            elif isinstance(a, Sector):
-                for i, sec in enumerate(self.sectors):
-                    if dupe := abs(sec.start - a.start) < 1000:
-                        if sec.crc != 0 and a.crc == 0:
-                            self.sectors[i] = a
-                        break
-                if not dupe:
-                    self.sectors.append(a)
+        merge_areas(self.iams, [a for a in areas if isinstance(a, IAM)],
+                    lambda old, new: False)
+        merge_areas(self.sectors, [a for a in areas if isinstance(a, Sector)],
+                    lambda old, new: old.crc != 0 and new.crc == 0)
         self.iams.sort(key=lambda x:x.start)
         self.sectors.sort(key=lambda x:x.start)
 
@@ -658,24 +735,24 @@ class IBMTrack_Fixed(IBMTrack):
         self.raw.clock = self.clock
         self.raw.time_per_rev = self.time_per_rev
         self.raw.decode_flux(track, pll)
+        sectors: Dict[Tuple[int,int,int,int], List[Sector]] = dict()
+        for s in self.sectors:
+            idam = (s.idam.c, s.idam.h, s.idam.r, s.idam.n)
+            sectors.setdefault(idam, []).append(s)
         mismatches = set()
         for r in self.raw.sectors:
             if r.idam.crc != 0:
                 continue
-            matched = False
-            for s in self.sectors:
-                if (s.idam.c == r.idam.c and
-                    s.idam.h == r.idam.h and
-                    s.idam.r == r.idam.r and
-                    s.idam.n == r.idam.n):
-                    s.idam.crc = 0
-                    matched = True
-                    if r.dam.crc == 0 and s.dam.crc != 0:
-                        s.dam.crc = s.crc = 0
-                        s.dam.data = r.dam.data
-                        s.dam.mark = r.dam.mark
-            if not matched:
-                mismatches.add((r.idam.c, r.idam.h, r.idam.r, r.idam.n))
+            idam = (r.idam.c, r.idam.h, r.idam.r, r.idam.n)
+            if idam not in sectors:
+                mismatches.add(idam)
+                continue
+            for s in sectors[idam]:
+                s.idam.crc = 0
+                if r.dam.crc == 0 and s.dam.crc != 0:
+                    s.dam.crc = s.crc = 0
+                    s.dam.data = r.dam.data
+                    s.dam.mark = r.dam.mark
         for m in mismatches:
             print('T%d.%d: Ignoring unexpected sector C:%d H:%d R:%d N:%d'
                   % (self.cyl, self.head, *m))
@@ -905,6 +982,16 @@ class IBMTrack_Scan(codec.Codec):
     RATES = [ 125, 250, 500 ]
     RPMS = [ 300, 360 ]
     BEST_GUESS = None
+
+    # Flux histogram: 50ns bins up to 30us (beyond 4 bitcells of MFM at
+    # 125kbps, as read by a drive 20% slower than the disk was written).
+    HIST_BIN = 50e-9
+    HIST_BINS = 600
+    # Minimum proportion of flux explained by a plausible candidate.
+    MIN_SCORE = 0.5
+    # Once a candidate finds sectors, later candidates are tried only if
+    # they score at least this fraction of its score.
+    CLOSE_SCORE = 0.9
     
     def __init__(self, cyl: int, head: int, config: IBMTrack_ScanDef):
         self.cyl, self.head = cyl, head
@@ -933,6 +1020,38 @@ class IBMTrack_Scan(codec.Codec):
     def get_img_track(self) -> bytearray:
         return self.track.get_img_track()
 
+    @classmethod
+    def rank_candidates(cls, flux: Flux, rpms: List[int], rates: List[int]
+                        ) -> List[Tuple[float, int, int, Mode]]:
+        """Returns the (score, rpm, rate, mode) combinations which plausibly
+        explain the flux timings, best first. Each is scored by the
+        proportion of flux lying within a quarter bitcell of the expected
+        intervals: 1 or 2 bitcells (FM), or 2, 3 or 4 bitcells (MFM)."""
+        hist = flux.histogram(cls.HIST_BIN, cls.HIST_BINS)
+        total = len(flux.list)
+        if total == 0:
+            return []
+        def count(t: float, tol: float) -> int:
+            lo = max(round((t - tol) / cls.HIST_BIN), 0)
+            hi = max(round((t + tol) / cls.HIST_BIN), 0)
+            return sum(hist[lo:hi])
+        candidates = []
+        for rpm in rpms:
+            # Bitcell timings scale with the rotational speed of the drive.
+            factor = flux.time_per_rev * rpm / 60
+            for rate in rates:
+                clock = 5e-4 / rate * factor
+                for mode, cells in [(Mode.MFM, [2,3,4]), (Mode.FM, [1,2])]:
+                    counts = [count(n*clock, clock/4) for n in cells]
+                    # FM never produces 3-bitcell intervals.
+                    if mode is Mode.MFM and counts[1] < total * 0.005:
+                        continue
+                    score = sum(counts) / total
+                    if score >= cls.MIN_SCORE:
+                        candidates.append((score, rpm, rate, mode))
+        candidates.sort(key = lambda x: x[0], reverse = True)
+        return candidates
+
     def decode_flux(self, track: HasFlux, pll: Optional[PLL]=None) -> None:
 
         # Add more data to an existing track instance?
@@ -957,20 +1076,47 @@ class IBMTrack_Scan(codec.Codec):
         flux = track.flux()
         flux.cue_at_index()
 
-        # Scan at various rates & modes to find at least one sector
-        for rpm in rpms:
-            time_per_rev = 60 / rpm
-            for rate in rates:
-                clock = 5e-4 / rate
+        # Try the rpms, rates & modes which best explain the flux timings.
+        # If none is plausible, there is no data on this track to find.
+        ranked = self.rank_candidates(flux, rpms, rates)
+        if not ranked:
+            return
+
+        raws: Dict[Tuple[int, int], PLLTrack] = dict()
+        def decode(rpm: int, rate: int, mode: Mode) -> None:
+            time_per_rev, clock = 60 / rpm, 5e-4 / rate
+            raw = raws.get((rpm, rate))
+            if raw is None:
                 raw = PLLTrack(time_per_rev = time_per_rev,
-                               clock = clock, data = flux, pll = pll)
-                for mode in [Mode.MFM, Mode.FM]:
-                    t = IBMTrack(self.cyl, self.head, mode)
-                    t.clock, t.time_per_rev = clock, time_per_rev
-                    t.decode_raw(raw, pll, flux)
-                    if ((t.nsec - t.nr_missing())
-                        > (self.track.nsec - self.track.nr_missing())):
-                        self.track = t
+                               clock = clock, data = flux, pll = pll,
+                               want_timing = False)
+                raws[rpm, rate] = raw
+            t = IBMTrack(self.cyl, self.head, mode)
+            t.clock, t.time_per_rev = clock, time_per_rev
+            t.decode_raw(raw, pll, flux)
+            if ((t.nsec - t.nr_missing())
+                > (self.track.nsec - self.track.nr_missing())):
+                self.track = t
+
+        # Stop at the first candidate which finds sectors, unless others
+        # score nearly as well. Of those, keep the one finding most sectors.
+        found = None
+        for score, rpm, rate, mode in ranked:
+            if found is not None and score < found * self.CLOSE_SCORE:
+                break
+            decode(rpm, rate, mode)
+            if found is None and not isinstance(self.track, IBMTrack_Empty):
+                found = score
+            # Perfect match, no missing sectors?
+            if self.track.nsec != 0 and self.track.nr_missing() == 0:
+                break
+
+        # If no plausible candidate finds a sector, try all the rest.
+        if found is None:
+            tried = [(rpm, rate, mode) for _, rpm, rate, mode in ranked]
+            for c in it.product(rpms, rates, [Mode.MFM, Mode.FM]):
+                if c not in tried:
+                    decode(*c)
 
         # If we found a match, remember it as a best guess for the next track.
         if not isinstance(self.track, IBMTrack_Empty):
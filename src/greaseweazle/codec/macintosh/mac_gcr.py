@@ -18,7 +18,7 @@ from bitarray import bitarray
 
 from greaseweazle import error
 from greaseweazle import optimised
-from greaseweazle.codec import codec
+from greaseweazle.codec import bitscan, codec
 from greaseweazle.codec.ibm import ibm
 from greaseweazle.track import MasterTrack, PLL, PLLTrack
 from greaseweazle.flux import Flux, HasFlux
@@ -98,17 +98,18 @@ class MacGCR(codec.Codec):
 
     def decode_flux(self, track: HasFlux, pll: Optional[PLL]=None) -> None:
         raw = PLLTrack(time_per_rev = self.time_per_rev,
-                       clock = self.clock, data = track, pll = pll)
-        bits, _ = raw.get_all_data()
+                       clock = self.clock, data = track, pll = pll,
+                       want_timing = False)
+        bits = raw.get_all_bits()
 
-        for offs in bits.search(sector_sync):
+        for offs in bitscan.search(bits, sector_sync):
 
             if self.nr_missing() == 0:
                 break
 
             # Decode header
             offs += 3*8
-            sec = bits[offs:offs+5*8].tobytes()
+            sec = bitscan.extract(bits, offs, 5*8)
             if len(sec) != 5:
                 continue
             hdr = optimised.decode_mac_gcr(sec)
@@ -130,14 +131,14 @@ class MacGCR(codec.Codec):
 
             # Find data
             offs += 5*8
-            dat_offs = list(bits[offs:offs+100*8].search(data_sync))
+            dat_offs = bitscan.search(bits, data_sync, offs, offs+100*8)
             if len(dat_offs) != 1:
                 continue
-            offs += dat_offs[0]
+            offs = dat_offs[0]
 
             # Decode data
             offs += 4*8
-            sec = bits[offs:offs+703*8].tobytes()
+            sec = bitscan.extract(bits, offs, 703*8)
             if len(sec) != 703:
                 continue
             sec = optimised.decode_mac_gcr(sec)
@@ -13,7 +13,7 @@ import itertools as it
 from enum import Enum
 
 from greaseweazle import error
-from greaseweazle.codec import codec
+from greaseweazle.codec import bitscan, codec
 from greaseweazle.codec.ibm.ibm import decode, encode, fm_encode, mfm_encode
 from greaseweazle.track import MasterTrack, PLL, PLLTrack
 from greaseweazle.flux import HasFlux
@@ -107,14 +107,15 @@ class Micropolis(codec.Codec):
             flux.identify_hard_sectors()
         flux.cue_at_index()
         raw = PLLTrack(time_per_rev = self.time_per_rev,
-                       clock = self.clock, data = flux, pll = pll)
+                       clock = self.clock, data = flux, pll = pll,
+                       want_timing = False)
 
         for rev in range(len(raw.revolutions)):
 
             if self.nr_missing() == 0:
                 break
 
-            bits, _ = raw.get_revolution(rev)
+            bits = raw.get_revolution_bits(rev)
 
             hardsector_bits = raw.revolutions[rev].hardsector_bits
             if hardsector_bits is not None:
@@ -134,10 +135,9 @@ class Micropolis(codec.Codec):
                 # Reference: Vector Micropolis Disk Controller Board Technical
                 # Information Manual, pp. 1-16.
                 s += 50
-                offs = bits[s:e].search(mfm_sync)
-                for off in offs:
+                for off in bitscan.search(bits, mfm_sync, s, e):
                     off += 3*16
-                    dat = decode(bits[s+off:s+off+275*16].tobytes())
+                    dat = decode(bitscan.extract(bits, off, 275*16))
                     if len(dat) != 275:
                         continue
                     cyl, sec_id = dat[1], dat[2]
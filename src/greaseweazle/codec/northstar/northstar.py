@@ -13,7 +13,7 @@ import itertools as it
 from enum import Enum
 
 from greaseweazle import error
-from greaseweazle.codec import codec
+from greaseweazle.codec import bitscan, codec
 from greaseweazle.codec.ibm.ibm import decode, encode, fm_encode, mfm_encode
 from greaseweazle.track import MasterTrack, PLL, PLLTrack
 from greaseweazle.flux import HasFlux
@@ -105,14 +105,15 @@ class NorthStar(codec.Codec):
             flux.identify_hard_sectors()
         flux.cue_at_index()
         raw = PLLTrack(time_per_rev = self.time_per_rev,
-                       clock = self.clock, data = flux, pll = pll)
+                       clock = self.clock, data = flux, pll = pll,
+                       want_timing = False)
 
         for rev in range(len(raw.revolutions)):
 
             if self.nr_missing() == 0:
                 break
 
-            bits, _ = raw.get_revolution(rev)
+            bits = raw.get_revolution_bits(rev)
 
             hardsector_bits = raw.revolutions[rev].hardsector_bits
             if hardsector_bits is not None:
@@ -131,11 +132,11 @@ class NorthStar(codec.Codec):
                     continue
 
                 s, e = hardsector_bits[sec_id], hardsector_bits[sec_id+1]
-                offs = bits[s:e].search(self.sync)
-                if (off := next(offs, None)) is None:
+                offs = bitscan.search(bits, self.sync, s, e)
+                if not offs:
                     continue
-                off += (1 + self.sync_bytes) * 16
-                data = decode(bits[s+off:s+off+(self.bps+1)*16].tobytes())
+                off = offs[0] + (1 + self.sync_bytes) * 16
+                data = decode(bitscan.extract(bits, off, (self.bps+1)*16))
                 if csum(data[:-1]) == data[-1]:
                     self.add(sec_id, data[:-1])
 
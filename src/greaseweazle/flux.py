@@ -6,9 +6,60 @@
 # See the file COPYING for more details, or visit <http://unlicense.org>.
 
 from __future__ import annotations
-from typing import List, Optional, Protocol
+from typing import Iterable, List, Optional, Protocol
+
+import bisect
+import itertools as it
+from array import array
 
 from greaseweazle import error
+from greaseweazle import optimised
+
+def flux_array(l: Iterable[float]) -> array:
+    """Return @l as a compact array of float flux (or index) timings."""
+    if isinstance(l, array) and l.typecode == 'd':
+        return l
+    return array('d', l)
+
+def resample_flux(l: Iterable[float], factor: float,
+                  overflow: int = 0) -> array:
+    """Scale flux timings @l by @factor and round them to whole ticks,
+    carrying each rounding error into the next flux. If @overflow is
+    non-zero, flux which rounds to zero or less is returned as zero
+    (and its error is not carried), and multiples of @overflow are
+    incremented by one."""
+    try:
+        return optimised.resample_flux(l, factor, overflow)
+    except AttributeError:
+        pass
+    res, rem = array('q'), 0.0
+    for x in l:
+        y = x * factor + rem
+        val = round(y)
+        if overflow != 0:
+            if val <= 0:
+                res.append(0)
+                continue
+            if val % overflow == 0:
+                val += 1
+        rem = y - val
+        res.append(val)
+    return res
+
+def flux_histogram(l: Iterable[float], factor: float,
+                   nr_bins: int) -> List[int]:
+    """Count flux timings @l by bin: Flux x is counted in bin int(x*@factor).
+    Flux beyond the last of the @nr_bins bins is not counted."""
+    try:
+        return optimised.flux_histogram(l, factor, nr_bins)
+    except AttributeError:
+        pass
+    hist = [0] * nr_bins
+    for x in l:
+        y = x * factor
+        if 0 <= y < nr_bins:
+            hist[int(y)] += 1
+    return hist
 
 class HasFlux(Protocol):
     def summary_string(self) -> str:
@@ -21,10 +72,19 @@ class HasFlux(Protocol):
 class Flux:
 
     _ticks_per_rev: float
-    
+
+    # Flux and index timings are held in array('d') rather than Python lists.
+    # Any list (or other iterable) assigned to them is converted on the fly.
+    # The array of flux prefix sums is computed on demand, and is discarded
+    # whenever a new flux list is assigned. Callers must not modify the flux
+    # array in place.
+    _list: array
+    _index_list: array
+    _prefix_sums: Optional[array]
+
     def __init__(self,
-                 index_list: List[float],
-                 flux_list: List[float],
+                 index_list: Iterable[float],
+                 flux_list: Iterable[float],
                  sample_freq: float,
                  index_cued = True) -> None:
         self.index_list = index_list
@@ -35,11 +95,56 @@ class Flux:
         self.index_cued = index_cued
 
 
+    @property
+    def list(self) -> array:
+        return self._list
+
+    @list.setter
+    def list(self, flux_list: Iterable[float]) -> None:
+        self._list = flux_array(flux_list)
+        self._prefix_sums = None
+
+
+    @property
+    def index_list(self) -> array:
+        return self._index_list
+
+    @index_list.setter
+    def index_list(self, index_list: Iterable[float]) -> None:
+        self._index_list = flux_array(index_list)
+
+
+    @property
+    def prefix_sums(self) -> array:
+        """Running totals of the flux list: prefix_sums[i] = sum(list[:i+1])"""
+        if self._prefix_sums is None:
+            self._prefix_sums = array('d', it.accumulate(self._list))
+        return self._prefix_sums
+
+
+    @property
+    def total_ticks(self) -> float:
+        """Sum of all flux timings, in sample ticks"""
+        prefix_sums = self.prefix_sums
+        return prefix_sums[-1] if prefix_sums else 0
+
+
+    def _flux_crossing(self, ticks: float) -> int:
+        """Index of the first flux whose prefix sum exceeds @ticks, or
+        len(self.list) if the flux list ends first."""
+        return bisect.bisect_right(self.prefix_sums, ticks)
+
+
+    def _ticks_before(self, i: int) -> float:
+        """Sum of the first @i flux timings."""
+        return self.prefix_sums[i-1] if i > 0 else 0
+
+
     def __str__(self) -> str:
         s = "\nFlux: %.2f MHz" % (self.sample_freq*1e-6)
         if self.index_cued: s += ", Index-Cued"
         s += ("\n Total: %u samples, %.2fms\n"
-              % (len(self.list), sum(self.list)*1000/self.sample_freq))
+              % (len(self.list), self.total_ticks*1000/self.sample_freq))
         for rev, t in enumerate(self.index_list):
             s += " Revolution %u: %.2fms\n" % (rev, t*1000/self.sample_freq)
             if self.sector_list:
@@ -51,7 +156,7 @@ class Flux:
 
     def summary_string(self) -> str:
         return ("Raw Flux (%u flux in %.2fms)"
-                % (len(self.list), sum(self.list)*1000/self.sample_freq))
+                % (len(self.list), self.total_ticks*1000/self.sample_freq))
 
 
     def identify_hard_sectors(self) -> None:
@@ -67,7 +172,7 @@ class Flux:
         short_ticks: float = 0
         sectors: List[float] = []
         index_list = self.index_list
-        self.index_list = []
+        new_index_list: List[float] = []
         self.sector_list = []
         short_count = 0
         for t in index_list:
@@ -80,13 +185,14 @@ class Flux:
             if short_count != 0 and (short_count > 1 or not is_short):
                 ticks_to_index += short_ticks
                 sectors.append(short_ticks)
-                self.index_list.append(ticks_to_index)
+                new_index_list.append(ticks_to_index)
                 self.sector_list.append(sectors)
                 sectors = []
                 short_ticks = ticks_to_index = short_count = 0
             if not is_short:
                 ticks_to_index += t
                 sectors.append(t)
+        self.index_list = new_index_list
         error.check(len(self.index_list) > 0,
                     "No hard-sector index mark found")
         self.index_cued = (
@@ -101,13 +207,13 @@ class Flux:
             f_list, i_list = flux.list, flux.index_list
         else:
             factor = self.sample_freq / flux.sample_freq
-            f_list = [x*factor for x in flux.list]
-            i_list = [x*factor for x in flux.index_list]
+            f_list = array('d', [x*factor for x in flux.list])
+            i_list = array('d', [x*factor for x in flux.index_list])
         # Any trailing flux is incorporated into the first revolution of
         # the appended flux.
-        rev0 = i_list[0] + sum(self.list) - sum(self.index_list)
-        self.index_list += [rev0] + i_list[1:]
-        self.list += f_list
+        rev0 = i_list[0] + self.total_ticks - sum(self.index_list)
+        self.index_list = self.index_list + array('d', [rev0]) + i_list[1:]
+        self.list = self.list + f_list
         # TODO: Work with hard-sectored disks
         self.sector_list = None
 
@@ -124,14 +230,12 @@ class Flux:
 
         # Clip the initial partial revolution.
         to_index = self.index_list[0]
-        for i in range(len(self.list)):
-            to_index -= self.list[i]
-            if to_index < 0:
-                break
-        if to_index < 0:
-            self.list = [-to_index] + self.list[i+1:]
+        i = self._flux_crossing(to_index)
+        if i < len(self.list):
+            self.list = (array('d', [self.prefix_sums[i] - to_index])
+                         + self.list[i+1:])
         else: # we ran out of flux
-            self.list = []
+            self.list = array('d')
         self.index_list = self.index_list[1:]
         self.index_cued = True
         if self.sector_list:
@@ -143,21 +247,21 @@ class Flux:
         assert self.sector_list is None
 
         was_index_cued = self.index_cued
-        flux_sum = sum(self.list)
+        flux_sum = self.total_ticks
 
         self.index_cued = False
-        self.list.reverse()
-        self.index_list.reverse()
+        self.list = self.list[::-1]
+        self.index_list = self.index_list[::-1]
 
         to_index = flux_sum - sum(self.index_list)
         if to_index <= 0:
             if to_index < 0:
-                self.list.insert(0, -to_index)
+                self.list = array('d', [-to_index]) + self.list
                 flux_sum += -to_index
             self.index_list = self.index_list[1:]
             self.index_cued = True
         else:
-            self.index_list = [to_index] + self.index_list[:-1]
+            self.index_list = array('d', [to_index]) + self.index_list[:-1]
 
         if was_index_cued:
             self.index_list.append(flux_sum - sum(self.index_list))
@@ -173,25 +277,19 @@ class Flux:
             self.index_list = self.index_list[:revs]
             if self.sector_list:
                 self.sector_list = self.sector_list[:revs]
-            to_index = sum(self.index_list)
-            for i in range(len(self.list)):
-                to_index -= self.list[i]
-                if to_index < 0:
-                    self.list = self.list[:i]
-                    break
+            i = self._flux_crossing(sum(self.index_list))
+            if i < len(self.list):
+                self.list = self.list[:i]
 
         while len(self.index_list) < revs:
             nr = min(revs - len(self.index_list), len(self.index_list))
             to_index = sum(self.index_list[:nr])
-            l = self.list
-            for i in range(len(l)):
-                to_index -= l[i]
-                if to_index < 0:
-                    to_index += l[i]
-                    l = l[:i]
-                    break
+            i = self._flux_crossing(to_index)
+            to_index -= self._ticks_before(i)
             if self.list:
-                self.list = l + [to_index + self.list[0]] + self.list[1:]
+                self.list = (self.list[:i]
+                             + array('d', [to_index + self.list[0]])
+                             + self.list[1:])
             self.index_list = self.index_list[:nr] + self.index_list
             if self.sector_list:
                 self.sector_list = self.sector_list[:nr] + self.sector_list
@@ -208,14 +306,11 @@ class Flux:
         splice_at_index = (splice == 0)
 
         # Copy the required amount of flux to a fresh list.
-        flux_list = []
         to_index = self.index_list[0]
         remain = to_index + splice
-        for f in self.list:
-            if f > remain:
-                break
-            flux_list.append(f)
-            remain -= f
+        i = self._flux_crossing(remain)
+        flux_list = self.list[:i]
+        remain -= self._ticks_before(i)
 
         if not cue_at_index:
             # We will write more than one revolution and terminate the
@@ -227,7 +322,8 @@ class Flux:
             prepend = max(round(to_index/10 - splice), 0)
             if prepend != 0:
                 four_us = max(self.sample_freq * 4e-6, 1)
-                flux_list = [four_us]*round(prepend/four_us) + flux_list
+                flux_list = (array('d', [four_us])*round(prepend/four_us)
+                             + flux_list)
             splice_at_index = False
         elif splice_at_index:
             # Extend with "safe" 4us sample values, to avoid unformatted area
@@ -256,6 +352,13 @@ class Flux:
         self.sample_freq /= factor
 
 
+    def histogram(self, bin_secs: float, nr_bins: int) -> List[int]:
+        """Histogram of flux timings: Bin i counts flux in the range
+        [i*@bin_secs, (i+1)*@bin_secs) seconds."""
+        return flux_histogram(self.list, 1 / (self.sample_freq * bin_secs),
+                              nr_bins)
+
+
     @property
     def ticks_per_rev(self) -> float:
         """Mean time between index pulses, in sample ticks"""
@@ -280,13 +383,13 @@ class WriteoutFlux:
     def __init__(
             self,
             ticks_to_index: float,
-            flux_list: List[float],
+            flux_list: Iterable[float],
             sample_freq: float,
             index_cued: bool,
             terminate_at_index: bool
     ) -> None:
         self.ticks_to_index = ticks_to_index
-        self.list = flux_list
+        self.list = flux_array(flux_list)
         self.sample_freq = sample_freq
         self.index_cued = index_cued
         self.terminate_at_index = terminate_at_index
@@ -275,8 +275,9 @@ class IPFTrack(MasterTrack):
 
     def verify_track(self, flux: Flux) -> bool:
         flux.cue_at_index()
-        raw = PLLTrack(clock = self.time_per_rev/len(self.bits), data = flux)
-        raw_bits, _ = raw.get_all_data()
+        raw = PLLTrack(clock = self.time_per_rev/len(self.bits), data = flux,
+                       want_timing = False)
+        raw_bits = raw.get_all_bits()
         for s,l in IPFTrack.strong_data(self.sectors, self.weak):
             sector = self.bits[s:s+l]
             # Search within an area +/- the pre-defined # bitcells tolerance
@@ -127,8 +127,8 @@ class EDSKTrack:
         flux.cue_at_index()
         raw = PLLTrack(time_per_rev = self.time_per_rev,
                        clock = self.time_per_rev / len(self.bits),
-                       data = flux)
-        bits, _ = raw.get_all_data()
+                       data = flux, want_timing = False)
+        bits = raw.get_all_bits()
         weak_iter = it.chain(self.weak, [(self.verify_len+1,1)])
         weak = next(weak_iter)
 
@@ -234,7 +234,7 @@ class EDSK(Image):
         t += ibm.encode(bytes(track.gap_presync))
         t += ibm.mfm_sync_bytes
         am = bytes([0xa1, 0xa1, 0xa1, ibm.Mark.IDAM, c, h, r, n])
-        crc = ibm.crc16.new(am).crcValue
+        crc = ibm.crc16_ccitt(am)
         am += struct.pack('>H', crc)
         t += ibm.encode(am[3:])
         t += ibm.encode(bytes([track.gapbyte] * track.gap_2))
@@ -257,7 +257,7 @@ class EDSK(Image):
             if r != id or n != 2:
                 return None
         def addcrc(t,n):
-            crc = ibm.crc16.new(ibm.decode(t[-n*2:])).crcValue
+            crc = ibm.crc16_ccitt(ibm.decode(t[-n*2:]))
             t += ibm.encode(struct.pack('>H', crc))
         track = EDSKTrack()
         t = track.bytes
@@ -373,7 +373,7 @@ class EDSK(Image):
                         t += ibm.mfm_sync_bytes
                         am = bytes([0xa1, 0xa1, 0xa1, ibm.Mark.IDAM,
                                     c, h, r, n])
-                        crc = ibm.crc16.new(am).crcValue
+                        crc = ibm.crc16_ccitt(am)
                         if errs.id_crc_error:
                             crc ^= 0x5555
                         am += struct.pack('>H', crc)
@@ -434,7 +434,7 @@ class EDSK(Image):
                         t += ibm.encode(sec_data)
                         continue
                     am = bytes([0xa1, 0xa1, 0xa1, dmark]) + sec_data
-                    crc = ibm.crc16.new(am).crcValue
+                    crc = ibm.crc16_ccitt(am)
                     if errs.data_crc_error:
                         crc ^= 0x5555
                     am += struct.pack('>H', crc)
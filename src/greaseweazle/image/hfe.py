@@ -266,10 +266,13 @@ class HFE(Image):
         else:
             flux = t.flux()
             flux.cue_at_index()
-            raw = PLLTrack(clock = 5e-4 / self.opts.bitrate, data = flux)
-            bits, bit_ticks = raw.get_revolution(0)
+            raw = PLLTrack(clock = 5e-4 / self.opts.bitrate, data = flux,
+                           want_timing = not self.opts.uniform)
             if self.opts.uniform:
-                bit_ticks = None
+                bits, bit_ticks = raw.get_revolution_bits(0), None
+            else:
+                bits, pll_ticks = raw.get_revolution(0)
+                bit_ticks = pll_ticks.tolist()
             mt = MasterTrack(
                 bits = bits, time_per_rev = flux.time_per_rev,
                 bit_ticks = bit_ticks,
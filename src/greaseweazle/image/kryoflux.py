@@ -12,7 +12,7 @@ import itertools as it
 
 from greaseweazle import __version__
 from greaseweazle import error
-from greaseweazle.flux import Flux
+from greaseweazle.flux import Flux, resample_flux
 from .image import Image, ImageOpts, OptDict
 
 def_mck = 18432000 * 73 / 14 / 2
@@ -269,11 +269,8 @@ class KryoFlux(Image):
         index = list(it.accumulate(map(lambda x: x*factor, flux.index_list)))
         index_idx = 0
         
-        stream_idx, total, rem = 0, 0, 0.0
-        for x in flux.list:
-            y = x * factor + rem
-            f = round(y)
-            rem = y - f
+        stream_idx, total = 0, 0
+        for f in resample_flux(flux.list, factor):
             emit(f)
 
         # We may not have enough flux to get to the final index value.
@@ -13,7 +13,7 @@ from enum import IntFlag
 from greaseweazle import __version__
 from greaseweazle import error
 from greaseweazle.codec import codec
-from greaseweazle.flux import Flux, HasFlux
+from greaseweazle.flux import Flux, HasFlux, resample_flux
 from greaseweazle.tools import util
 from greaseweazle.track import MasterTrack
 from .image import Image, ImageOpts
@@ -321,9 +321,12 @@ class SCP(Image):
         tdh, dat = bytearray(), bytearray()
         len_at_index = rev = 0
         to_index = flux.index_list[0]
-        rem = 0.0
 
-        for x in flux.list:
+        # Resampled flux are non-zero and not multiples of 65536, as these
+        # would be misinterpreted as overflow words.
+        resampled = resample_flux(flux.list, factor, overflow = 65536)
+
+        for x, val in zip(flux.list, resampled):
 
             # Does the next flux interval cross the index mark?
             while to_index < x:
@@ -343,13 +346,8 @@ class SCP(Image):
 
             # Process the current flux sample into SCP "bitcell" format
             to_index -= x
-            y = x * factor + rem
-            val = round(y)
-            if val <= 0:
+            if val == 0:
                 continue
-            if (val & 65535) == 0:
-                val += 1
-            rem = y - val
             while val >= 65536:
                 dat.append(0)
                 dat.append(0)
@@ -16,7 +16,14 @@ from greaseweazle import optimised
 from greaseweazle.codec.ibm import ibm
 from .image import Image
 
-crc16 = crcmod.predefined.Crc('crc-16-teledisk')
+_crc16 = crcmod.predefined.mkPredefinedCrcFun('crc-16-teledisk')
+
+def crc16(dat) -> int:
+    try:
+        return optimised.crc16_teledisk(dat)
+    except AttributeError:
+        pass
+    return _crc16(bytes(dat))
 
 class TD0(Image):
 
@@ -33,7 +40,7 @@ class TD0(Image):
         sig, td_ver, data_rate, stepping, n_sides, crc = struct.unpack(
             '<2s2x2BxBxBH', dat[:12])
         error.check(sig == b'TD' or sig == b'td', 'TD0: bad file signature')
-        error.check(crc16.new(dat[:10]).crcValue == crc,
+        error.check(crc16(dat[:10]) == crc,
                     'TD0: bad file header crc')
         print('TD0: Teledisk version %d.%d' % (td_ver>>4, td_ver&15))
 
@@ -56,7 +63,7 @@ class TD0(Image):
         if stepping & 128:
             crc, dlen, yr, mo, day, hr, minute, sec = struct.unpack(
                 '<2H6B', dat[off:off+10])
-            error.check(crc16.new(dat[off+2:off+10+dlen]).crcValue == crc,
+            error.check(crc16(dat[off+2:off+10+dlen]) == crc,
                         'TD0: bad comment header crc')
             print('TD0: Created %d/%d/%d %d:%d:%d' %
                   (day, mo+1, yr+1900, hr, minute, sec))
@@ -65,7 +72,7 @@ class TD0(Image):
         while dat[off] != 255:
 
             n_sec, cyl, head, crc = struct.unpack('4B', dat[off:off+4])
-            error.check(crc16.new(dat[off:off+3]).crcValue & 0xff == crc,
+            error.check(crc16(dat[off:off+3]) & 0xff == crc,
                         'TD0: bad track header crc')
             off += 4
 
@@ -108,7 +115,7 @@ class TD0(Image):
                                 o += c*2
                         blk = _blk
                     assert len(blk) == ibm.sec_sz(id_n)
-                    error.check(crc16.new(blk).crcValue & 0xff == crc,
+                    error.check(crc16(blk) & 0xff == crc,
                                 'TD0: bad sector data crc')
                 else:
                     off += 6
@@ -0,0 +1,97 @@
+/*
+ * Sync-pattern scanning and bit extraction over MSB-first bitcell streams.
+ */
+
+#include <stdlib.h>
+#include "bitscan.h"
+
+static int match_cmp(const void *_a, const void *_b)
+{
+    const struct sync_match *a = _a, *b = _b;
+    if (a->offs != b->offs)
+        return (a->offs < b->offs) ? -1 : 1;
+    return (int)a->idx - (int)b->idx;
+}
+
+ptrdiff_t find_syncs(const uint8_t *p, size_t start, size_t end,
+                     const struct sync_pattern *pat, unsigned int nr_pat,
+                     struct sync_match **pmatch)
+{
+    struct sync_match *match = NULL, *m;
+    size_t i, nr = 0, max = 0;
+    uint64_t w = 0;
+    unsigned int j, minlen = 64, sorted = 1;
+
+    for (j = 0; j < nr_pat; j++) {
+        if (pat[j].len < minlen)
+            minlen = pat[j].len;
+        /* Matches are found in order of end offset. If all patterns are
+         * the same length, this is also the order of start offset. */
+        if (pat[j].len != pat[0].len)
+            sorted = 0;
+    }
+
+    for (i = start; i < end; i++) {
+        w = (w << 1) | ((p[i >> 3] >> (~i & 7)) & 1);
+        if (i + 1 - start < minlen)
+            continue;
+        for (j = 0; j < nr_pat; j++) {
+            /* Compare the most recent pat[j].len bits. */
+            if (((w ^ pat[j].val) << (64 - pat[j].len)) != 0
+                || (i + 1 - start < pat[j].len))
+                continue;
+            if (nr == max) {
+                max = max ? max * 2 : 64;
+                m = realloc(match, max * sizeof(*m));
+                if (m == NULL) {
+                    free(match);
+                    return -1;
+                }
+                match = m;
+            }
+            match[nr].offs = i + 1 - pat[j].len;
+            match[nr].idx = j;
+            nr++;
+        }
+    }
+
+    if (!sorted)
+        qsort(match, nr, sizeof(*match), match_cmp);
+
+    *pmatch = match;
+    return nr;
+}
+
+void extract_bits(const uint8_t *p, size_t offs, size_t nbits, uint8_t *out)
+{
+    unsigned int shift = offs & 7;
+    size_t i, nbytes = (nbits + 7) / 8;
+
+    p += offs >> 3;
+    if (shift == 0) {
+        for (i = 0; i < nbytes; i++)
+            out[i] = p[i];
+    } else {
+        /* The final source byte is read only if it contributes bits. */
+        for (i = 0; i + 1 < nbytes; i++)
+            out[i] = (p[i] << shift) | (p[i+1] >> (8 - shift));
+        if (nbytes != 0) {
+            out[i] = p[i] << shift;
+            if (shift + nbits - i*8 > 8)
+                out[i] |= p[i+1] >> (8 - shift);
+        }
+    }
+
+    if (nbits & 7)
+        out[nbytes-1] &= 0xff << (8 - (nbits & 7));
+}
+
+/*
+ * Local variables:
+ * mode: C
+ * c-file-style: "Linux"
+ * c-basic-offset: 4
+ * tab-width: 4
+ * indent-tabs-mode: nil
+ * End:
+ */
@@ -0,0 +1,34 @@
+#include <stddef.h>
+#include <stdint.h>
+
+struct sync_match {
+    size_t offs;
+    unsigned int idx;
+};
+
+struct sync_pattern {
+    uint64_t val;
+    unsigned int len; /* 1-64 bits */
+};
+
+/* Find all occurrences of @pat[0..@nr_pat-1] wholly within bits
+ * [@start,@end) of MSB-first bitstream @p. Matches are returned in
+ * (offset, pattern index) order in malloc'ed array *@pmatch. Returns the
+ * number of matches, or -1 if out of memory. */
+ptrdiff_t find_syncs(const uint8_t *p, size_t start, size_t end,
+                     const struct sync_pattern *pat, unsigned int nr_pat,
+                     struct sync_match **pmatch);
+
+/* Copy @nbits bits from bit offset @offs of MSB-first bitstream @p into
+ * byte-aligned @out. Trailing bits of the final byte are cleared. */
+void extract_bits(const uint8_t *p, size_t offs, size_t nbits, uint8_t *out);
+
+/*
+ * Local variables:
+ * mode: C
+ * c-file-style: "Linux"
+ * c-basic-offset: 4
+ * tab-width: 4
+ * indent-tabs-mode: nil
+ * End:
+ */
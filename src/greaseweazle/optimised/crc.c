@@ -0,0 +1,62 @@
+/*
+ * Table-driven 16-bit CRCs, computed MSB first with no final XOR.
+ */
+
+#include "crc.h"
+
+static void crc16_init_table(uint16_t *table, uint16_t poly)
+{
+    unsigned int i, j;
+    uint16_t x;
+
+    for (i = 0; i < 256; i++) {
+        x = i << 8;
+        for (j = 0; j < 8; j++)
+            x = (x & 0x8000) ? (x << 1) ^ poly : (x << 1);
+        table[i] = x;
+    }
+}
+
+static uint16_t crc16(const uint16_t *table, const uint8_t *p, size_t len,
+                      uint16_t crc)
+{
+    while (len--)
+        crc = (crc << 8) ^ table[(crc >> 8) ^ *p++];
+    return crc;
+}
+
+uint16_t crc16_ccitt(const uint8_t *p, size_t len, uint16_t crc)
+{
+    static uint16_t table[256];
+    static int init;
+
+    if (!init) {
+        crc16_init_table(table, 0x1021);
+        init = 1;
+    }
+
+    return crc16(table, p, len, crc);
+}
+
+uint16_t crc16_teledisk(const uint8_t *p, size_t len, uint16_t crc)
+{
+    static uint16_t table[256];
+    static int init;
+
+    if (!init) {
+        crc16_init_table(table, 0xa097);
+        init = 1;
+    }
+
+    return crc16(table, p, len, crc);
+}
+
+/*
+ * Local variables:
+ * mode: C
+ * c-file-style: "Linux"
+ * c-basic-offset: 4
+ * tab-width: 4
+ * indent-tabs-mode: nil
+ * End:
+ */
@@ -0,0 +1,18 @@
+#include <stddef.h>
+#include <stdint.h>
+
+/* CRC16-CCITT (poly 0x1021, MSB first), as used by IBM-style formats. */
+uint16_t crc16_ccitt(const uint8_t *p, size_t len, uint16_t crc);
+
+/* CRC16 as used by Teledisk TD0 images (poly 0xA097, MSB first). */
+uint16_t crc16_teledisk(const uint8_t *p, size_t len, uint16_t crc);
+
+/*
+ * Local variables:
+ * mode: C
+ * c-file-style: "Linux"
+ * c-basic-offset: 4
+ * tab-width: 4
+ * indent-tabs-mode: nil
+ * End:
+ */
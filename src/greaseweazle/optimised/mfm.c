@@ -0,0 +1,84 @@
+/*
+ * MFM and FM bitcell primitives: Each data bit is preceded by a clock bit.
+ */
+
+#include "mfm.h"
+
+/* Data bits (odd bitcells) of a byte, packed into a nibble. */
+static uint8_t decode_nibble(uint8_t x)
+{
+    return (((x >> 3) & 8) | ((x >> 2) & 4) | ((x >> 1) & 2) | (x & 1));
+}
+
+/* A nibble spread across the data bits of a byte, with clear clock bits. */
+static uint8_t encode_nibble(uint8_t x)
+{
+    return (((x & 8) << 3) | ((x & 4) << 2) | ((x & 2) << 1) | (x & 1));
+}
+
+/* Extract the data bits of @len bitcell pairs: 2*@len bytes -> @len bytes. */
+void decode_mfm(const uint8_t *input, uint8_t *output, int len)
+{
+    static uint8_t table[256];
+    static int init;
+    unsigned int i;
+
+    if (!init) {
+        for (i = 0; i < 256; i++)
+            table[i] = decode_nibble(i);
+        init = 1;
+    }
+
+    while (--len >= 0) {
+        uint8_t hi = table[*input++];
+        uint8_t lo = table[*input++];
+        *output++ = (hi << 4) | lo;
+    }
+}
+
+/* Interleave @len data bytes with clear clock bits: -> 2*@len bytes. */
+void encode_mfm(const uint8_t *input, uint8_t *output, int len)
+{
+    while (--len >= 0) {
+        uint8_t x = *input++;
+        *output++ = encode_nibble(x >> 4);
+        *output++ = encode_nibble(x & 15);
+    }
+}
+
+/* Set the MFM clock bits of bitcell bytes which have none set: A clock bit
+ * is set only if neither adjacent data bit is set. */
+void insert_mfm_clocks(const uint8_t *input, uint8_t *output, int len)
+{
+    unsigned int y = 0;
+
+    while (--len >= 0) {
+        uint8_t x = *input++;
+        y = (y << 8) | x;
+        if ((x & 0xaa) == 0)
+            y |= ~((y >> 1) | (y << 1)) & 0xaaaa;
+        y &= 0xff;
+        *output++ = y;
+    }
+}
+
+/* Set the FM clock bits of bitcell bytes which have none set. */
+void insert_fm_clocks(const uint8_t *input, uint8_t *output, int len)
+{
+    while (--len >= 0) {
+        uint8_t x = *input++;
+        if ((x & 0xaa) == 0)
+            x |= 0xaa;
+        *output++ = x;
+    }
+}
+
+/*
+ * Local variables:
+ * mode: C
+ * c-file-style: "Linux"
+ * c-basic-offset: 4
+ * tab-width: 4
+ * indent-tabs-mode: nil
+ * End:
+ */
@@ -0,0 +1,16 @@
+#include <stdint.h>
+
+void decode_mfm(const uint8_t *input, uint8_t *output, int len);
+void encode_mfm(const uint8_t *input, uint8_t *output, int len);
+void insert_mfm_clocks(const uint8_t *input, uint8_t *output, int len);
+void insert_fm_clocks(const uint8_t *input, uint8_t *output, int len);
+
+/*
+ * Local variables:
+ * mode: C
+ * c-file-style: "Linux"
+ * c-basic-offset: 4
+ * tab-width: 4
+ * indent-tabs-mode: nil
+ * End:
+ */
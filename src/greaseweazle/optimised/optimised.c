@@ -3,25 +3,40 @@
 #include "Python.h"
 #include <stdio.h>
 #include <stdint.h>
+#include <string.h>
+#include <math.h>
 #include "mac.h"
 #include "c64.h"
 #include "apple2.h"
 #include "apple_gcr_6a2.h"
+#include "mfm.h"
+#include "crc.h"
+#include "bitscan.h"
 
 #define FLUXOP_INDEX   1
 #define FLUXOP_SPACE   2
 #define FLUXOP_ASTABLE 3
 
-/* bitarray.append(value) */
-static PyObject *append_s;
-static int bitarray_append(PyObject *bitarray, PyObject *value)
+/* array.array */
+static PyObject *array_type;
+
+/* array.array(@typecode, <@nbytes bytes at @p>) */
+static PyObject *new_array(const char *typecode, const void *p,
+                           Py_ssize_t nbytes)
 {
-    PyObject *res = PyObject_CallMethodObjArgs(
-        bitarray, append_s, value, NULL);
-    if (res == NULL)
-        return 0;
-    Py_DECREF(res);
-    return 1;
+    PyObject *bytes, *array;
+    bytes = PyBytes_FromStringAndSize((const char *)p, nbytes);
+    if (bytes == NULL)
+        return NULL;
+    array = PyObject_CallFunction(array_type, "sO", typecode, bytes);
+    Py_DECREF(bytes);
+    return array;
+}
+
+/* array.array('d', <@n doubles at @p>) */
+static PyObject *double_array(const double *p, Py_ssize_t n)
+{
+    return new_array("d", p, n * sizeof(double));
 }
 
 /* Like PyList_Append() but steals a reference to @item. */
@@ -32,50 +47,77 @@ static int PyList_Append_SR(PyObject *list, PyObject *item)
     return rc;
 }
 
-static PyObject *
-flux_to_bitcells(PyObject *self, PyObject *args)
+/* Growable output buffers for flux_to_bitcells_bulk(). These are managed by
+ * the raw allocator, as they are grown while the GIL is released. */
+struct bitcells {
+    uint8_t *bits;     /* packed bitcells, MSB first */
+    double *times;     /* per-bitcell times (if want_timing) */
+    Py_ssize_t nr, max;
+    int want_timing;
+    long *revs;        /* bitcells in each revolution */
+    Py_ssize_t nr_revs;
+};
+
+/* Returns 0 if out of memory. The GIL need not be held. */
+static int bitcells_grow(struct bitcells *b, Py_ssize_t nr)
 {
-    /* Parameters */
-    PyObject *bit_array, *time_array, *revolutions;
-    PyObject *index_iter, *flux_iter;
-    double freq, clock_centre, clock_min, clock_max;
-    double pll_period_adj, pll_phase_adj;
+    Py_ssize_t max = b->max ? b->max : 64;
+    uint8_t *bits;
+    double *times;
 
-    /* Local variables */
-    PyObject *item;
-    double _clock, clock, new_ticks, ticks, to_index;
+    if (nr <= b->max)
+        return 1;
+    while (max < nr)
+        max *= 2;
+
+    if ((bits = PyMem_RawRealloc(b->bits, (max + 7) / 8)) == NULL)
+        return 0;
+    memset(&bits[(b->max + 7) / 8], 0, (max + 7) / 8 - (b->max + 7) / 8);
+    b->bits = bits;
+    if (b->want_timing) {
+        times = PyMem_RawRealloc(b->times, max * sizeof(double));
+        if (times == NULL)
+            return 0;
+        b->times = times;
+    }
+
+    b->max = max;
+    return 1;
+}
+
+/* Run the PLL over @nr_flux flux timings, into @b. Returns 0 if out of
+ * memory. Python objects are not accessed: The GIL need not be held. */
+static int _flux_to_bitcells(
+    struct bitcells *b,
+    const double *flux, Py_ssize_t nr_flux,
+    const double *index, Py_ssize_t nr_index,
+    double freq, double clock_centre, double clock_min, double clock_max,
+    double pll_period_adj, double pll_phase_adj)
+{
+    Py_ssize_t flux_idx, index_idx;
+    double _clock, clock, new_ticks, ticks, to_index, total;
     int i, zeros, nbits;
 
-    if (!PyArg_ParseTuple(args, "OOOOOdddddd",
-                          &bit_array, &time_array, &revolutions,
-                          &index_iter, &flux_iter,
-                          &freq, &clock_centre, &clock_min, &clock_max,
-                          &pll_period_adj, &pll_phase_adj))
-        return NULL;
+    /* Size the buffers for the expected number of bitcells. They are grown
+     * on demand if the PLL clock strays far from the centre frequency. */
+    total = 0.0;
+    for (flux_idx = 0; flux_idx < nr_flux; flux_idx++)
+        total += flux[flux_idx];
+    if (!bitcells_grow(b, (Py_ssize_t)(total / freq / clock_centre) + 64))
+        return 0;
 
     nbits = 0;
     ticks = 0.0;
     clock = clock_centre;
+    index_idx = 0;
 
     /* to_index = next(index_iter) */
-    if ((item = PyIter_Next(index_iter)) == NULL)
-        return NULL;
-    to_index = PyFloat_AsDouble(item);
-    Py_DECREF(item);
-    if (PyErr_Occurred())
-        return NULL;
+    to_index = (index_idx < nr_index) ? index[index_idx++] / freq : INFINITY;
 
-    /* for x in flux_iter: */
-    assert(PyIter_Check(flux_iter));
-    while ((item = PyIter_Next(flux_iter)) != NULL) {
-
-        double x = PyFloat_AsDouble(item);
-        Py_DECREF(item);
-        if (PyErr_Occurred())
-            return NULL;
+    for (flux_idx = 0; flux_idx < nr_flux; flux_idx++) {
 
         /* Gather enough ticks to generate at least one bitcell. */
-        ticks += x / freq;
+        ticks += flux[flux_idx] / freq;
         if (ticks < clock/2)
             continue;
 
@@ -86,11 +128,10 @@ flux_to_bitcells(PyObject *self, PyObject *args)
             if (ticks < clock/2)
                 break;
             zeros += 1;
-            if (!bitarray_append(bit_array, Py_False))
-                return NULL;
         }
-        if (!bitarray_append(bit_array, Py_True))
-            return NULL;
+        if (!bitcells_grow(b, b->nr + zeros + 1))
+            return 0;
+        b->bits[(b->nr + zeros) >> 3] |= 0x80 >> ((b->nr + zeros) & 7);
 
         /* PLL: Adjust clock window position according to phase mismatch. */
         new_ticks = ticks * (1.0 - pll_phase_adj);
@@ -99,24 +140,21 @@ flux_to_bitcells(PyObject *self, PyObject *args)
         _clock = clock + (ticks - new_ticks) / (zeros + 1);
         for (i = 0; i <= zeros; i++) {
 
-            /* Check if we cross the index mark. */
+            /* Check if we cross the index mark. Each crossing consumes an
+             * index timing, so b->revs has room for every revolution. */
             to_index -= _clock;
             if (to_index < 0) {
-                if (PyList_Append_SR(revolutions, PyLong_FromLong(nbits)) < 0)
-                    return NULL;
+                b->revs[b->nr_revs++] = nbits;
                 nbits = 0;
-                if ((item = PyIter_Next(index_iter)) == NULL)
-                    return NULL;
-                to_index += PyFloat_AsDouble(item);
-                Py_DECREF(item);
-                if (PyErr_Occurred())
-                    return NULL;
+                to_index += ((index_idx < nr_index)
+                             ? index[index_idx++] / freq : INFINITY);
             }
 
             /* Emit bit time. */
             nbits += 1;
-            if (PyList_Append_SR(time_array, PyFloat_FromDouble(_clock)) < 0)
-                return NULL;
+            if (b->want_timing)
+                b->times[b->nr] = _clock;
+            b->nr++;
 
         }
 
@@ -138,11 +176,83 @@ flux_to_bitcells(PyObject *self, PyObject *args)
 
     }
 
-    Py_RETURN_NONE;
+    return 1;
+}
+
+static PyObject *
+flux_to_bitcells_bulk(PyObject *self, PyObject *args)
+{
+    /* Parameters */
+    Py_buffer flux_buf, index_buf;
+    double freq, clock_centre, clock_min, clock_max;
+    double pll_period_adj, pll_phase_adj;
+    int want_timing;
+
+    /* Local variables */
+    PyObject *revolutions = NULL, *bits = NULL, *times = NULL, *res = NULL;
+    struct bitcells b = { 0 };
+    Py_ssize_t nr_flux, nr_index, i;
+    int ok;
+
+    if (!PyArg_ParseTuple(args, "y*y*ddddddp",
+                          &flux_buf, &index_buf,
+                          &freq, &clock_centre, &clock_min, &clock_max,
+                          &pll_period_adj, &pll_phase_adj, &want_timing))
+        return NULL;
+
+    nr_flux = flux_buf.len / sizeof(double);
+    nr_index = index_buf.len / sizeof(double);
+
+    b.want_timing = want_timing;
+    b.revs = PyMem_RawMalloc((nr_index + 1) * sizeof(long));
+    if (b.revs == NULL) {
+        PyErr_NoMemory();
+        goto out;
+    }
+
+    /* The flux and index buffers cannot be resized while we hold them, so
+     * other threads may run while the PLL does. */
+    Py_BEGIN_ALLOW_THREADS
+    ok = _flux_to_bitcells(
+        &b, flux_buf.buf, nr_flux, index_buf.buf, nr_index,
+        freq, clock_centre, clock_min, clock_max,
+        pll_period_adj, pll_phase_adj);
+    Py_END_ALLOW_THREADS
+    if (!ok) {
+        PyErr_NoMemory();
+        goto out;
+    }
+
+    if ((revolutions = PyList_New(0)) == NULL)
+        goto out;
+    for (i = 0; i < b.nr_revs; i++)
+        if (PyList_Append_SR(revolutions, PyLong_FromLong(b.revs[i])) < 0)
+            goto out;
+    bits = PyBytes_FromStringAndSize((const char *)b.bits, (b.nr + 7) / 8);
+    if (bits == NULL)
+        goto out;
+    if (!want_timing) {
+        times = Py_None;
+        Py_INCREF(times);
+    } else if ((times = double_array(b.times, b.nr)) == NULL) {
+        goto out;
+    }
+    res = Py_BuildValue("OnOO", bits, b.nr, times, revolutions);
+
+out:
+    PyBuffer_Release(&flux_buf);
+    PyBuffer_Release(&index_buf);
+    PyMem_RawFree(b.bits);
+    PyMem_RawFree(b.times);
+    PyMem_RawFree(b.revs);
+    Py_XDECREF(bits);
+    Py_XDECREF(times);
+    Py_XDECREF(revolutions);
+    return res;
 }
 
 
-static int _read_28bit(uint8_t *p)
+static int _read_28bit(const uint8_t *p)
 {
     int x;
     x  = (p[0]       ) >>  1;
@@ -152,39 +262,23 @@ static int _read_28bit(uint8_t *p)
     return x;
 }
 
-static PyObject *
-decode_flux(PyObject *self, PyObject *args)
+/* Errors returned by _decode_flux(). */
+#define DECODE_FLUX_OOS    -1 /* Unexpected end of stream */
+#define DECODE_FLUX_OPCODE -2 /* Bad opcode, returned in *opcode */
+
+/* Decode the @l-byte stream at @p into @flux and @index, which must have room
+ * for every sample and index mark that the stream could hold. Returns 0 on
+ * success. Python objects are not accessed: The GIL need not be held. */
+static int _decode_flux(
+    const uint8_t *p, Py_ssize_t l,
+    double *flux, Py_ssize_t *pnr_flux,
+    double *index, Py_ssize_t *pnr_index,
+    int *opcode)
 {
-    /* Parameters */
-    Py_buffer bytearray;
-    PyObject *res = NULL;
-
-    /* bytearray buffer */
-    uint8_t *p;
-    Py_ssize_t l;
-
-    /* Local variables */
-    PyObject *flux, *index;
+    Py_ssize_t nr_flux = 0, nr_index = 0;
     long val, ticks, ticks_since_index;
-    int i, opcode;
+    int i, rc = 0;
 
-    if (!PyArg_ParseTuple(args, "y*", &bytearray))
-        return NULL;
-    p = bytearray.buf;
-    l = bytearray.len;
-
-    /* assert dat[-1] == 0 */
-    if ((l == 0) || (p[l-1] != 0)) {
-        PyErr_SetString(PyExc_ValueError, "Flux is not NUL-terminated");
-        PyBuffer_Release(&bytearray);
-        return NULL;
-    }
-    /* len(dat) -= 1 */
-    l -= 1;
-
-    /* flux, index = [], [] */
-    flux = PyList_New(0);
-    index = PyList_New(0);
     /* ticks, ticks_since_index = 0, 0 */
     ticks = 0;
     ticks_since_index = 0;
@@ -194,17 +288,14 @@ decode_flux(PyObject *self, PyObject *args)
         if (i == 255) {
             if ((l -= 2) < 0)
                 goto oos;
-            opcode = *p++;
-            switch (opcode) {
+            *opcode = *p++;
+            switch (*opcode) {
             case FLUXOP_INDEX:
                 if ((l -= 4) < 0)
                     goto oos;
                 val = _read_28bit(p);
                 p += 4;
-                if (PyList_Append_SR(
-                        index, PyLong_FromLong(
-                            ticks_since_index + ticks + val)) < 0)
-                    goto out;
+                index[nr_index++] = ticks_since_index + ticks + val;
                 ticks_since_index = -(ticks + val);
                 break;
             case FLUXOP_SPACE:
@@ -214,8 +305,7 @@ decode_flux(PyObject *self, PyObject *args)
                 p += 4;
                 break;
             default:
-                PyErr_Format(PyExc_ValueError,
-                             "Bad opcode in flux stream (%d)", opcode);
+                rc = DECODE_FLUX_OPCODE;
                 goto out;
             }
         } else {
@@ -229,24 +319,451 @@ decode_flux(PyObject *self, PyObject *args)
                 val += *p++ - 1;
             }
             ticks += val;
-            if (PyList_Append_SR(flux, PyLong_FromLong(ticks)) < 0)
-                goto out;
+            flux[nr_flux++] = ticks;
             ticks_since_index += ticks;
             ticks = 0;
         }
     }
 
-    res = Py_BuildValue("OO", flux, index);
+out:
+    *pnr_flux = nr_flux;
+    *pnr_index = nr_index;
+    return rc;
+
+oos:
+    rc = DECODE_FLUX_OOS;
+    goto out;
+}
+
+static PyObject *
+decode_flux(PyObject *self, PyObject *args)
+{
+    /* Parameters */
+    Py_buffer bytearray;
+    PyObject *res = NULL;
+
+    /* bytearray buffer */
+    uint8_t *p;
+    Py_ssize_t l;
+
+    /* Local variables */
+    PyObject *flux_array = NULL, *index_array = NULL;
+    double *flux, *index;
+    Py_ssize_t nr_flux, nr_index;
+    int rc, opcode;
+
+    if (!PyArg_ParseTuple(args, "y*", &bytearray))
+        return NULL;
+    p = bytearray.buf;
+    l = bytearray.len;
+
+    /* assert dat[-1] == 0 */
+    if ((l == 0) || (p[l-1] != 0)) {
+        PyErr_SetString(PyExc_ValueError, "Flux is not NUL-terminated");
+        PyBuffer_Release(&bytearray);
+        return NULL;
+    }
+    /* len(dat) -= 1 */
+    l -= 1;
+
+    /* Every flux sample consumes at least one byte of the stream, and every
+     * index mark consumes six bytes. */
+    flux = PyMem_Malloc((l + 1) * sizeof(double));
+    index = PyMem_Malloc((l / 6 + 1) * sizeof(double));
+    if ((flux == NULL) || (index == NULL)) {
+        PyErr_NoMemory();
+        goto out;
+    }
+
+    /* The stream buffer cannot be resized while we hold it, so other
+     * threads may run while we decode it. */
+    Py_BEGIN_ALLOW_THREADS
+    rc = _decode_flux(p, l, flux, &nr_flux, index, &nr_index, &opcode);
+    Py_END_ALLOW_THREADS
+    if (rc == DECODE_FLUX_OOS) {
+        PyErr_SetString(PyExc_ValueError, "Unexpected end of flux");
+        goto out;
+    } else if (rc == DECODE_FLUX_OPCODE) {
+        PyErr_Format(PyExc_ValueError,
+                     "Bad opcode in flux stream (%d)", opcode);
+        goto out;
+    }
+
+    if ((flux_array = double_array(flux, nr_flux)) == NULL)
+        goto out;
+    if ((index_array = double_array(index, nr_index)) == NULL)
+        goto out;
+    res = Py_BuildValue("OO", flux_array, index_array);
 
 out:
     PyBuffer_Release(&bytearray);
-    Py_DECREF(flux);
-    Py_DECREF(index);
+    PyMem_Free(flux);
+    PyMem_Free(index);
+    Py_XDECREF(flux_array);
+    Py_XDECREF(index_array);
     return res;
+}
 
-oos:
-    PyErr_SetString(PyExc_ValueError, "Unexpected end of flux");
-    goto out;
+static uint8_t *_write_28bit(uint8_t *p, long x)
+{
+    *p++ = 1 | ((x <<  1) & 255);
+    *p++ = 1 | ((x >>  6) & 255);
+    *p++ = 1 | ((x >> 13) & 255);
+    *p++ = 1 | ((x >> 20) & 255);
+    return p;
+}
+
+static PyObject *
+encode_flux(PyObject *self, PyObject *args)
+{
+    /* Parameters */
+    PyObject *flux_list;
+    long nfa_thresh, nfa_period, dummy_flux;
+    PyObject *res = NULL;
+
+    /* Local variables */
+    PyObject *iter, *item;
+    uint8_t *dat = NULL, *p, *new;
+    Py_ssize_t len, max;
+    long val, high;
+    int done = 0;
+
+    if (!PyArg_ParseTuple(args, "Olll", &flux_list, &nfa_thresh,
+                          &nfa_period, &dummy_flux))
+        return NULL;
+
+    if ((iter = PyObject_GetIter(flux_list)) == NULL)
+        return NULL;
+
+    /* Most flux samples encode as one or two bytes. */
+    if ((len = PyObject_LengthHint(flux_list, 0)) < 0)
+        goto out;
+    max = 2 * len + 64;
+    if ((dat = PyMem_Malloc(max)) == NULL) {
+        PyErr_NoMemory();
+        goto out;
+    }
+    p = dat;
+
+    while (!done) {
+        if ((item = PyIter_Next(iter)) != NULL) {
+            val = PyLong_AsLong(item);
+            Py_DECREF(item);
+            if ((val == -1) && PyErr_Occurred())
+                goto out;
+        } else if (PyErr_Occurred()) {
+            goto out;
+        } else {
+            /* Emit a dummy final flux value (see usb.Unit._encode_flux). */
+            val = dummy_flux;
+            done = 1;
+        }
+
+        if (val == 0)
+            continue;
+        if (val < 0) {
+            PyErr_SetString(PyExc_ValueError, "Negative flux value");
+            goto out;
+        }
+
+        /* Ensure space for the longest encoding (NFA), plus End of Stream. */
+        len = p - dat;
+        if (max - len < 13) {
+            max *= 2;
+            if ((new = PyMem_Realloc(dat, max)) == NULL) {
+                PyErr_NoMemory();
+                goto out;
+            }
+            dat = new;
+            p = dat + len;
+        }
+
+        if (val < 250) {
+            *p++ = val;
+        } else if (val > nfa_thresh) {
+            *p++ = 255;
+            *p++ = FLUXOP_SPACE;
+            p = _write_28bit(p, val);
+            *p++ = 255;
+            *p++ = FLUXOP_ASTABLE;
+            p = _write_28bit(p, nfa_period);
+        } else {
+            high = (val - 250) / 255;
+            if (high < 5) {
+                *p++ = 250 + high;
+                *p++ = 1 + (val - 250) % 255;
+            } else {
+                *p++ = 255;
+                *p++ = FLUXOP_SPACE;
+                p = _write_28bit(p, val - 249);
+                *p++ = 249;
+            }
+        }
+    }
+
+    *p++ = 0; /* End of Stream */
+    res = PyBytes_FromStringAndSize((char *)dat, p - dat);
+
+out:
+    Py_DECREF(iter);
+    PyMem_Free(dat);
+    return res;
+}
+
+static PyObject *
+resample_flux(PyObject *self, PyObject *args)
+{
+    /* Parameters */
+    PyObject *flux_list;
+    double factor;
+    long long overflow;
+    PyObject *res = NULL;
+
+    /* Local variables */
+    Py_buffer buf = { 0 };
+    PyObject *seq = NULL;
+    const double *flux = NULL;
+    long long *out = NULL, val;
+    Py_ssize_t i, n;
+    double x, y, rem = 0;
+    volatile double scaled;
+
+    if (!PyArg_ParseTuple(args, "OdL", &flux_list, &factor, &overflow))
+        return NULL;
+
+    /* Read array('d') directly. Convert any other iterable to a sequence. */
+    if (PyObject_CheckBuffer(flux_list)
+        && (PyObject_GetBuffer(flux_list, &buf,
+                               PyBUF_FORMAT|PyBUF_C_CONTIGUOUS) == 0)) {
+        if ((buf.format != NULL) && !strcmp(buf.format, "d")) {
+            flux = buf.buf;
+            n = buf.len / sizeof(double);
+        } else {
+            PyBuffer_Release(&buf);
+        }
+    }
+    PyErr_Clear();
+    if (flux == NULL) {
+        seq = PySequence_Fast(flux_list, "Flux must be iterable");
+        if (seq == NULL)
+            return NULL;
+        n = PySequence_Fast_GET_SIZE(seq);
+    }
+
+    if ((out = PyMem_Malloc((n + 1) * sizeof(*out))) == NULL) {
+        PyErr_NoMemory();
+        goto out;
+    }
+
+    for (i = 0; i < n; i++) {
+        if (flux != NULL) {
+            x = flux[i];
+        } else {
+            x = PyFloat_AsDouble(PySequence_Fast_GET_ITEM(seq, i));
+            if ((x == -1.0) && PyErr_Occurred())
+                goto out;
+        }
+        /* Python rounds the product before adding the remainder: Do not
+         * allow the compiler to fuse these into a multiply-add. */
+        scaled = x * factor;
+        y = scaled + rem;
+        /* Round half to even, as Python's round(). */
+        val = (long long)nearbyint(y);
+        if (overflow != 0) {
+            if (val <= 0) {
+                out[i] = 0;
+                continue;
+            }
+            if ((val % overflow) == 0)
+                val += 1;
+        }
+        rem = y - val;
+        out[i] = val;
+    }
+
+    res = new_array("q", out, n * sizeof(*out));
+
+out:
+    if (flux != NULL)
+        PyBuffer_Release(&buf);
+    Py_XDECREF(seq);
+    PyMem_Free(out);
+    return res;
+}
+
+static PyObject *
+flux_histogram(PyObject *self, PyObject *args)
+{
+    /* Parameters */
+    PyObject *flux_list;
+    double factor;
+    Py_ssize_t nr_bins;
+    PyObject *res = NULL;
+
+    /* Local variables */
+    Py_buffer buf = { 0 };
+    PyObject *seq = NULL;
+    const double *flux = NULL;
+    unsigned long long *hist = NULL;
+    Py_ssize_t i, n;
+    double x, y;
+
+    if (!PyArg_ParseTuple(args, "Odn", &flux_list, &factor, &nr_bins))
+        return NULL;
+
+    if (nr_bins < 0) {
+        PyErr_SetString(PyExc_ValueError, "Negative number of bins");
+        return NULL;
+    }
+
+    /* Read array('d') directly. Convert any other iterable to a sequence. */
+    if (PyObject_CheckBuffer(flux_list)
+        && (PyObject_GetBuffer(flux_list, &buf,
+                               PyBUF_FORMAT|PyBUF_C_CONTIGUOUS) == 0)) {
+        if ((buf.format != NULL) && !strcmp(buf.format, "d")) {
+            flux = buf.buf;
+            n = buf.len / sizeof(double);
+        } else {
+            PyBuffer_Release(&buf);
+        }
+    }
+    PyErr_Clear();
+    if (flux == NULL) {
+        seq = PySequence_Fast(flux_list, "Flux must be iterable");
+        if (seq == NULL)
+            return NULL;
+        n = PySequence_Fast_GET_SIZE(seq);
+    }
+
+    if ((hist = PyMem_Calloc(nr_bins + 1, sizeof(*hist))) == NULL) {
+        PyErr_NoMemory();
+        goto out;
+    }
+
+    for (i = 0; i < n; i++) {
+        if (flux != NULL) {
+            x = flux[i];
+        } else {
+            x = PyFloat_AsDouble(PySequence_Fast_GET_ITEM(seq, i));
+            if ((x == -1.0) && PyErr_Occurred())
+                goto out;
+        }
+        /* Out-of-range (and NaN) flux is not counted. */
+        y = x * factor;
+        if ((y >= 0) && (y < nr_bins))
+            hist[(Py_ssize_t)y]++;
+    }
+
+    if ((res = PyList_New(nr_bins)) == NULL)
+        goto out;
+    for (i = 0; i < nr_bins; i++) {
+        PyObject *count = PyLong_FromUnsignedLongLong(hist[i]);
+        if (count == NULL) {
+            Py_CLEAR(res);
+            goto out;
+        }
+        PyList_SET_ITEM(res, i, count);
+    }
+
+out:
+    if (flux != NULL)
+        PyBuffer_Release(&buf);
+    Py_XDECREF(seq);
+    PyMem_Free(hist);
+    return res;
+}
+
+static PyObject *
+bitcells_to_flux(PyObject *self, PyObject *args)
+{
+    /* Parameters */
+    Py_buffer bits;
+    Py_ssize_t nr_bits;
+    int little_endian;
+    PyObject *bit_ticks;
+    PyObject *res = NULL;
+
+    /* Local variables */
+    Py_buffer ticks_buf = { 0 };
+    PyObject *seq = NULL, *flux_array = NULL;
+    const uint8_t *p;
+    const double *ticks = NULL;
+    double *flux = NULL, flux_ticks = 0, t;
+    Py_ssize_t i, nr_flux = 0, nr_ticks;
+    int bit;
+
+    if (!PyArg_ParseTuple(args, "y*npO", &bits, &nr_bits, &little_endian,
+                          &bit_ticks))
+        return NULL;
+    p = bits.buf;
+
+    if ((nr_bits < 0) || ((nr_bits + 7) / 8 > bits.len)) {
+        PyErr_SetString(PyExc_ValueError, "Bad bitcell count");
+        goto out;
+    }
+
+    /* Read array('d') directly. Convert any other iterable to a sequence.
+     * None means every bitcell is one tick. */
+    if (bit_ticks != Py_None) {
+        if (PyObject_CheckBuffer(bit_ticks)
+            && (PyObject_GetBuffer(bit_ticks, &ticks_buf,
+                                   PyBUF_FORMAT|PyBUF_C_CONTIGUOUS) == 0)) {
+            if ((ticks_buf.format != NULL) && !strcmp(ticks_buf.format, "d"))
+                ticks = ticks_buf.buf;
+            else
+                PyBuffer_Release(&ticks_buf);
+        }
+        PyErr_Clear();
+        if (ticks != NULL) {
+            nr_ticks = ticks_buf.len / sizeof(double);
+        } else {
+            seq = PySequence_Fast(bit_ticks, "bit_ticks must be iterable");
+            if (seq == NULL)
+                goto out;
+            nr_ticks = PySequence_Fast_GET_SIZE(seq);
+        }
+        if (nr_ticks < nr_bits) {
+            PyErr_SetString(PyExc_ValueError, "Too few bit_ticks");
+            goto out;
+        }
+    }
+
+    /* There can be no more flux than there are bitcells. */
+    if ((flux = PyMem_Malloc((nr_bits + 1) * sizeof(double))) == NULL) {
+        PyErr_NoMemory();
+        goto out;
+    }
+
+    for (i = 0; i < nr_bits; i++) {
+        if (ticks != NULL) {
+            t = ticks[i];
+        } else if (seq != NULL) {
+            t = PyFloat_AsDouble(PySequence_Fast_GET_ITEM(seq, i));
+            if ((t == -1.0) && PyErr_Occurred())
+                goto out;
+        } else {
+            t = 1;
+        }
+        flux_ticks += t;
+        bit = little_endian ? (p[i>>3] >> (i&7)) : (p[i>>3] >> (7-(i&7)));
+        if (bit & 1) {
+            flux[nr_flux++] = flux_ticks;
+            flux_ticks = 0;
+        }
+    }
+
+    if ((flux_array = double_array(flux, nr_flux)) == NULL)
+        goto out;
+    res = Py_BuildValue("Od", flux_array, flux_ticks);
+
+out:
+    PyBuffer_Release(&bits);
+    if (ticks != NULL)
+        PyBuffer_Release(&ticks_buf);
+    Py_XDECREF(seq);
+    Py_XDECREF(flux_array);
+    PyMem_Free(flux);
+    return res;
 }
 
 static PyObject *
@@ -447,6 +964,268 @@ fail:
     return out;
 }
 
+static PyObject *
+py_decode_mfm(PyObject *self, PyObject *args)
+{
+    Py_buffer in;
+    PyObject *out = NULL;
+
+    if (!PyArg_ParseTuple(args, "y*", &in))
+        return NULL;
+
+    out = PyBytes_FromStringAndSize(NULL, in.len / 2);
+    if (out == NULL)
+        goto fail;
+
+    decode_mfm((const uint8_t *)in.buf,
+               (uint8_t *)PyBytes_AsString(out),
+               in.len / 2);
+
+fail:
+    PyBuffer_Release(&in);
+    return out;
+}
+
+static PyObject *
+py_encode_mfm(PyObject *self, PyObject *args)
+{
+    Py_buffer in;
+    PyObject *out = NULL;
+
+    if (!PyArg_ParseTuple(args, "y*", &in))
+        return NULL;
+
+    out = PyBytes_FromStringAndSize(NULL, in.len * 2);
+    if (out == NULL)
+        goto fail;
+
+    encode_mfm((const uint8_t *)in.buf,
+               (uint8_t *)PyBytes_AsString(out),
+               in.len);
+
+fail:
+    PyBuffer_Release(&in);
+    return out;
+}
+
+static PyObject *
+py_insert_mfm_clocks(PyObject *self, PyObject *args)
+{
+    Py_buffer in;
+    PyObject *out = NULL;
+
+    if (!PyArg_ParseTuple(args, "y*", &in))
+        return NULL;
+
+    out = PyBytes_FromStringAndSize(NULL, in.len);
+    if (out == NULL)
+        goto fail;
+
+    insert_mfm_clocks((const uint8_t *)in.buf,
+                      (uint8_t *)PyBytes_AsString(out),
+                      in.len);
+
+fail:
+    PyBuffer_Release(&in);
+    return out;
+}
+
+static PyObject *
+py_insert_fm_clocks(PyObject *self, PyObject *args)
+{
+    Py_buffer in;
+    PyObject *out = NULL;
+
+    if (!PyArg_ParseTuple(args, "y*", &in))
+        return NULL;
+
+    out = PyBytes_FromStringAndSize(NULL, in.len);
+    if (out == NULL)
+        goto fail;
+
+    insert_fm_clocks((const uint8_t *)in.buf,
+                     (uint8_t *)PyBytes_AsString(out),
+                     in.len);
+
+fail:
+    PyBuffer_Release(&in);
+    return out;
+}
+
+static PyObject *
+py_crc16_ccitt(PyObject *self, PyObject *args)
+{
+    Py_buffer in;
+    unsigned int crc = 0xffff;
+
+    if (!PyArg_ParseTuple(args, "y*|I", &in, &crc))
+        return NULL;
+
+    crc = crc16_ccitt((const uint8_t *)in.buf, in.len, crc);
+
+    PyBuffer_Release(&in);
+    return PyLong_FromLong(crc);
+}
+
+static PyObject *
+py_crc16_ccitt_ranges(PyObject *self, PyObject *args)
+{
+    Py_buffer in;
+    PyObject *ranges, *seq = NULL, *out = NULL;
+    Py_ssize_t i, n, off, len;
+    unsigned int crc = 0xffff;
+
+    if (!PyArg_ParseTuple(args, "y*O|I", &in, &ranges, &crc))
+        return NULL;
+
+    seq = PySequence_Fast(ranges, "Ranges must be iterable");
+    if (seq == NULL)
+        goto fail;
+    n = PySequence_Fast_GET_SIZE(seq);
+
+    out = PyList_New(n);
+    if (out == NULL)
+        goto fail;
+
+    for (i = 0; i < n; i++) {
+        PyObject *r = PySequence_Fast_GET_ITEM(seq, i);
+        if (!PyArg_ParseTuple(r, "nn", &off, &len))
+            goto fail_list;
+        if ((off < 0) || (len < 0) || (off > in.len) || (len > in.len - off)) {
+            PyErr_Format(PyExc_ValueError,
+                         "Range (%zd, %zd) exceeds buffer of length %zd",
+                         off, len, in.len);
+            goto fail_list;
+        }
+        PyList_SET_ITEM(out, i, PyLong_FromLong(
+                            crc16_ccitt((const uint8_t *)in.buf + off,
+                                        len, crc)));
+    }
+
+    goto fail;
+
+fail_list:
+    Py_CLEAR(out);
+fail:
+    Py_XDECREF(seq);
+    PyBuffer_Release(&in);
+    return out;
+}
+
+static PyObject *
+py_crc16_teledisk(PyObject *self, PyObject *args)
+{
+    Py_buffer in;
+    unsigned int crc = 0;
+
+    if (!PyArg_ParseTuple(args, "y*|I", &in, &crc))
+        return NULL;
+
+    crc = crc16_teledisk((const uint8_t *)in.buf, in.len, crc);
+
+    PyBuffer_Release(&in);
+    return PyLong_FromLong(crc);
+}
+
+static PyObject *
+py_find_syncs(PyObject *self, PyObject *args)
+{
+    Py_buffer in;
+    PyObject *patterns, *seq = NULL, *out = NULL;
+    struct sync_pattern *pat = NULL;
+    struct sync_match *match = NULL;
+    Py_ssize_t i, nr_pat, start, end;
+    ptrdiff_t nr;
+
+    if (!PyArg_ParseTuple(args, "y*Onn", &in, &patterns, &start, &end))
+        return NULL;
+
+    if ((start < 0) || (end > in.len * 8)) {
+        PyErr_SetString(PyExc_ValueError, "Search range exceeds buffer");
+        goto fail;
+    }
+
+    seq = PySequence_Fast(patterns, "Patterns must be iterable");
+    if (seq == NULL)
+        goto fail;
+    nr_pat = PySequence_Fast_GET_SIZE(seq);
+
+    pat = PyMem_Malloc((nr_pat ? nr_pat : 1) * sizeof(*pat));
+    if (pat == NULL) {
+        PyErr_NoMemory();
+        goto fail;
+    }
+    for (i = 0; i < nr_pat; i++) {
+        PyObject *p = PySequence_Fast_GET_ITEM(seq, i);
+        unsigned long long val;
+        unsigned int len;
+        if (!PyArg_ParseTuple(p, "KI", &val, &len))
+            goto fail;
+        if ((len < 1) || (len > 64)) {
+            PyErr_Format(PyExc_ValueError,
+                         "Sync pattern length %u not in range 1-64", len);
+            goto fail;
+        }
+        pat[i].val = val;
+        pat[i].len = len;
+    }
+
+    nr = (start < end) ? find_syncs((const uint8_t *)in.buf, start, end,
+                                    pat, nr_pat, &match) : 0;
+    if (nr < 0) {
+        PyErr_NoMemory();
+        goto fail;
+    }
+
+    out = PyList_New(nr);
+    if (out == NULL)
+        goto fail;
+    for (i = 0; i < nr; i++) {
+        PyObject *m = Py_BuildValue("nI", (Py_ssize_t)match[i].offs,
+                                    match[i].idx);
+        if (m == NULL) {
+            Py_CLEAR(out);
+            goto fail;
+        }
+        PyList_SET_ITEM(out, i, m);
+    }
+
+fail:
+    free(match);
+    PyMem_Free(pat);
+    Py_XDECREF(seq);
+    PyBuffer_Release(&in);
+    return out;
+}
+
+static PyObject *
+py_extract_bits(PyObject *self, PyObject *args)
+{
+    Py_buffer in;
+    PyObject *out = NULL;
+    Py_ssize_t offs, nbits;
+
+    if (!PyArg_ParseTuple(args, "y*nn", &in, &offs, &nbits))
+        return NULL;
+
+    if ((offs < 0) || (nbits < 0) || (offs > in.len * 8)
+        || (nbits > in.len * 8 - offs)) {
+        PyErr_SetString(PyExc_ValueError, "Bit range exceeds buffer");
+        goto fail;
+    }
+
+    out = PyBytes_FromStringAndSize(NULL, (nbits + 7) / 8);
+    if (out == NULL)
+        goto fail;
+
+    extract_bits((const uint8_t *)in.buf, offs, nbits,
+                 (uint8_t *)PyBytes_AsString(out));
+
+fail:
+    PyBuffer_Release(&in);
+    return out;
+}
+
 uint8_t *td0_unpack(uint8_t *packeddata, unsigned int size,
                     unsigned int *unpacked_size);
 
@@ -474,8 +1253,12 @@ fail:
 }
 
 static PyMethodDef modulefuncs[] = {
-    { "flux_to_bitcells", flux_to_bitcells, METH_VARARGS, NULL },
+    { "flux_to_bitcells_bulk", flux_to_bitcells_bulk, METH_VARARGS, NULL },
     { "decode_flux", decode_flux, METH_VARARGS, NULL },
+    { "encode_flux", encode_flux, METH_VARARGS, NULL },
+    { "resample_flux", resample_flux, METH_VARARGS, NULL },
+    { "flux_histogram", flux_histogram, METH_VARARGS, NULL },
+    { "bitcells_to_flux", bitcells_to_flux, METH_VARARGS, NULL },
     { "decode_mac_gcr", py_decode_mac_gcr, METH_VARARGS, NULL },
     { "encode_mac_gcr", py_encode_mac_gcr, METH_VARARGS, NULL },
     { "decode_mac_sector", py_decode_mac_sector, METH_VARARGS, NULL },
@@ -485,6 +1268,15 @@ static PyMethodDef modulefuncs[] = {
     { "decode_apple2_sector", py_decode_apple2_sector, METH_VARARGS, NULL },
     { "encode_apple2_sector", py_encode_apple2_sector, METH_VARARGS, NULL },
     { "td0_unpack", py_td0_unpack, METH_VARARGS, NULL },
+    { "decode_mfm", py_decode_mfm, METH_VARARGS, NULL },
+    { "encode_mfm", py_encode_mfm, METH_VARARGS, NULL },
+    { "insert_mfm_clocks", py_insert_mfm_clocks, METH_VARARGS, NULL },
+    { "insert_fm_clocks", py_insert_fm_clocks, METH_VARARGS, NULL },
+    { "crc16_ccitt", py_crc16_ccitt, METH_VARARGS, NULL },
+    { "crc16_ccitt_ranges", py_crc16_ccitt_ranges, METH_VARARGS, NULL },
+    { "crc16_teledisk", py_crc16_teledisk, METH_VARARGS, NULL },
+    { "find_syncs", py_find_syncs, METH_VARARGS, NULL },
+    { "extract_bits", py_extract_bits, METH_VARARGS, NULL },
     { NULL }
 };
 
@@ -494,7 +1286,13 @@ static PyModuleDef moduledef = {
 
 PyMODINIT_FUNC PyInit_optimised(void)
 {
-    append_s = Py_BuildValue("s", "append");
+    PyObject *array_mod;
+    if ((array_mod = PyImport_ImportModule("array")) == NULL)
+        return NULL;
+    array_type = PyObject_GetAttrString(array_mod, "array");
+    Py_DECREF(array_mod);
+    if (array_type == NULL)
+        return NULL;
     return PyModule_Create(&moduledef);
 }
 
@@ -3,15 +3,35 @@
 # This is free and unencumbered software released into the public domain.
 # See the file COPYING for more details, or visit <http://unlicense.org>.
 
-from typing import Any, List, Tuple, Union
+from typing import Any, Iterable, List, Optional, Tuple, Union
+from array import array
 
-def flux_to_bitcells(bit_array, time_array, revolutions,
-                     index_iter, flux_iter,
-                     freq, clock_centre, clock_min, clock_max,
-                     pll_period_adj, pll_phase_adj) -> None:
+def flux_to_bitcells_bulk(flux: array, index: array,
+                          freq: float, clock_centre: float,
+                          clock_min: float, clock_max: float,
+                          pll_period_adj: float, pll_phase_adj: float,
+                          want_timing: bool
+                          ) -> Tuple[bytes, int, Optional[array], List[int]]:
     ...
 
-def decode_flux(dat: bytes) -> Tuple[List[float], List[float]]:
+def decode_flux(dat: bytes) -> Tuple[array, array]:
+    ...
+
+def encode_flux(flux: Iterable[int], nfa_thresh: int, nfa_period: int,
+                dummy_flux: int) -> bytes:
+    ...
+
+def resample_flux(flux: Iterable[float], factor: float,
+                  overflow: int) -> array:
+    ...
+
+def flux_histogram(flux: Iterable[float], factor: float,
+                   nr_bins: int) -> List[int]:
+    ...
+
+def bitcells_to_flux(bits: Any, nr_bits: int, little_endian: bool,
+                     bit_ticks: Optional[Iterable[float]]
+                     ) -> Tuple[array, float]:
     ...
 
 def decode_mac_gcr(dat: bytes) -> bytes:
@@ -41,6 +61,38 @@ def encode_apple2_sector(dat: bytes) -> bytes:
 def td0_unpack(dat: bytes) -> bytes:
     ...
 
+def decode_mfm(dat: bytes) -> bytes:
+    ...
+
+def encode_mfm(dat: bytes) -> bytes:
+    ...
+
+def insert_mfm_clocks(dat: bytes) -> bytes:
+    ...
+
+def insert_fm_clocks(dat: bytes) -> bytes:
+    ...
+
+def crc16_ccitt(dat: Union[bytes, bytearray, memoryview],
+                crc: int = 0xffff) -> int:
+    ...
+
+def crc16_ccitt_ranges(dat: Union[bytes, bytearray, memoryview],
+                       ranges: Iterable[Tuple[int, int]],
+                       crc: int = 0xffff) -> List[int]:
+    ...
+
+def crc16_teledisk(dat: Union[bytes, bytearray, memoryview],
+                   crc: int = 0) -> int:
+    ...
+
+def find_syncs(bits: Any, patterns: Iterable[Tuple[int, int]],
+               start: int, end: int) -> List[Tuple[int, int]]:
+    ...
+
+def extract_bits(bits: Any, offs: int, nbits: int) -> bytes:
+    ...
+
 # Local variables:
 # python-indent: 4
 # End:
@@ -0,0 +1,228 @@
+# greaseweazle/recording.py
+#
+# Record and replay the USB communications of a Greaseweazle session.
+#
+# Written & released by Keir Fraser <keir.xen@gmail.com>
+#
+# This is free and unencumbered software released into the public domain.
+# See the file COPYING for more details, or visit <http://unlicense.org>.
+
+from typing import BinaryIO, List, Tuple
+
+import struct, time
+from timeit import default_timer as timer
+
+from greaseweazle import error
+
+# File header: Signature and format version.
+SIG = b'GWSR'
+VERSION = 1
+
+# Event header: Type, microseconds since previous event, payload length.
+EVENT = struct.Struct('<BII')
+
+## Event types
+class Event:
+    Write           = 0 # Host -> Greaseweazle data
+    Read            = 1 # Greaseweazle -> Host data
+    Baudrate        = 2 # Change of baud rate (control path); u32 payload
+
+
+## Recorder:
+## Wraps a Pyserial instance, logging all data written and read, with
+## timestamps, to the given file.
+class Recorder:
+
+    def __init__(self, ser, name: str) -> None:
+        self.ser = ser
+        self.file: BinaryIO = open(name, 'wb')
+        self.file.write(SIG + bytes([VERSION]))
+        self.time = timer()
+
+    def _log(self, type: int, dat: bytes) -> None:
+        now = timer()
+        usecs = min(round((now - self.time) * 1e6), 0xffffffff)
+        self.time = now
+        self.file.write(EVENT.pack(type, usecs, len(dat)))
+        self.file.write(dat)
+
+    ## finish: Flush the recording and close its file.
+    def finish(self) -> None:
+        self.file.close()
+
+    @property
+    def baudrate(self) -> int:
+        return self.ser.baudrate
+
+    @baudrate.setter
+    def baudrate(self, baud: int) -> None:
+        self.ser.baudrate = baud
+        self._log(Event.Baudrate, struct.pack('<I', baud))
+
+    @property
+    def in_waiting(self) -> int:
+        return self.ser.in_waiting
+
+    def write(self, dat) -> int:
+        n = self.ser.write(dat)
+        self._log(Event.Write, bytes(dat))
+        return n
+
+    def read(self, n: int = 1) -> bytes:
+        dat = self.ser.read(n)
+        if dat:
+            self._log(Event.Read, dat)
+        return dat
+
+    def readinto(self, b) -> int:
+        n = self.ser.readinto(b)
+        if n:
+            self._log(Event.Read, bytes(b[:n]))
+        return n
+
+    def reset_input_buffer(self) -> None:
+        self.ser.reset_input_buffer()
+
+    def reset_output_buffer(self) -> None:
+        self.ser.reset_output_buffer()
+
+    def open(self) -> None:
+        self.ser.open()
+
+    def close(self) -> None:
+        self.ser.close()
+
+
+## Replayer:
+## A Pyserial-compatible object which replays a recording. The host must
+## send exactly the data it sent when the recording was made: Each write is
+## answered by the data which was read in reply. If @realtime, replies arrive
+## with their recorded delay, else immediately.
+class Replayer:
+
+    def __init__(self, name: str, realtime: bool = False) -> None:
+        with open(name, 'rb') as f:
+            dat = f.read()
+        error.check(dat[:4] == SIG and dat[4] == VERSION,
+                    f'{name}: Not a Greaseweazle session recording')
+        self.name, self.realtime = name, realtime
+        self.events: List[Tuple[int, float, bytes]] = []
+        pos, t = 5, 0.0
+        while pos < len(dat):
+            type, usecs, n = EVENT.unpack_from(dat, pos)
+            pos += EVENT.size
+            t += usecs / 1e6
+            self.events.append((type, t, dat[pos:pos+n]))
+            pos += n
+        self.pos = 0
+        self.sent = 0 # Bytes of the next Write event already sent by host
+        self._clear()
+        self.baud = 9600
+        self.is_open = True
+
+    def _diverged(self, what: str) -> error.Fatal:
+        return error.Fatal(f'{self.name}: Replay diverged from recording '
+                           f'at event {self.pos}: Unexpected {what}')
+
+    def _clear(self) -> None:
+        self.rx, self.rx_pos = bytearray(), 0
+        # Times at which received data becomes available:
+        # (end offset in self.rx, timer() value).
+        self.rx_times: List[Tuple[int, float]] = []
+        self.rx_idx = 0
+
+    ## _receive: Queue the replies following a Write event, each available
+    ## after its recorded delay.
+    def _receive(self, t0: float) -> None:
+        now = timer()
+        if self.rx_pos == len(self.rx):
+            self._clear()
+        while (self.pos < len(self.events)
+               and self.events[self.pos][0] == Event.Read):
+            _, t, dat = self.events[self.pos]
+            self.rx += dat
+            self.rx_times.append((len(self.rx),
+                                  now + (t - t0) if self.realtime else 0))
+            self.pos += 1
+
+    ## _ready: Offset in the receive buffer up to which data is available.
+    def _ready(self) -> int:
+        now, rx_times = timer(), self.rx_times
+        while self.rx_idx < len(rx_times) and rx_times[self.rx_idx][1] <= now:
+            self.rx_idx += 1
+        return rx_times[self.rx_idx-1][0] if self.rx_idx else 0
+
+    @property
+    def baudrate(self) -> int:
+        return self.baud
+
+    @baudrate.setter
+    def baudrate(self, baud: int) -> None:
+        if self.pos < len(self.events):
+            type, t, dat = self.events[self.pos]
+            if type == Event.Baudrate and dat == struct.pack('<I', baud):
+                self.pos += 1
+                self.baud = baud
+                # Unread replies are discarded by a communications reset.
+                self._clear()
+                self._receive(t)
+                return
+        raise self._diverged(f'baud rate {baud}')
+
+    @property
+    def in_waiting(self) -> int:
+        return self._ready() - self.rx_pos
+
+    def write(self, dat) -> int:
+        dat = bytes(dat)
+        p = 0
+        while p < len(dat):
+            if (self.pos >= len(self.events)
+                or self.events[self.pos][0] != Event.Write):
+                raise self._diverged('write')
+            _, t, rec = self.events[self.pos]
+            n = min(len(rec) - self.sent, len(dat) - p)
+            if dat[p:p+n] != rec[self.sent:self.sent+n]:
+                raise self._diverged('write data')
+            p += n
+            self.sent += n
+            if self.sent == len(rec):
+                self.pos += 1
+                self.sent = 0
+                self._receive(t)
+        return len(dat)
+
+    def readinto(self, b) -> int:
+        nr = min(len(b), len(self.rx) - self.rx_pos)
+        if nr == 0 and len(b) != 0:
+            raise self._diverged('read')
+        end = self.rx_pos + nr
+        while self._ready() < end:
+            t = self.rx_times[self.rx_idx][1]
+            time.sleep(max(t - timer(), 0))
+        b[:nr] = self.rx[self.rx_pos:end]
+        self.rx_pos = end
+        return nr
+
+    def read(self, n: int = 1) -> bytes:
+        b = bytearray(n)
+        nr = self.readinto(b)
+        return bytes(b[:nr])
+
+    def reset_input_buffer(self) -> None:
+        # All recorded replies were read by the host: None are discarded.
+        pass
+
+    def reset_output_buffer(self) -> None:
+        pass
+
+    def open(self) -> None:
+        self.is_open = True
+
+    def close(self) -> None:
+        self.is_open = False
+
+
+# Local variables:
+# python-indent: 4
+# End:
@@ -66,7 +66,7 @@ def align_track(usb: USB.Unit, args) -> None:
             args.revs = 2
         else:
             if args.drive_ticks_per_rev is None:
-                args.drive_ticks_per_rev = usb.read_track(2).ticks_per_rev
+                args.drive_ticks_per_rev = usb.read_index(2).ticks_per_rev
             args.ticks = int(args.drive_ticks_per_rev * args.revs)
             args.revs = 2
 
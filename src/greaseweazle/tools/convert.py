@@ -7,9 +7,10 @@
 
 description = "Convert between image formats."
 
-from typing import Dict, Tuple, Optional, Type
+from typing import Any, Dict, List, Tuple, Optional, Type
 
-import sys, copy
+import sys, copy, io, contextlib
+from concurrent.futures import Future, ProcessPoolExecutor
 
 import greaseweazle.tools.read
 from greaseweazle.tools import util
@@ -92,26 +93,73 @@ def process_input_track(
     return dat
 
 
+# Per-process state for parallel decode jobs: (args, in_image).
+job_state: Tuple[Any, Image]
+
+def init_job(args, in_image_class: Type[Image], job_plls) -> None:
+    global job_state
+    plls[:] = job_plls
+    job_state = args, open_input_image(args, in_image_class)
+
+
+def run_job(cyl: int, head: int) -> Tuple[Optional[HasFlux], str]:
+    """Decodes one input track in a worker process. Console output is
+    captured and returned to the parent, which prints it in track order.
+    """
+    args, in_image = job_state
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        dat = process_input_track(
+            args, TrackIdentity(args.tracks, cyl, head), in_image)
+    return dat, out.getvalue()
+
+
 def convert(args, in_image: Image, out_image: Image) -> None:
 
     summary: Dict[Tuple[int,int],codec.Codec] = dict()
     dat: Optional[HasFlux]
 
-    for t in args.out_tracks:
-        cyl, head = t.cyl, t.head
-        if (cyl, head) in summary:
-            dat = summary[cyl, head]
-        elif (cyl, head) in args.tracks:
-            dat = process_input_track(
-                args, TrackIdentity(args.tracks, cyl, head), in_image)
-            if dat is None:
+    pool: Optional[ProcessPoolExecutor] = None
+    futures: List[Future[Tuple[Optional[HasFlux], str]]] = []
+    if args.jobs > 1:
+        # Decode input tracks in a pool of worker processes. Results are
+        # collected in the same order as the serial loop below consumes them.
+        work: List[Tuple[int,int]] = []
+        for t in args.out_tracks:
+            if (t.cyl, t.head) in args.tracks:
+                work.append((t.cyl, t.head))
+        pool = ProcessPoolExecutor(
+            max_workers = args.jobs, initializer = init_job,
+            initargs = (args, type(in_image), plls))
+        futures = [pool.submit(run_job, cyl, head) for cyl, head in work]
+    jobs = iter(futures)
+
+    try:
+        for t in args.out_tracks:
+            cyl, head = t.cyl, t.head
+            if (cyl, head) in summary:
+                dat = summary[cyl, head]
+            elif (cyl, head) in args.tracks:
+                if pool is not None:
+                    dat, output = next(jobs).result()
+                    print(output, end='')
+                else:
+                    dat = process_input_track(
+                        args, TrackIdentity(args.tracks, cyl, head), in_image)
+                if dat is None:
+                    continue
+                if args.fmt_cls is not None:
+                    assert isinstance(dat, codec.Codec)
+                    summary[cyl,head] = dat
+            else:
                 continue
-            if args.fmt_cls is not None:
-                assert isinstance(dat, codec.Codec)
-                summary[cyl,head] = dat
-        else:
-            continue
-        out_image.emit_track(t.physical_cyl, t.physical_head, dat)
+            out_image.emit_track(t.physical_cyl, t.physical_head, dat)
+    finally:
+        if pool is not None:
+            # On error or Ctrl-C, do not wait for the remaining tracks.
+            for f in futures:
+                f.cancel()
+            pool.shutdown()
 
     greaseweazle.tools.read.print_summary(args, summary)
 
@@ -143,6 +191,9 @@ def main(argv) -> None:
                         help="convert index positions to hard sectors")
     parser.add_argument("--reverse", action="store_true",
                         help="reverse track data (flippy disk)")
+    parser.add_argument("--jobs", type=util.min_int(1), default=1,
+                        metavar="N",
+                        help="number of parallel track-decode processes")
     parser.add_argument("in_file", help="input filename")
     parser.add_argument("out_file", help="output filename")
     parser.description = description
@@ -22,7 +22,7 @@ def erase(usb: USB.Unit, args) -> None:
     if args.fake_index is not None:
         drive_ticks = args.fake_index * usb.sample_freq
     else:
-        drive_ticks = usb.read_track(2).ticks_per_rev
+        drive_ticks = usb.read_index(2).ticks_per_rev
 
     for t in args.tracks:
         print('T%u.%u: Erasing Track' % (t.cyl, t.head))
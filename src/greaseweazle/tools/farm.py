@@ -0,0 +1,169 @@
+# greaseweazle/tools/farm.py
+#
+# Greaseweazle control script: Read Disks on Multiple Greaseweazles.
+#
+# Written & released by Keir Fraser <keir.xen@gmail.com>
+#
+# This is free and unencumbered software released into the public domain.
+# See the file COPYING for more details, or visit <http://unlicense.org>.
+
+description = "Read disks on all attached Greaseweazles at once."
+
+from typing import List, Optional, Type
+
+import sys, os, copy, threading, textwrap
+from timeit import default_timer as timer
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+from greaseweazle.tools import util, read
+from greaseweazle import error
+from greaseweazle import usb as USB
+from greaseweazle.codec import codec
+from greaseweazle.image import image
+
+
+class FarmOutput:
+    """Prefixes each line printed by a unit's thread with the unit's name,
+    so that the progress of all units is consolidated into one stream.
+    """
+
+    def __init__(self, out) -> None:
+        self.out = out
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def set_prefix(self, prefix: str) -> None:
+        self.local.prefix, self.local.buf = prefix, ''
+
+    def write(self, s: str) -> int:
+        prefix = getattr(self.local, 'prefix', None)
+        if prefix is None:
+            with self.lock:
+                return self.out.write(s)
+        *lines, self.local.buf = (self.local.buf + s).split('\n')
+        if lines:
+            with self.lock:
+                for l in lines:
+                    self.out.write(prefix + l + '\n')
+        return len(s)
+
+    def flush(self) -> None:
+        self.out.flush()
+
+
+class FarmUnit:
+    """A Greaseweazle, and the disk which it reads into an image file.
+    """
+
+    def __init__(self, nr: int, device: str, args) -> None:
+        self.nr, self.device = nr, device
+        self.name = f'[{nr}]'
+        self.args = copy.copy(args)
+        self.args.file = image_name(args.file, nr)
+        self.err: Optional[Exception] = None
+        self.secs = 0.0
+
+    def run(self, output: FarmOutput, image_class: Type[image.Image],
+            decoder: Executor, stop: threading.Event) -> None:
+        output.set_prefix(self.name + ' ')
+        start = timer()
+        try:
+            usb = util.usb_open(self.device)
+            try:
+                read.read_disk(usb, self.args, image_class, decoder, stop)
+            finally:
+                usb.ser.close()
+        except USB.CmdError as err:
+            self.err = error.Fatal("Command Failed: %s" % err)
+        except Exception as err:
+            self.err = err
+        self.secs = timer() - start
+        if self.err is not None:
+            print("** FATAL ERROR:")
+            print(textwrap.dedent(str(self.err)))
+
+
+def image_name(name: str, nr: int) -> str:
+    """Returns the image filename for unit @nr: Any '{}' in @name is replaced
+    by the unit number, else the number is appended to the file's basename.
+    """
+    if '{}' in name:
+        return name.replace('{}', str(nr))
+    base, ext = os.path.splitext(name)
+    return f'{base}_{nr}{ext}'
+
+
+def main(argv) -> None:
+
+    epilog = (util.drive_desc + "\n"
+              + util.speed_desc + "\n" + util.tspec_desc
+              + "\n" + util.pllspec_desc
+              + "\nFORMAT options:\n" + codec.print_formats()
+              + "\n\nSupported file suffixes:\n"
+              + util.columnify(util.image_types))
+    parser = util.ArgumentParser(usage='%(prog)s [options] file',
+                                 epilog=epilog)
+    parser.add_argument("--device", action="append", metavar="DEVICE",
+                        help="device name (COM/serial port); may be "
+                        "repeated (default: all attached Greaseweazles)")
+    parser.add_argument("--jobs", type=util.min_int(1), metavar="N",
+                        help="number of decoder processes "
+                        "(default: number of CPUs)")
+    read.add_args(parser)
+    parser.add_argument("file", help="output filename: '{}' is replaced "
+                        "by each Greaseweazle's unit number")
+    parser.description = description
+    parser.prog += ' ' + argv[1]
+    args = parser.parse_args(argv[2:])
+
+    devices = args.device or util.find_ports()
+    error.check(len(devices) != 0, 'Cannot find any Greaseweazle devices')
+
+    image_class = read.setup_args(args)
+    units = [FarmUnit(nr, device, args) for nr, device in enumerate(devices)]
+
+    print(("Reading %s revs=" % args.tracks) + str(args.revs))
+    if args.format:
+        print("Format " + args.format)
+    for u in units:
+        print(f'{u.name} {u.device} -> {u.args.file}')
+
+    stop = threading.Event()
+    output = FarmOutput(sys.stdout)
+    prev_stdout, sys.stdout = sys.stdout, output
+    try:
+        with ProcessPoolExecutor(max_workers = args.jobs) as decoder:
+            threads = [threading.Thread(target = u.run,
+                                        args = (output, image_class,
+                                                decoder, stop))
+                       for u in units]
+            for t in threads:
+                t.start()
+            try:
+                for t in threads:
+                    t.join()
+            except KeyboardInterrupt:
+                # Each unit stops after its current track, and cleans up.
+                print('\nInterrupted: Stopping all Greaseweazles...')
+                stop.set()
+                for t in threads:
+                    t.join()
+                raise
+    finally:
+        sys.stdout = prev_stdout
+
+    print("***")
+    for u in units:
+        status = 'OK' if u.err is None else 'FAILED'
+        print(f'{u.name} {u.device}: {status} ({u.secs:.1f}s) {u.args.file}')
+    nr_failed = sum(u.err is not None for u in units)
+    error.check(nr_failed == 0,
+                f'{nr_failed} of {len(units)} Greaseweazles failed')
+
+
+if __name__ == "__main__":
+    main(sys.argv)
+
+# Local variables:
+# python-indent: 4
+# End:
@@ -81,7 +81,7 @@ def main(argv) -> None:
         
     port = usb.port_info
 
-    if port.device:
+    if port is not None and port.device:
         print_info_line('Port', port.device, tab=2)
 
     try:
@@ -110,7 +110,8 @@ def main(argv) -> None:
         fwver += ' (Bootloader)'
     print_info_line('Firmware', fwver, tab=2)
 
-    print_info_line('Serial', port.serial_number if port.serial_number
+    print_info_line('Serial', port.serial_number
+                    if port is not None and port.serial_number
                     else 'Unknown', tab=2)
 
     usb_strs = list()
@@ -9,9 +9,10 @@
 
 description = "Read a disk to the specified image file."
 
-from typing import cast, Dict, Tuple, List, Type, Optional
+from typing import cast, Dict, Iterator, Tuple, List, Type, Optional
 
-import sys, copy
+import sys, copy, threading
+from concurrent.futures import Executor, ThreadPoolExecutor
 
 from greaseweazle.tools import util
 from greaseweazle import error
@@ -23,6 +24,10 @@ from greaseweazle.image import image
 from greaseweazle import track
 plls = track.plls
 
+# Revolutions in the initial capture of each track by an adaptive read,
+# when reading a fractional number of revolutions.
+ADAPTIVE_REVS = 1.1
+
 def open_image(args, image_class: Type[image.Image]) -> image.Image:
     image = image_class.to_file(
         args.file, None if args.raw else args.fmt_cls, args.no_clobber,
@@ -52,7 +57,59 @@ def read_and_normalise(usb: USB.Unit, args, revs: int, ticks=0) -> Flux:
     return flux
 
 
-def read_with_retry(usb: USB.Unit, args, t) -> Tuple[Flux, Optional[HasFlux]]:
+def capture_limits(args, revs: float) -> Tuple[int, int]:
+    """Converts a number of revolutions to capture per track into the
+    index-pulse and tick limits of a flux read.
+    """
+    if isinstance(revs, float):
+        return 2, int(args.drive_ticks_per_rev * revs)
+    if args.hard_sectors:
+        # Hard-sectored disks have "hard_sectors + 1" holes.
+        # We read an extra revolution's worth to be sure we get the requested
+        # number of full index-to-index revolutions.
+        revs = (args.hard_sectors + 1) * (revs + 1)
+    return revs, 0
+
+
+def seek_track(usb: USB.Unit, args, t) -> None:
+    usb.seek(t.physical_cyl, t.physical_head)
+    if args.gen_tg43:
+        usb.set_pin(2, t.cyl < 60)
+
+
+def capture_track(usb: USB.Unit, args, t) -> Flux:
+    # Seek, head select and flux read are sent to Greaseweazle as a batch.
+    with usb.batch():
+        seek_track(usb, args, t)
+        return read_and_normalise(usb, args, args.first_revs, args.first_ticks)
+
+
+def decode_flux(fmt_cls: codec.DiskDef, cyl: int, head: int, flux: Flux,
+                plls: List[track.PLL]) -> Optional[codec.Codec]:
+    """Initial decode of a track's captured flux, with each PLL in turn.
+    This may run in a worker process: All state is passed in.
+    """
+    dat = fmt_cls.decode_flux(cyl, head, flux)
+    if dat is None:
+        return None
+    for pll in plls[1:]:
+        if dat.nr_missing() == 0:
+            break
+        dat.decode_flux(flux, pll)
+    return dat
+
+
+def decode_track(args, t, flux: Flux,
+                 decoder: Optional[Executor] = None) -> Optional[codec.Codec]:
+    if decoder is None:
+        return decode_flux(args.fmt_cls, t.cyl, t.head, flux, plls)
+    return decoder.submit(decode_flux, args.fmt_cls, t.cyl, t.head,
+                          flux, plls).result()
+
+
+def retry_track(usb: USB.Unit, args, t, flux: Flux,
+                dat: Optional[codec.Codec],
+                reseek: bool = False) -> Tuple[Flux, Optional[HasFlux]]:
 
     cyl, head = t.cyl, t.head
 
@@ -60,26 +117,29 @@ def read_with_retry(usb: USB.Unit, args, t) -> Tuple[Flux, Optional[HasFlux]]:
     if t.physical_cyl != cyl or t.physical_head != head:
         tspec += f' <- Drive {t.physical_cyl}.{t.physical_head}'
 
-    usb.seek(t.physical_cyl, t.physical_head)
-
-    if args.gen_tg43:
-        usb.set_pin(2, cyl < 60)
-
-    flux = read_and_normalise(usb, args, args.revs, args.ticks)
     if args.fmt_cls is None:
         print(f'{tspec}: {flux.summary_string()}')
         return flux, flux
 
-    dat = args.fmt_cls.decode_flux(cyl, head, flux)
     if dat is None:
         print("%s: WARNING: Out of range for format '%s': No format "
               "conversion applied: %s" % (tspec, args.format,
                 flux.summary_string()))
         return flux, None
-    for pll in plls[1:]:
-        if dat.nr_missing() == 0:
-            break
-        dat.decode_flux(flux, pll)
+
+    if args.adaptive and dat.nr_missing() != 0:
+        # Adaptive read: The initial short capture is missing sectors.
+        # Capture the remaining revolutions before falling back to retries.
+        with usb.batch():
+            if reseek:
+                seek_track(usb, args, t)
+                reseek = False
+            flux = read_and_normalise(usb, args, args.more_revs,
+                                      args.more_ticks)
+        for pll in plls:
+            if dat.nr_missing() == 0:
+                break
+            dat.decode_flux(flux, pll)
 
     seek_retry, retry = 0, 0
     while True:
@@ -96,14 +156,19 @@ def read_with_retry(usb: USB.Unit, args, t) -> Tuple[Flux, Optional[HasFlux]]:
                       % (tspec, dat.nr_missing()))
                 break
             if retry != 0:
+                # Re-home the heads, even if we believe they are at cylinder 0.
+                usb.forget_position()
                 usb.seek(0, 0)
-                usb.seek(t.physical_cyl, t.physical_head)
-                if args.gen_tg43:
-                    usb.set_pin(2, cyl < 60)
+                reseek = True
             seek_retry += 1
             retry = 0
         retry += 1
-        _flux = read_and_normalise(usb, args, max(args.revs, 3))
+        with usb.batch():
+            if reseek:
+                # The drive heads are elsewhere: Return to this track.
+                seek_track(usb, args, t)
+                reseek = False
+            _flux = read_and_normalise(usb, args, max(args.revs, 3))
         for pll in plls:
             if dat.nr_missing() == 0:
                 break
@@ -116,6 +181,52 @@ def read_with_retry(usb: USB.Unit, args, t) -> Tuple[Flux, Optional[HasFlux]]:
     return flux, dat
 
 
+def read_with_retry(usb: USB.Unit, args, t,
+                    decoder: Optional[Executor] = None
+                    ) -> Tuple[Flux, Optional[HasFlux]]:
+    flux = capture_track(usb, args, t)
+    dat = (None if args.fmt_cls is None
+           else decode_track(args, t, flux, decoder))
+    return retry_track(usb, args, t, flux, dat)
+
+
+def read_tracks(usb: USB.Unit, args,
+                decoder: Optional[Executor] = None) -> Iterator[
+        Tuple[int, int, Flux, Optional[HasFlux]]]:
+    for t in args.tracks:
+        flux, dat = read_with_retry(usb, args, t, decoder)
+        yield t.cyl, t.head, flux, dat
+
+
+def read_tracks_pipelined(usb: USB.Unit, args) -> Iterator[
+        Tuple[int, int, Flux, Optional[HasFlux]]]:
+    """Captures each track while the previous track is decoded by a worker
+    thread. A track is retried only if its initial decode has missing
+    sectors, in which case the drive is sought back to it.
+    """
+    here = None # Track currently under the drive heads
+    def finish(t, flux, decode):
+        nonlocal here
+        dat = decode.result()
+        reseek = t is not here
+        if dat is not None and dat.nr_missing() != 0:
+            here = t # Any retries will leave the drive heads on this track
+        flux, dat = retry_track(usb, args, t, flux, dat, reseek)
+        return t.cyl, t.head, flux, dat
+    with ThreadPoolExecutor(max_workers = 1) as decoder:
+        pending = None
+        for t in args.tracks:
+            # The track iterator updates its result in place: Take a copy.
+            here = t = copy.copy(t)
+            flux = capture_track(usb, args, t)
+            job = (t, flux, decoder.submit(decode_track, args, t, flux))
+            if pending is not None:
+                yield finish(*pending)
+            pending = job
+        if pending is not None:
+            yield finish(*pending)
+
+
 def print_summary(args, summary: Dict[Tuple[int,int],codec.Codec]) -> None:
     if not summary:
         return
@@ -154,8 +265,12 @@ def print_summary(args, summary: Dict[Tuple[int,int],codec.Codec]) -> None:
               (good_sec, tot_sec, good_sec*100/tot_sec))
 
 
-def read_to_image(usb: USB.Unit, args, image: image.Image) -> None:
+def read_to_image(usb: USB.Unit, args, image: image.Image,
+                  decoder: Optional[Executor] = None,
+                  stop: Optional[threading.Event] = None) -> None:
     """Reads a floppy disk and dumps it into a new image file.
+    Initial decodes are run on @decoder, if specified.
+    If @stop is set, the read is abandoned before the next track.
     """
 
     args.ticks, args.drive_ticks_per_rev = 0, None
@@ -172,29 +287,39 @@ def read_to_image(usb: USB.Unit, args, image: image.Image) -> None:
         del flux
 
     if isinstance(args.revs, float):
-        if args.raw:
+        if args.raw or args.hard_sectors:
             # If dumping raw flux we want full index-to-index revolutions.
+            # Hard-sectored disks are always read in whole revolutions.
             args.revs = 2
-        else:
+        elif args.drive_ticks_per_rev is None:
             # Measure drive RPM.
             # We will adjust the flux intervals per track to allow for this.
-            if args.drive_ticks_per_rev is None:
-                args.drive_ticks_per_rev = usb.read_track(2).ticks_per_rev
-            args.ticks = int(args.drive_ticks_per_rev * args.revs)
-            args.revs = 2
-
-    if args.hard_sectors:
-        # Hard-sectored disks have "hard_sectors + 1" holes.
-        # We read an extra revolution's worth to be sure we get the requested
-        # number of full index-to-index revolutions.
-        args.revs = (args.hard_sectors + 1) * (args.revs + 1)
-        args.ticks = 0
+            args.drive_ticks_per_rev = usb.read_index(2).ticks_per_rev
+
+    revs = args.revs
+    args.revs, args.ticks = capture_limits(args, revs)
+
+    # The initial capture of each track. An adaptive read first captures a
+    # single revolution, and captures the rest only if sectors are missing.
+    args.first_revs, args.first_ticks = args.revs, args.ticks
+    if args.adaptive:
+        first = ADAPTIVE_REVS if isinstance(revs, float) else 1
+        if revs <= first:
+            raise error.Fatal("--adaptive has no effect when reading "
+                              f"{revs} revolutions per track")
+        args.first_revs, args.first_ticks = capture_limits(args, first)
+        args.more_revs, args.more_ticks = capture_limits(args, revs - first)
 
     summary: Dict[Tuple[int,int],codec.Codec] = dict()
 
-    for t in args.tracks:
-        cyl, head = t.cyl, t.head
-        flux, dat = read_with_retry(usb, args, t)
+    if args.pipeline and args.fmt_cls is not None:
+        tracks = read_tracks_pipelined(usb, args)
+    else:
+        tracks = read_tracks(usb, args, decoder)
+
+    for cyl, head, flux, dat in tracks:
+        if stop is not None and stop.is_set():
+            raise error.Fatal('Interrupted')
         if args.fmt_cls is not None and dat is not None:
             assert isinstance(dat, codec.Codec)
             summary[cyl,head] = dat
@@ -205,19 +330,13 @@ def read_to_image(usb: USB.Unit, args, image: image.Image) -> None:
 
     if args.fmt_cls is not None:
         print_summary(args, summary)
+    if args.stats:
+        print(f'Flux received: {usb.read_stats}')
 
 
-def main(argv) -> None:
-
-    epilog = (util.drive_desc + "\n"
-              + util.speed_desc + "\n" + util.tspec_desc
-              + "\n" + util.pllspec_desc
-              + "\nFORMAT options:\n" + codec.print_formats()
-              + "\n\nSupported file suffixes:\n"
-              + util.columnify(util.image_types))
-    parser = util.ArgumentParser(usage='%(prog)s [options] file',
-                                 epilog=epilog)
-    parser.add_argument("--device", help="device name (COM/serial port)")
+def add_args(parser: util.ArgumentParser) -> None:
+    """Adds the disk-reading options, shared with other tools, to @parser.
+    """
     parser.add_argument("--drive", type=util.Drive(), default='A',
                         help="drive to read")
     parser.add_argument("--diskdefs", help="disk definitions file")
@@ -251,53 +370,93 @@ def main(argv) -> None:
                         help="generate TG43 signal for 8-inch drive on pin 2 from track 60. Enable postcompensation filter")
     parser.add_argument("--reverse", action="store_true",
                         help="reverse track data (flippy disk)")
-    parser.add_argument("file", help="output filename")
-    parser.description = description
-    parser.prog += ' ' + argv[1]
-    args = parser.parse_args(argv[2:])
-
+    parser.add_argument("--pipeline", action="store_true",
+                        help="decode each track while reading the next")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="read more than one revolution only if sectors "
+                        "are missing")
+    parser.add_argument("--stats", action="store_true",
+                        help="print flux transfer statistics when done")
+
+
+def setup_args(args) -> Type[image.Image]:
+    """Validates and fills in the options added by add_args().
+    Returns the class of the output image file.
+    """
     args.file, args.file_opts = util.split_opts(args.file)
 
     if args.pll is not None:
         plls.insert(0, args.pll)
 
-    try:
-        usb = util.usb_open(args.device)
-        image_class = util.get_image_class(args.file)
-        if not args.format:
-            args.format = image_class.default_format
-        def_tracks, args.fmt_cls = None, None
-        if args.format:
-            args.fmt_cls = codec.get_diskdef(args.format, args.diskdefs)
-            if args.fmt_cls is None:
-                raise error.Fatal("""\
+    image_class = util.get_image_class(args.file)
+    if not args.format:
+        args.format = image_class.default_format
+    def_tracks, args.fmt_cls = None, None
+    if args.format:
+        args.fmt_cls = codec.get_diskdef(args.format, args.diskdefs)
+        if args.fmt_cls is None:
+            raise error.Fatal("""\
 Unknown format '%s'
 Known formats:\n%s"""
-                                  % (args.format, codec.print_formats(
-                                      args.diskdefs)))
-            def_tracks = copy.copy(args.fmt_cls.tracks)
-            if args.revs is None: args.revs = args.fmt_cls.default_revs
-        if def_tracks is None:
-            def_tracks = util.TrackSet('c=0-81:h=0-1')
-        if args.revs is None: args.revs = 3
-        if args.tracks is not None:
-            def_tracks.update_from_trackspec(args.tracks.trackspec)
-        args.tracks = def_tracks
+                              % (args.format, codec.print_formats(
+                                  args.diskdefs)))
+        def_tracks = copy.copy(args.fmt_cls.tracks)
+        if args.revs is None: args.revs = args.fmt_cls.default_revs
+    if args.adaptive and (args.fmt_cls is None or args.raw):
+        raise error.Fatal("--adaptive requires --format, without --raw")
+    if def_tracks is None:
+        def_tracks = util.TrackSet('c=0-81:h=0-1')
+    if args.revs is None: args.revs = 3
+    if args.tracks is not None:
+        def_tracks.update_from_trackspec(args.tracks.trackspec)
+    args.tracks = def_tracks
+
+    return image_class
+
+
+def read_disk(usb: USB.Unit, args, image_class: Type[image.Image],
+              decoder: Optional[Executor] = None,
+              stop: Optional[threading.Event] = None) -> None:
+    """Reads the disk in the drive attached to @usb into args.file.
+    """
+    try:
+        if args.densel is not None or args.gen_tg43:
+            prev_pin2 = usb.get_pin(2)
+        if args.densel is not None:
+            usb.set_pin(2, args.densel)
+        with open_image(args, image_class) as image:
+            util.with_drive_selected(
+                lambda: read_to_image(usb, args, image, decoder, stop),
+                usb, args.drive)
+    finally:
+        if args.densel is not None or args.gen_tg43:
+            usb.set_pin(2, prev_pin2)
+
+
+def main(argv) -> None:
+
+    epilog = (util.drive_desc + "\n"
+              + util.speed_desc + "\n" + util.tspec_desc
+              + "\n" + util.pllspec_desc
+              + "\nFORMAT options:\n" + codec.print_formats()
+              + "\n\nSupported file suffixes:\n"
+              + util.columnify(util.image_types))
+    parser = util.ArgumentParser(usage='%(prog)s [options] file',
+                                 epilog=epilog)
+    parser.add_argument("--device", help="device name (COM/serial port)")
+    add_args(parser)
+    parser.add_argument("file", help="output filename")
+    parser.description = description
+    parser.prog += ' ' + argv[1]
+    args = parser.parse_args(argv[2:])
 
+    try:
+        usb = util.usb_open(args.device)
+        image_class = setup_args(args)
         print(("Reading %s revs=" % args.tracks) + str(args.revs))
         if args.format:
             print("Format " + args.format)
-        try:
-            if args.densel is not None or args.gen_tg43:
-                prev_pin2 = usb.get_pin(2)
-            if args.densel is not None:
-                usb.set_pin(2, args.densel)
-            with open_image(args, image_class) as image:
-                util.with_drive_selected(
-                    lambda: read_to_image(usb, args, image), usb, args.drive)
-        finally:
-            if args.densel is not None or args.gen_tg43:
-                usb.set_pin(2, prev_pin2)
+        read_disk(usb, args, image_class)
     except USB.CmdError as err:
         print("Command Failed: %s" % err)
 
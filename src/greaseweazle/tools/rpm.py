@@ -9,6 +9,8 @@
 
 description = "Measure RPM of drive spindle."
 
+from typing import List
+
 from greaseweazle.tools import util
 from greaseweazle import usb as USB
 
@@ -19,14 +21,17 @@ def print_rpm(usb: USB.Unit, args) -> None:
     """Prints spindle RPM.
     """
 
-    time_per_rev = list()
+    time_per_rev: List[float] = list()
 
     try:
-        for _ in range(args.nr):
-            flux = usb.read_track(1)
-            tpr = flux.index_list[-1] / flux.sample_freq
-            time_per_rev.append(tpr)
-            print(speed_str(tpr))
+        # Measure consecutive revolutions, in batches.
+        while len(time_per_rev) < args.nr:
+            revs = min(args.nr - len(time_per_rev), USB.MAX_INDEX_TIMES - 1)
+            flux = usb.read_index(revs)
+            for ticks in flux.index_list[1:]:
+                tpr = ticks / flux.sample_freq
+                time_per_rev.append(tpr)
+                print(speed_str(tpr))
     finally:
         if len(time_per_rev) > 1:
             mean = sum(time_per_rev)/len(time_per_rev)
@@ -8,9 +8,9 @@
 # See the file COPYING for more details, or visit <http://unlicense.org>.
 
 from __future__ import annotations
-from typing import Callable
+from typing import Callable, Optional
 
-import argparse, os, sys, serial, struct, time, re, platform
+import argparse, atexit, os, sys, serial, struct, time, re, platform
 import importlib
 from collections import OrderedDict
 import itertools as it
@@ -396,6 +396,12 @@ def find_port(old_port=None):
         return best_port.device
     raise serial.SerialException('Cannot find the Greaseweazle device')
 
+def find_ports():
+    """Returns the device names of all attached Greaseweazles."""
+    ports = [x for x in comports() if score_port(x) > 0]
+    ports.sort(key = lambda x: x.device)
+    return [x.device for x in ports]
+
 def port_info(devname):
     for x in comports():
         if x.device == devname:
@@ -477,12 +483,40 @@ If the problem persists, install the Update Jumper at pins RXI-TXO.""")
     return usb
 
 
+# Name of a file in which to record the next session opened by usb_open().
+record_file: Optional[str] = None
+
+def record_session(ser):
+    global record_file
+    if record_file is None:
+        return ser
+    from greaseweazle import recording
+    rec = recording.Recorder(ser, record_file)
+    atexit.register(rec.finish)
+    record_file = None
+    return rec
+
 def usb_open(devicename, is_update=False, mode_check=True):
 
     if devicename is None:
         devicename = find_port()
-    
-    usb = USB.Unit(serial.Serial(devicename))
+
+    if devicename.startswith(('virtual:', 'replay:')):
+        # A software Greaseweazle: Serves flux from an image file, or
+        # replays a recorded session.
+        from greaseweazle import virtual, recording
+        kind, spec = devicename.split(':', 1)
+        if kind == 'virtual':
+            ser = virtual.open_device(spec)
+        else:
+            name, opts = split_opts(spec)
+            ser = recording.Replayer(name, realtime = 'realtime' in opts)
+        usb = USB.Unit(record_session(ser))
+        usb.port_info = None
+        usb.jumperless_update = usb.can_mode_switch = False
+        return usb
+
+    usb = USB.Unit(record_session(serial.Serial(devicename)))
     usb.port_info = port_info(devicename)
     is_win7 = (platform.system() == 'Windows' and platform.release() == '7')
     usb.jumperless_update = ((usb.hw_model, usb.hw_submodel) != (1, 0)
@@ -9,14 +9,15 @@
 
 description = "Write a disk from the specified image file."
 
-from typing import cast, Optional, List, Type
+from typing import cast, Dict, Optional, List, Tuple, Type
 
-import sys, copy
+import sys, copy, contextlib
 
 from greaseweazle.tools import util
 from greaseweazle import error, track
 from greaseweazle import usb as USB
 from greaseweazle.codec import codec
+from greaseweazle.flux import HasFlux, WriteoutFlux, resample_flux
 from greaseweazle.image import image
 from greaseweazle.image.img import IMG
 from greaseweazle.track import HasVerify, MasterTrack
@@ -25,9 +26,99 @@ from greaseweazle.track import HasVerify, MasterTrack
 def open_image(args, image_class: Type[image.Image]) -> image.Image:
     return image_class.from_file(args.file, args.fmt_cls, args.file_opts)
 
+# PreparedTrack:
+# A track of the image, ready to write to disk. When writing more than one
+# copy of the image, tracks are prepared once and reused for every copy.
+class PreparedTrack:
+
+    def __init__(self, track: Optional[HasFlux] = None,
+                 wflux: Optional[WriteoutFlux] = None) -> None:
+        # If there is no track, the disk track is erased.
+        self.track = track
+        self.wflux = wflux
+        # Encoded stream, resampled for the specified drive speed.
+        self.dat = b''
+        self.drive_ticks_per_rev = 0.0
+
+    def stream(self, usb: USB.Unit, drive_ticks_per_rev: float) -> bytes:
+        if self.drive_ticks_per_rev != drive_ticks_per_rev:
+            assert self.wflux is not None
+            # @factor adjusts flux times for speed variations between the
+            # read-in and write-out drives.
+            factor = drive_ticks_per_rev / self.wflux.ticks_to_index
+            # Convert the flux samples to Greaseweazle sample frequency.
+            self.dat = usb.encode_track(
+                resample_flux(self.wflux.list, factor))
+            self.drive_ticks_per_rev = drive_ticks_per_rev
+        return self.dat
+
+
+# WriteSession:
+# State carried between copies of the image written in one session.
+class WriteSession:
+
+    # Drive speeds within this fraction of the previous copy's are treated as
+    # measurement noise, allowing prepared streams to be reused unchanged.
+    SPEED_TOLERANCE = 0.001
+
+    def __init__(self, cache_tracks: bool = False) -> None:
+        # Prepared tracks are kept only if they are to be written again.
+        self.cache_tracks = cache_tracks
+        self.tracks: Dict[Tuple[int,int], Optional[PreparedTrack]] = dict()
+        self.drive_ticks_per_rev: Optional[float] = None
+
+    def drive_speed(self, drive_ticks_per_rev: float) -> float:
+        prev = self.drive_ticks_per_rev
+        if (prev is None or abs(drive_ticks_per_rev - prev)
+            > prev * self.SPEED_TOLERANCE):
+            self.drive_ticks_per_rev = drive_ticks_per_rev
+        assert self.drive_ticks_per_rev is not None # mypy
+        return self.drive_ticks_per_rev
+
+
+# prepare_track:
+# Generates the flux to write to the specified track (cyl, head) of the image.
+# Returns None if the track is to be skipped.
+def prepare_track(args, image: image.Image, cyl: int, head: int,
+                  tspec: str) -> Optional[PreparedTrack]:
+
+    track = image.get_track(cyl, head)
+    if track is None:
+        return PreparedTrack() if args.erase_empty else None
+
+    if not isinstance(track, codec.Codec) and args.fmt_cls is not None:
+        track = args.fmt_cls.decode_flux(cyl, head, track)
+        if track is None:
+            print("%s: WARNING: Out of range for format '%s': Track "
+                  "skipped" % (tspec, args.format))
+            return None
+        assert isinstance(track, codec.Codec)
+        error.check(track.nr_missing() == 0,
+                    '%s: %u missing sectors in input image'
+                    % (tspec, track.nr_missing()))
+    if isinstance(track, codec.Codec):
+        track = track.master_track()
+
+    if isinstance(track, MasterTrack):
+        if args.reverse:
+            track.reverse()
+        if args.precomp is not None:
+            track.precomp = args.precomp.track_precomp(cyl)
+    elif args.reverse:
+        track = track.flux()
+        track.reverse()
+    wflux = track.flux_for_writeout(cue_at_index = args.fake_index is None)
+
+    return PreparedTrack(track, wflux)
+
+
 # write_from_image:
 # Writes the specified image file to floppy disk.
-def write_from_image(usb: USB.Unit, args, image: image.Image) -> None:
+def write_from_image(usb: USB.Unit, args, image: image.Image,
+                     session: Optional[WriteSession] = None) -> None:
+
+    if session is None:
+        session = WriteSession()
 
     hard_sector_ticks = 0
 
@@ -40,13 +131,14 @@ def write_from_image(usb: USB.Unit, args, image: image.Image) -> None:
         flux = usb.read_track(revs = 0, ticks = int(usb.sample_freq / 2))
         flux.identify_hard_sectors()
         assert flux.sector_list is not None # mypy
-        drive_ticks_per_rev = flux.ticks_per_rev
+        drive_ticks_per_rev = session.drive_speed(flux.ticks_per_rev)
         args.hard_sectors = len(flux.sector_list[-1])
         hard_sector_ticks = int(drive_ticks_per_rev / args.hard_sectors)
         print(f'Drive reports {args.hard_sectors} hard sectors')
         del flux
     else:
-        drive_ticks_per_rev = usb.read_track(2).ticks_per_rev
+        drive_ticks_per_rev = session.drive_speed(
+            usb.read_index(2).ticks_per_rev)
 
     verified_count, not_verified_count = 0, 0
 
@@ -54,114 +146,95 @@ def write_from_image(usb: USB.Unit, args, image: image.Image) -> None:
 
         cyl, head = t.cyl, t.head
 
-        track = image.get_track(cyl, head)
-        if track is None and not args.erase_empty:
-            continue
-
         tspec = f'T{cyl}.{head}'
         if t.physical_cyl != cyl or t.physical_head != head:
             tspec += f' -> Drive {t.physical_cyl}.{t.physical_head}'
 
-        usb.seek(t.physical_cyl, t.physical_head)
+        if (cyl, head) in session.tracks:
+            p = session.tracks[cyl, head]
+        else:
+            p = prepare_track(args, image, cyl, head, tspec)
+            if session.cache_tracks:
+                session.tracks[cyl, head] = p
+        if p is None:
+            continue
+
+        # Encode the flux times for Greaseweazle.
+        dat = None if p.wflux is None else p.stream(usb, drive_ticks_per_rev)
 
-        if args.gen_tg43:
-            usb.set_pin(2, cyl < 43)
+        # Seek and head select are sent to Greaseweazle in a single batch
+        # with the track's first write, or ahead of its first erase.
+        with contextlib.ExitStack() as batch:
+            batch.enter_context(usb.batch())
+            usb.seek(t.physical_cyl, t.physical_head)
 
-        if track is None:
-            print(f'{tspec}: Erasing Track')
-            usb.erase_track(drive_ticks_per_rev * 1.1)
-            continue
+            if args.gen_tg43:
+                usb.set_pin(2, cyl < 43)
 
-        if not isinstance(track, codec.Codec) and args.fmt_cls is not None:
-            track = args.fmt_cls.decode_flux(cyl, head, track)
-            if track is None:
-                print("%s: WARNING: Out of range for format '%s': Track "
-                      "skipped" % (tspec, args.format))
-                continue
-            assert isinstance(track, codec.Codec)
-            error.check(track.nr_missing() == 0,
-                        '%s: %u missing sectors in input image'
-                        % (tspec, track.nr_missing()))
-        if isinstance(track, codec.Codec):
-            track = track.master_track()
-
-        if isinstance(track, MasterTrack):
-            if args.reverse:
-                track.reverse()
-            if args.precomp is not None:
-                track.precomp = args.precomp.track_precomp(cyl)
-        elif args.reverse:
-            track = track.flux()
-            track.reverse()
-        wflux = track.flux_for_writeout(cue_at_index = not no_index)
-
-        # @factor adjusts flux times for speed variations between the
-        # read-in and write-out drives.
-        factor = drive_ticks_per_rev / wflux.ticks_to_index
-
-        # Convert the flux samples to Greaseweazle sample frequency.
-        rem = 0.0
-        wflux_list = []
-        for x in wflux.list:
-            y = x * factor + rem
-            val = round(y)
-            rem = y - val
-            wflux_list.append(val)
-
-        # Encode the flux times for Greaseweazle, and write them out.
-        verified = False
-        for retry in range(args.retries+1):
-            if args.pre_erase:
+            if p.wflux is None:
                 print(f'{tspec}: Erasing Track')
                 usb.erase_track(drive_ticks_per_rev * 1.1)
-            s = f'{tspec}: Writing Track'
-            if retry != 0:
-                s += " (Verify Failure: Retry #%u)" % retry
-            else:
-                s += " (%s)" % wflux.summary_string()
-            print(s)
-            usb.write_track(flux_list = wflux_list,
-                            cue_at_index = wflux.index_cued,
-                            terminate_at_index = wflux.terminate_at_index,
-                            hard_sector_ticks = hard_sector_ticks)
-            verify: Optional[HasVerify] = None
-            no_verify = (args.no_verify
-                         or not isinstance(track, MasterTrack)
-                         or (verify := track.verify) is None)
-            if no_verify:
-                not_verified_count += 1
-                verified = True
-                break
-            assert verify is not None # mypy
-            v_revs, v_ticks = verify.verify_revs, 0
-            if isinstance(v_revs, float):
-                v_ticks = int(drive_ticks_per_rev * v_revs)
-                v_revs = 2
-            if args.hard_sectors:
-                v_ticks = 0
-                v_revs = cast(int, (args.hard_sectors + 1) * 2)
-            if no_index:
-                drive_tpr = int(drive_ticks_per_rev)
-                pre_index = int(usb.sample_freq * 0.5e-3)
-                if v_ticks == 0:
-                    v_ticks = v_revs*drive_tpr + 2*pre_index
-                v_flux = usb.read_track(revs = 0, ticks = v_ticks)
-                index_list = (
-                    [pre_index]
-                    + [drive_tpr] * ((v_ticks-pre_index)//drive_tpr))
-                v_flux.index_list = cast(List[float], index_list) # mypy
-            else:
-                v_flux = usb.read_track(revs = v_revs, ticks = v_ticks)
-            v_flux._ticks_per_rev = drive_ticks_per_rev
-            if args.reverse:
-                v_flux.reverse()
-            if args.hard_sectors:
-                v_flux.identify_hard_sectors()
-            verified = verify.verify_track(v_flux)
-            if verified:
-                verified_count += 1
-                break
-        error.check(verified, "Failed to verify Track %u.%u" % (cyl, head))
+                continue
+
+            # Write the flux times out.
+            track, wflux = p.track, p.wflux
+            assert dat is not None # mypy
+            verified = False
+            for retry in range(args.retries+1):
+                if args.pre_erase:
+                    print(f'{tspec}: Erasing Track')
+                    usb.erase_track(drive_ticks_per_rev * 1.1)
+                s = f'{tspec}: Writing Track'
+                if retry != 0:
+                    s += " (Verify Failure: Retry #%u)" % retry
+                else:
+                    s += " (%s)" % wflux.summary_string()
+                print(s)
+                usb.write_track_stream(
+                    dat,
+                    cue_at_index = wflux.index_cued,
+                    terminate_at_index = wflux.terminate_at_index,
+                    hard_sector_ticks = hard_sector_ticks)
+                # The seek has now been sent: End the batch.
+                batch.close()
+                verify: Optional[HasVerify] = None
+                no_verify = (args.no_verify
+                             or not isinstance(track, MasterTrack)
+                             or (verify := track.verify) is None)
+                if no_verify:
+                    not_verified_count += 1
+                    verified = True
+                    break
+                assert verify is not None # mypy
+                v_revs, v_ticks = verify.verify_revs, 0
+                if isinstance(v_revs, float):
+                    v_ticks = int(drive_ticks_per_rev * v_revs)
+                    v_revs = 2
+                if args.hard_sectors:
+                    v_ticks = 0
+                    v_revs = cast(int, (args.hard_sectors + 1) * 2)
+                if no_index:
+                    drive_tpr = int(drive_ticks_per_rev)
+                    pre_index = int(usb.sample_freq * 0.5e-3)
+                    if v_ticks == 0:
+                        v_ticks = v_revs*drive_tpr + 2*pre_index
+                    v_flux = usb.read_track(revs = 0, ticks = v_ticks)
+                    index_list = (
+                        [pre_index]
+                        + [drive_tpr] * ((v_ticks-pre_index)//drive_tpr))
+                    v_flux.index_list = cast(List[float], index_list) # mypy
+                else:
+                    v_flux = usb.read_track(revs = v_revs, ticks = v_ticks)
+                v_flux._ticks_per_rev = drive_ticks_per_rev
+                if args.reverse:
+                    v_flux.reverse()
+                if args.hard_sectors:
+                    v_flux.identify_hard_sectors()
+                verified = verify.verify_track(v_flux)
+                if verified:
+                    verified_count += 1
+                    break
+            error.check(verified, "Failed to verify Track %u.%u" % (cyl, head))
 
     if not_verified_count == 0:
         print("All tracks verified")
@@ -241,6 +314,9 @@ def main(argv) -> None:
                         help="write precompensation")
     parser.add_argument("--reverse", action="store_true",
                         help="reverse track data (flippy disk)")
+    parser.add_argument("--copies", type=util.min_int(1), default=1,
+                        metavar="N",
+                        help="write N copies, prompting for each disk")
     densel_group = parser.add_mutually_exclusive_group(required=False)
     densel_group.add_argument(
         "--densel", "--dd", type=util.level, metavar="LEVEL",
@@ -289,8 +365,16 @@ Known formats:\n%s"""
                 prev_pin2 = usb.get_pin(2)
             if args.densel is not None:
                 usb.set_pin(2, args.densel)
-            util.with_drive_selected(
-                lambda: write_from_image(usb, args, image), usb, args.drive)
+            session = WriteSession(cache_tracks = args.copies > 1)
+            for nr in range(1, args.copies+1):
+                if args.copies > 1:
+                    if nr > 1:
+                        input(f"Insert disk {nr} of {args.copies}, "
+                              "then press Enter...")
+                    print(f"Writing copy {nr} of {args.copies}")
+                util.with_drive_selected(
+                    lambda: write_from_image(usb, args, image, session),
+                    usb, args.drive)
         finally:
             if args.densel is not None or args.gen_tg43:
                 usb.set_pin(2, prev_pin2)
@@ -8,8 +8,9 @@
 from typing import Any, List, Optional, Tuple, Union, Protocol
 import binascii
 import itertools as it
+from array import array
 from bitarray import bitarray
-from greaseweazle.flux import Flux, WriteoutFlux
+from greaseweazle.flux import Flux, WriteoutFlux, flux_array
 from greaseweazle import optimised
 
 class PLL:
@@ -180,10 +181,11 @@ class MasterTrack:
         bits = self.bits.copy()
         bitlen = len(bits)
 
-        # Also copy the bit_ticks array (or create a dummy one), and remember
-        # the total ticks that it contains.
-        bit_ticks = self.bit_ticks.copy() if self.bit_ticks else [1] * bitlen
-        ticks_to_index = sum(bit_ticks)
+        # Also copy the bit_ticks array, and remember the total ticks that it
+        # contains. If there is no bit_ticks array, every bitcell is one tick
+        # long: A dummy array is created only if the ticks must be modified.
+        bit_ticks = self.bit_ticks[:] if self.bit_ticks else None
+        ticks_to_index = sum(bit_ticks) if bit_ticks else bitlen
 
         # Weak regions need special processing for correct flux representation.
         for s, n in self.weak:
@@ -205,6 +207,8 @@ class MasterTrack:
                 # MFM 0001001010010101 = 1295 = byte 0x47
                 pattern.frombytes(b"\x12\xA5")
                 bits[s:e] = (pattern * (n//16+1))[:n]
+                if bit_ticks is None:
+                    bit_ticks = [1] * bitlen
                 for i in range(0, n-10, 16):
                     x, y = bit_ticks[s+i+10], bit_ticks[s+i+11]
                     bit_ticks[s+i+10], bit_ticks[s+i+11] = x+y*0.5, y*0.5
@@ -220,7 +224,8 @@ class MasterTrack:
             index = -self.splice % bitlen
             if index != 0:
                 bits = bits[index:] + bits[:index]
-                bit_ticks = bit_ticks[index:] + bit_ticks[:index]
+                if bit_ticks is not None:
+                    bit_ticks = bit_ticks[index:] + bit_ticks[:index]
             splice_at_index = index < 4 or bitlen - index < 4
         else:
             assert for_writeout
@@ -237,7 +242,8 @@ class MasterTrack:
             pos = 4
             # We stretch by 10 percent, which is way more than enough.
             rep = bitlen // (10 * 32)
-            bit_ticks = bit_ticks[pos:pos+32] * rep + bit_ticks[pos:]
+            if bit_ticks is not None:
+                bit_ticks = bit_ticks[pos:pos+32] * rep + bit_ticks[pos:]
             bits = bits[pos:pos+32] * rep + bits[pos:]
         elif splice_at_index:
             # Splice is at the index (or within a few bitcells of it).
@@ -248,7 +254,8 @@ class MasterTrack:
             pos = (self.splice - 4) % bitlen
             # We stretch by 10 percent, which is way more than enough.
             rep = bitlen // (10 * 32)
-            bit_ticks = bit_ticks[:pos] + bit_ticks[pos-32:pos] * rep
+            if bit_ticks is not None:
+                bit_ticks = bit_ticks[:pos] + bit_ticks[pos-32:pos] * rep
             bits = bits[:pos] + bits[pos-32:pos] * rep
         else:
             # Splice is not at the index. We will write more than one
@@ -258,7 +265,8 @@ class MasterTrack:
             # spins slower than expected and the write ends before the original
             # splice position.
             # Thus if the drive spins slow, the track gets a longer header.
-            bit_ticks += bit_ticks[:self.splice-4]
+            if bit_ticks is not None:
+                bit_ticks += bit_ticks[:self.splice-4]
             bits += bits[:self.splice-4]
             pos = self.splice+4
             fill_pattern = bits[pos:pos+32]
@@ -267,18 +275,13 @@ class MasterTrack:
                 bits[pos:pos+32] = fill_pattern
 
         if for_writeout and self.precomp is not None:
+            if bit_ticks is None:
+                bit_ticks = [1] * len(bits)
             self.precomp.apply(bits, bit_ticks,
                                ticks_to_index / (self.time_per_rev*1e9))
 
         # Convert the stretched track data into flux.
-        bit_ticks_i = iter(bit_ticks)
-        flux_list = []
-        flux_ticks: float = 0
-        for bit in bits:
-            flux_ticks += next(bit_ticks_i)
-            if bit:
-                flux_list.append(flux_ticks)
-                flux_ticks = 0
+        flux_list, flux_ticks = bitcells_to_flux(bits, bit_ticks)
 
         # Package up WriteoutFlux.
         if for_writeout:
@@ -299,14 +302,46 @@ class MasterTrack:
         if revs > 1:
             l = flux_list
             for i in range(revs-1):
-                flux_list = l + [flux_ticks+flux_list[0]] + flux_list[1:]
+                flux_list = (l + array('d', [flux_ticks+flux_list[0]])
+                             + flux_list[1:])
             index_list *= revs
         flux = Flux(index_list, flux_list,
                     sample_freq = ticks_to_index / self.time_per_rev,
                     index_cued = True)
-        flux.splice = sum(bit_ticks[:self.splice])
+        if bit_ticks is None:
+            flux.splice = min(self.splice, bitlen)
+        else:
+            flux.splice = sum(bit_ticks[:self.splice])
         return flux
 
+
+def bitcells_to_flux(bits: bitarray, bit_ticks: Optional[List[float]]
+                     ) -> Tuple[array, float]:
+    """Convert bitcells to flux, where each bitcell lasts for the
+    corresponding number of @bit_ticks (or one tick if @bit_ticks is None).
+    Returns the flux timings and the ticks following the final flux."""
+    try:
+        return optimised.bitcells_to_flux(
+            bits, len(bits), bits.endian == 'little', bit_ticks)
+    except AttributeError:
+        pass
+    flux_list = array('d')
+    flux_ticks: float = 0
+    if bit_ticks is None:
+        prev = -1
+        for i in bits.search(1):
+            flux_list.append(i - prev)
+            prev = i
+        flux_ticks = len(bits) - 1 - prev
+    else:
+        bit_ticks_i = iter(bit_ticks)
+        for bit in bits:
+            flux_ticks += next(bit_ticks_i)
+            if bit:
+                flux_list.append(flux_ticks)
+                flux_ticks = 0
+    return flux_list, flux_ticks
+
 class PLLRevolution:
     def __init__(self, nr_bits: int,
                  hardsector_bits: Optional[List[int]] = None) -> None:
@@ -320,8 +355,10 @@ class PLLTrack:
     # data: Flux object, or a form convertible to a Flux object
     # time_per_rev: Expected time per revolution, in seconds (optional, float)
     # lowpass_thresh: Merge short fluxes with adjacent fluxes (optional, float)
+    # want_timing: Capture per-bitcell timings during PLL decode. If False,
+    #  timings are regenerated (by re-running the PLL) only if requested.
     def __init__(self, clock: float, data, time_per_rev=None, pll=None,
-                 lowpass_thresh=None):
+                 lowpass_thresh=None, want_timing=True):
         self.clock = clock
         self.time_per_rev = time_per_rev
         self.clock_max_adj = 0.10
@@ -330,8 +367,10 @@ class PLLTrack:
         self.pll_phase_adj = pll.phase_adj_pct / 100
         self.lowpass_thresh = (lowpass_thresh if pll.lowpass_thresh is None
                                else pll.lowpass_thresh)
+        self.want_timing = want_timing
         self.bitarray = bitarray(endian='big')
-        self.timearray: List[float] = []
+        self._timearray: Optional[array] = array('d')
+        self._pll_inputs: List[Tuple[array, array, float]] = []
         self.revolutions: List[PLLRevolution] = []
         self.import_flux_data(data)
 
@@ -339,7 +378,7 @@ class PLLTrack:
     def __str__(self) -> str:
         s = "\nRaw Track: %d revolutions\n" % len(self.revolutions)
         for rev in range(len(self.revolutions)):
-            b, _ = self.get_revolution(rev)
+            b = self.get_revolution_bits(rev)
             s += "Revolution %u (%u bits): " % (rev, len(b))
             s += str(binascii.hexlify(b.tobytes())) + "\n"
         b = self.bitarray[sum([x.nr_bits for x in self.revolutions]):]
@@ -348,16 +387,79 @@ class PLLTrack:
         return s[:-1]
 
 
-    def get_revolution(self, nr) -> Tuple[bitarray, List[float]]:
+    @property
+    def timearray(self) -> array:
+        if self._timearray is None:
+            # Timings were not captured: Re-run the PLL to regenerate them.
+            timearray = array('d')
+            for flux_list, index_list, freq in self._pll_inputs:
+                _, times, _ = self._pll(flux_list, index_list, freq,
+                                        want_timing = True)
+                assert times is not None
+                timearray += times
+            self._timearray = timearray
+        return self._timearray
+
+
+    def _revolution_range(self, nr) -> Tuple[int, int]:
         start = sum([x.nr_bits for x in self.revolutions[:nr]])
-        end = start + self.revolutions[nr].nr_bits
+        return start, start + self.revolutions[nr].nr_bits
+
+
+    def get_revolution(self, nr) -> Tuple[bitarray, array]:
+        start, end = self._revolution_range(nr)
         return self.bitarray[start:end], self.timearray[start:end]
 
 
-    def get_all_data(self) -> Tuple[bitarray, List[float]]:
+    def get_revolution_bits(self, nr) -> bitarray:
+        start, end = self._revolution_range(nr)
+        return self.bitarray[start:end]
+
+
+    def get_all_data(self) -> Tuple[bitarray, array]:
         return self.bitarray, self.timearray
 
 
+    def get_all_bits(self) -> bitarray:
+        return self.bitarray
+
+
+    def _pll(self, flux_list: array, index_list: array, freq: float,
+             want_timing: bool
+             ) -> Tuple[bitarray, Optional[array], List[int]]:
+
+        clock = self.clock
+        clock_min = self.clock * (1 - self.clock_max_adj)
+        clock_max = self.clock * (1 + self.clock_max_adj)
+
+        bits = bitarray(endian='big')
+        times: Optional[array]
+        revolutions: List[int]
+        try:
+            # The optimised PLL packs bitcells and their timings directly
+            # into flat buffers, which we then adopt wholesale.
+            packed_bits, nr_bits, times, revolutions = (
+                optimised.flux_to_bitcells_bulk(
+                    flux_list, index_list,
+                    freq, clock, clock_min, clock_max,
+                    self.pll_period_adj, self.pll_phase_adj,
+                    want_timing))
+            bits.frombytes(packed_bits)
+            del bits[nr_bits:]
+        except AttributeError:
+            index_iter = it.chain(map(lambda x: x/freq, index_list),
+                                  [float('inf')])
+            times = array('d') if want_timing else None
+            revolutions = []
+            flux_to_bitcells(
+                bits, times, revolutions,
+                index_iter, iter(flux_list),
+                freq, clock, clock_min, clock_max,
+                self.pll_period_adj, self.pll_phase_adj)
+
+        return bits, times, revolutions
+
+
     def import_flux_data(self, data) -> None:
 
         flux = data.flux()
@@ -366,13 +468,6 @@ class PLLTrack:
             # Adjust the raw flux to have the expected time per revolution.
             freq *= flux.time_per_rev / self.time_per_rev
 
-        clock = self.clock
-        clock_min = self.clock * (1 - self.clock_max_adj)
-        clock_max = self.clock * (1 + self.clock_max_adj)
-
-        index_iter = it.chain(iter(map(lambda x: x/freq, flux.index_list)),
-                              [float('inf')])
-
         if self.lowpass_thresh is not None:
             # Short fluxes below the threshold are merged together, and with
             # adjacent fluxes. The scenario discussed in issue #325 is that
@@ -393,33 +488,36 @@ class PLLTrack:
                         flux_list[-1] += x + y
                 else:
                     flux_list.append(x)
+            flux_ticks = sum(flux_list)
         else:
             flux_list = flux.list
+            flux_ticks = flux.total_ticks
 
         # Make sure there's enough time in the flux list to cover all
         # revolutions by appending a "large enough" final flux value.
-        tail = max(0, sum(flux.index_list) - sum(flux_list) + clock*freq*2)
-        flux_iter = it.chain(flux_list, [tail])
-
-        revolutions: List[int] = []
-        try:
-            optimised.flux_to_bitcells(
-                self.bitarray, self.timearray, revolutions,
-                index_iter, flux_iter,
-                freq, clock, clock_min, clock_max,
-                self.pll_period_adj, self.pll_phase_adj)
-        except AttributeError:
-            flux_to_bitcells(
-                self.bitarray, self.timearray, revolutions,
-                index_iter, flux_iter,
-                freq, clock, clock_min, clock_max,
-                self.pll_period_adj, self.pll_phase_adj)
+        tail = max(0, sum(flux.index_list) - flux_ticks + self.clock*freq*2)
+        pll_inputs = (flux_array(flux_list) + array('d', [tail]),
+                      flux.index_list, freq)
+
+        # Hard-sector boundaries are located using the bitcell timings.
+        want_timing = self.want_timing or flux.sector_list is not None
+        bits, times, revolutions = self._pll(*pll_inputs,
+                                             want_timing = want_timing)
+        self.bitarray += bits
+        if self.want_timing:
+            assert self._timearray is not None and times is not None
+            self._timearray += times
+        else:
+            # Timings are regenerated on demand by self.timearray.
+            self._pll_inputs.append(pll_inputs)
+            self._timearray = None
 
         hardsector_bits = None
         for i, nr_bits in enumerate(revolutions):
             if flux.sector_list is not None:
+                assert times is not None
                 start = sum(revolutions[:i])
-                cell_sum = it.accumulate(self.timearray[start:start+nr_bits])
+                cell_sum = it.accumulate(times[start:start+nr_bits])
                 hardsector_bits = []
                 for sector_end in it.accumulate(map(lambda x: x/freq,
                                                     flux.sector_list[i])):
@@ -475,7 +573,8 @@ def flux_to_bitcells(bit_array, time_array, revolutions,
                 to_index += next(index_iter)
             # Emit bit time.
             nbits += 1
-            time_array.append(_clock)
+            if time_array is not None:
+                time_array.append(_clock)
 
         # PLL: Adjust clock frequency according to phase mismatch.
         if zeros <= 3:
@@ -5,10 +5,15 @@
 # This is free and unencumbered software released into the public domain.
 # See the file COPYING for more details, or visit <http://unlicense.org>.
 
-from typing import Any, List, Tuple, Union
+from __future__ import annotations
+from typing import Any, Callable, List, Optional, Tuple, TypeVar, Union
 
-import struct
+import asyncio, functools, os, struct
 import itertools as it
+from array import array
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from timeit import default_timer as timer
 from enum import Enum
 from greaseweazle import error
 from greaseweazle.flux import Flux
@@ -16,6 +21,15 @@ from greaseweazle import optimised
 
 EARLIEST_SUPPORTED_FIRMWARE = (0, 31)
 
+# Most index timings returned by a single Cmd.GetIndexTimes.
+MAX_INDEX_TIMES = 15
+
+# Largest flux receive buffer kept by a Unit between reads. At the assumed
+# average of one stream byte per 2us of flux, this is ~2.1s (~10 revs @ 300rpm).
+MAX_RX_BUF = 1 << 20
+
+T = TypeVar('T')
+
 ## Control-Path command set
 class ControlCmd:
     ClearComms      = 10000
@@ -135,6 +149,23 @@ class FluxOp:
     Astable         = 3
 
 
+## ReadFluxStats: Cumulative host-side statistics for received flux streams.
+class ReadFluxStats:
+
+    def __init__(self) -> None:
+        self.nr_bytes = 0    # Flux stream bytes received
+        self.nr_reads = 0    # Reads from the serial port
+        self.secs = 0.0      # Time spent receiving flux streams
+        self.max_backlog = 0 # Most bytes seen waiting in the receive queue
+
+    def __str__(self):
+        mbps = (self.nr_bytes * 8) / (self.secs * 1e6) if self.secs else 0
+        return ("%u bytes in %.3fs (%.3f Mbps), %u reads, "
+                "max. backlog %u bytes"
+                % (self.nr_bytes, self.secs, mbps, self.nr_reads,
+                   self.max_backlog))
+
+
 ## Cmd.GetInfo DriveInfo result
 class DriveInfo:
 
@@ -187,10 +218,24 @@ class Unit:
     ##  sample_freq:  Resolution of all time values passed to/from this unit
     ##  update_mode:  True iff the Greaseweazle unit is in update mode
 
+    # Commands queued by batch(): (command, response length, response handler)
+    _batch: Optional[List[Tuple[bytes, int, Any]]]
+
+    # Current position of the selected drive's heads, if known.
+    _cyl: Optional[int]
+    _head: Optional[int]
+
+    # Does the firmware report the selected drive's cylinder (DriveInfo.cyl)?
+    _has_drive_info: bool
+
     ## Unit(ser):
     ## Accepts a Pyserial instance for Greaseweazle communications.
     def __init__(self, ser):
         self.ser = ser
+        self.read_stats = ReadFluxStats()
+        self._rx_buf = bytearray()
+        self._batch = None
+        self._has_drive_info = False
         self.reset()
         # Copy firmware info to instance variables (see above for definitions).
         self._send_cmd(struct.pack("3B", Cmd.GetInfo, 3, GetInfo.Firmware))
@@ -219,6 +264,7 @@ class Unit:
     ## reset:
     ## Resets communications with Greaseweazle.
     def reset(self) -> None:
+        self._cyl = self._head = None
         self.ser.reset_output_buffer()
         self.ser.baudrate = ControlCmd.ClearComms
         self.ser.baudrate = ControlCmd.Normal
@@ -227,11 +273,74 @@ class Unit:
         self.ser.open()
 
 
-    ## _send_cmd:
-    ## Send given command byte sequence to Greaseweazle.
-    ## Raise a CmdError if command fails.
-    def _send_cmd(self, cmd) -> None:
-        self.ser.write(cmd)
+    ## batch:
+    ## Context manager which batches commands into fewer USB transfers.
+    ## Within the batch, commands which return no data (and the Track0 check
+    ## after a seek) are queued. They are then sent in a single transfer with
+    ## the next command which returns data, or when the batch ends.
+    ## Their acknowledgements are checked in order.
+    @contextmanager
+    def batch(self):
+        if self._batch is not None:
+            yield
+            return
+        self._batch = []
+        try:
+            yield
+            if self._batch:
+                self._flush_batch()
+        except:
+            if self._batch:
+                # Queued commands are discarded unsent, including any seek.
+                self._cyl = self._head = None
+            raise
+        finally:
+            self._batch = None
+
+
+    ## _flush_batch:
+    ## Send queued commands, followed by @cmd, in a single USB transfer.
+    ## Raise a CmdError (or the queued check's exception) if any fails.
+    def _flush_batch(self, cmd: bytes = b'') -> None:
+        assert self._batch is not None
+        batch, self._batch = self._batch, []
+        self.ser.write(b''.join(c for c,_,_ in batch) + cmd)
+        err: Optional[Exception] = None
+        try:
+            # Queued commands are executed regardless of earlier failures.
+            # Collect all acknowledgements to stay in sync with Greaseweazle.
+            for c, rsp_len, fn in batch:
+                try:
+                    self._check_ack(c)
+                except CmdError as e:
+                    err = err or e
+                    continue
+                rsp = self.ser.read(rsp_len)
+                if err is None and fn is not None:
+                    try:
+                        fn(rsp)
+                    except Exception as e:
+                        err = e
+            if cmd:
+                try:
+                    self._check_ack(cmd)
+                except CmdError as e:
+                    raise err or e
+                if err is not None:
+                    # Abort whatever @cmd started: It followed a failure.
+                    self.reset()
+            if err is not None:
+                raise err
+        except:
+            # A queued seek may not have completed.
+            self._cyl = self._head = None
+            raise
+
+
+    ## _check_ack:
+    ## Check Greaseweazle's acknowledgement of the given command.
+    ## Raise a CmdError if command failed.
+    def _check_ack(self, cmd) -> None:
         (c,r) = struct.unpack("2B", self.ser.read(2))
         error.check(c == cmd[0], "Command returned garbage (%02x != %02x)"
                     % (c, cmd[0]))
@@ -239,6 +348,24 @@ class Unit:
             raise CmdError(cmd, r)
 
 
+    ## _send_cmd:
+    ## Send given command byte sequence to Greaseweazle.
+    ## Raise a CmdError if command fails.
+    ## Within a batch(), a command sent with @queue=True is queued instead.
+    ## Its response, of @rsp_len bytes, is passed to @fn when it is sent.
+    def _send_cmd(self, cmd, queue: bool = False, rsp_len: int = 0,
+                  fn: Optional[Callable[[bytes], None]] = None) -> None:
+        if self._batch is None:
+            self.ser.write(cmd)
+            self._check_ack(cmd)
+            if fn is not None:
+                fn(self.ser.read(rsp_len))
+        elif queue:
+            self._batch.append((bytes(cmd), rsp_len, fn))
+        else:
+            self._flush_batch(bytes(cmd))
+
+
     def get_current_drive_info(self) -> DriveInfo:
         self._send_cmd(struct.pack("3B", Cmd.GetInfo, 3, GetInfo.CurrentDrive))
         return DriveInfo(self.ser.read(32))
@@ -256,30 +383,79 @@ class Unit:
 
     ## seek:
     ## Seek the selected drive's heads to the specified track (cyl, head).
+    ## If the heads are already on the specified cylinder, the heads are not
+    ## stepped: Only a head select is sent, if needed, and a check that
+    ## Greaseweazle agrees on the current cylinder.
     def seek(self, cyl, head) -> None:
+        if cyl == self._cyl:
+            if self._has_drive_info:
+                self._send_cmd(struct.pack("3B", Cmd.GetInfo, 3,
+                                           GetInfo.CurrentDrive),
+                               queue=True, rsp_len=32,
+                               fn=lambda v: self._check_cyl(cyl, v))
+            if head != self._head:
+                self._head = None
+                self._send_cmd(struct.pack("3B", Cmd.Head, 3, head),
+                               queue=True)
+                self._head = head
+            return
+        self._cyl = self._head = None
         if -0x80 <= cyl <= 0x7f:
             cmd = struct.pack("2Bb", Cmd.Seek, 3, cyl)
         elif -0x8000 <= cyl <= 0x7fff:
             cmd = struct.pack("2Bh", Cmd.Seek, 4, cyl)
         else:
             raise error.Fatal(f'Seek: Invalid cylinder {cyl}')
-        self._send_cmd(cmd)
-        trk0 = not self.get_pin(26)
-        if cyl == 0 and not trk0:
-            # This can happen with Kryoflux flippy-modded Panasonic drives
-            # which may not assert the /TRK0 signal when stepping *inward*
-            # from cylinder -1. We can check this by attempting a fake outward
-            # step, which is exactly NoClickStep's purpose.
-            try:
-                info = self.get_current_drive_info()
-                if info.is_flippy:
-                    self._send_cmd(struct.pack("2B", Cmd.NoClickStep, 2))
-            except CmdError:
-                # GetInfo.CurrentDrive is unsupported by older firmwares.
-                # NoClickStep is "best effort". We're on a likely error
-                # path anyway, so let them fail silently.
-                pass
-            trk0 = not self.get_pin(26) # now re-sample /TRK0
+        self._send_cmd(cmd, queue=True)
+        if cyl != 0:
+            # Track0 must be deasserted: This can be checked later, as part of
+            # a batch of commands.
+            self._send_cmd(struct.pack("3B", Cmd.GetPin, 3, 26), queue=True,
+                           rsp_len=1,
+                           fn=lambda v: self._check_trk0(cyl, not v[0]))
+        else:
+            trk0 = not self.get_pin(26)
+            if not trk0:
+                # This can happen with Kryoflux flippy-modded Panasonic drives
+                # which may not assert the /TRK0 signal when stepping *inward*
+                # from cylinder -1. We can check this by attempting a fake
+                # outward step, which is exactly NoClickStep's purpose.
+                try:
+                    info = self.get_current_drive_info()
+                    if info.is_flippy:
+                        self._send_cmd(struct.pack("2B", Cmd.NoClickStep, 2))
+                except CmdError:
+                    # GetInfo.CurrentDrive is unsupported by older firmwares.
+                    # NoClickStep is "best effort". We're on a likely error
+                    # path anyway, so let them fail silently.
+                    pass
+                trk0 = not self.get_pin(26) # now re-sample /TRK0
+            self._check_trk0(cyl, trk0)
+        self._send_cmd(struct.pack("3B", Cmd.Head, 3, head), queue=True)
+        self._cyl, self._head = cyl, head
+
+
+    ## _check_cyl:
+    ## Check the DriveInfo @rsp against the cached cylinder @cyl.
+    def _check_cyl(self, cyl, rsp: bytes) -> None:
+        info_cyl = DriveInfo(rsp).cyl
+        if info_cyl != cyl:
+            self._cyl = self._head = None
+            raise error.Fatal(
+                'Drive heads at cylinder %s, expected %d'
+                % ('(unknown)' if info_cyl is None else info_cyl, cyl))
+
+
+    ## forget_position:
+    ## Forget the drive heads' cached position: The next seek() steps the
+    ## heads even if they should already be on the specified cylinder.
+    def forget_position(self) -> None:
+        self._cyl = self._head = None
+
+
+    ## _check_trk0:
+    ## Check the sampled /TRK0 signal after seek to @cyl.
+    def _check_trk0(self, cyl, trk0: bool) -> None:
         error.check(cyl < 0 or (cyl == 0) == trk0,
                     '''\
 Track0 signal %s after seek to cylinder %d
@@ -287,19 +463,21 @@ Track0 signal %s after seek to cylinder %d
  2. If the error persists try slowing down seek operations
      eg. "gw delays --step 20000" for 20ms per step'''
                     % (('absent', 'asserted')[trk0], cyl))
-        self._send_cmd(struct.pack("3B", Cmd.Head, 3, head))
 
 
     ## set_bus_type:
     ## Set the floppy bus type.
     def set_bus_type(self, type) -> None:
-        self._send_cmd(struct.pack("3B", Cmd.SetBusType, 3, type))
+        self._cyl = self._head = None
+        self._send_cmd(struct.pack("3B", Cmd.SetBusType, 3, type),
+                       queue=True)
 
 
     ## set_pin:
     ## Set a pin level.
     def set_pin(self, pin, level) -> None:
-        self._send_cmd(struct.pack("4B", Cmd.SetPin, 4, pin, int(level)))
+        self._send_cmd(struct.pack("4B", Cmd.SetPin, 4, pin, int(level)),
+                       queue=True)
 
 
     ## get_pin:
@@ -313,25 +491,40 @@ Track0 signal %s after seek to cylinder %d
     ## power_on_reset:
     ## Re-initialise to power-on defaults.
     def power_on_reset(self) -> None:
+        self._cyl = self._head = None
         self._send_cmd(struct.pack("2B", Cmd.Reset, 2))
 
 
     ## drive_select:
     ## Select the specified drive unit.
     def drive_select(self, unit) -> None:
-        self._send_cmd(struct.pack("3B", Cmd.Select, 3, unit))
+        self._cyl = self._head = None
+        self._send_cmd(struct.pack("3B", Cmd.Select, 3, unit),
+                       queue=True)
+        try:
+            # Greaseweazle may know the drive's current cylinder.
+            self._cyl = self.get_current_drive_info().cyl
+            self._has_drive_info = True
+        except CmdError as err:
+            # GetInfo.CurrentDrive is unsupported by older firmwares.
+            if err.code != Ack.BadCommand:
+                raise
+            self._has_drive_info = False
 
 
     ## drive_deselect:
     ## Deselect currently-selected drive unit (if any).
     def drive_deselect(self) -> None:
-        self._send_cmd(struct.pack("2B", Cmd.Deselect, 2))
+        self._cyl = self._head = None
+        self._send_cmd(struct.pack("2B", Cmd.Deselect, 2),
+                       queue=True)
 
 
     ## drive_motor:
     ## Turn the specified drive's motor on/off.
     def drive_motor(self, unit, state) -> None:
-        self._send_cmd(struct.pack("4B", Cmd.Motor, 4, unit, int(state)))
+        self._send_cmd(struct.pack("4B", Cmd.Motor, 4, unit, int(state)),
+                       queue=True)
 
 
     ## switch_fw_mode:
@@ -360,10 +553,9 @@ Track0 signal %s after seek to cylinder %d
 
 
     ## _decode_flux:
-    ## Decode the Greaseweazle data stream into a list of flux samples.
-    def _decode_flux(self, dat: bytes) -> Tuple[List[float], List[float]]:
-        flux: List[float] = []
-        index: List[float] = []
+    ## Decode the Greaseweazle data stream into an array of flux samples.
+    def _decode_flux(self, dat: bytes) -> Tuple[array, array]:
+        flux, index = array('d'), array('d')
         assert dat[-1] == 0
         dat_i = it.islice(dat, 0, len(dat)-1)
         ticks, ticks_since_index = 0, 0
@@ -407,17 +599,22 @@ Track0 signal %s after seek to cylinder %d
     def _encode_flux(self, flux: List[int]) -> bytes:
         nfa_thresh = round(150e-6 * self.sample_freq)  # 150us
         nfa_period = round(1.25e-6 * self.sample_freq) # 1.25us
+        # Emit a dummy final flux value. This is never written to disk because
+        # the write is aborted immediately the final flux is loaded into the
+        # WDATA timer. The dummy flux is sacrificial, ensuring that the real
+        # final flux gets written in full.
+        dummy_flux = round(100e-6 * self.sample_freq)
+        try:
+            return optimised.encode_flux(flux, nfa_thresh, nfa_period,
+                                         dummy_flux)
+        except AttributeError:
+            pass
         dat = bytearray()
         def _write_28bit(x):
             dat.append(1 | (x<<1) & 255)
             dat.append(1 | (x>>6) & 255)
             dat.append(1 | (x>>13) & 255)
             dat.append(1 | (x>>20) & 255)
-        # Emit a dummy final flux value. This is never written to disk because
-        # the write is aborted immediately the final flux is loaded into the
-        # WDATA timer. The dummy flux is sacrificial, ensuring that the real
-        # final flux gets written in full.
-        dummy_flux = round(100e-6 * self.sample_freq)
         for val in it.chain(flux, [dummy_flux]):
             if val == 0:
                 pass
@@ -448,20 +645,59 @@ Track0 signal %s after seek to cylinder %d
     ## Private helper which issues command requests to Greaseweazle.
     def _read_track(self, revs, ticks) -> bytes:
 
+        # Size the receive buffer for the expected stream: Assume a 300rpm
+        # drive, and an average of one stream byte per 2us of flux.
+        secs = ticks / self.sample_freq if ticks else (revs + 1) * 0.2
+        expected = int(secs / 2e-6) + 1
+        buf = self._rx_buf
+        if len(buf) < expected:
+            buf.extend(bytes(expected - len(buf)))
+
+        # A Pyserial port on a POSIX host: Bytes already waiting can be read
+        # from the OS straight into the receive buffer. Pyserial's readinto()
+        # reads into a new bytes object, then copies.
+        fd = getattr(self.ser, 'fd', None) if hasattr(os, 'readv') else None
+
         # Request and read all flux timings for this track.
-        dat = bytearray()
+        stats = self.read_stats
         self._send_cmd(struct.pack("<2BIH", Cmd.ReadFlux, 8,
                                    ticks, 0 if revs==0 else revs+1))
-        while True:
-            dat += self.ser.read(1)
-            dat += self.ser.read(self.ser.in_waiting)
-            if dat[-1] == 0:
-                break
+        start, n = timer(), 0
+        mv = memoryview(buf)
+        try:
+            while True:
+                waiting = self.ser.in_waiting
+                stats.max_backlog = max(stats.max_backlog, waiting)
+                nr = max(waiting, 1)
+                if n + nr > len(buf):
+                    # Grow the receive buffer. It must not be exported.
+                    mv.release()
+                    buf.extend(bytes(max(len(buf), nr)))
+                    mv = memoryview(buf)
+                if fd is not None and waiting != 0:
+                    try:
+                        nr = os.readv(fd, [mv[n:n+nr]])
+                    except BlockingIOError:
+                        nr = 0
+                else:
+                    nr = self.ser.readinto(mv[n:n+nr])
+                stats.nr_reads += 1
+                n += nr
+                if nr != 0 and buf[n-1] == 0:
+                    break
+        finally:
+            mv.release()
+        stats.nr_bytes += n
+        stats.secs += timer() - start
+
+        # Do not hold on to the buffer of an unusually long read.
+        if len(buf) > MAX_RX_BUF:
+            self._rx_buf = bytearray()
 
         # Check flux status. An exception is raised if there was an error.
         self._send_cmd(struct.pack("2B", Cmd.GetFluxStatus, 2))
 
-        return dat
+        return buf[:n]
 
 
     ## read_track:
@@ -492,15 +728,79 @@ Track0 signal %s after seek to cylinder %d
         return Flux(index_list, flux_list, self.sample_freq, index_cued=False)
 
 
+    ## get_index_times:
+    ## Get index timings for the last flux read: The time from the start of
+    ## the read to the first index pulse, then the time between each index
+    ## pulse and the next.
+    def get_index_times(self, nr: int) -> List[int]:
+        times: List[int] = []
+        while len(times) < nr:
+            n = min(nr - len(times), MAX_INDEX_TIMES)
+            self._send_cmd(struct.pack("4B", Cmd.GetIndexTimes, 4,
+                                       len(times), n))
+            times += struct.unpack(f"<{n}I", self.ser.read(4*n))
+        return times
+
+
+    ## read_index:
+    ## Read index timings for the current track, over @revs revolutions.
+    ## The flux is not decoded: It is returned as a Flux with no flux samples.
+    def read_index(self, revs:int, nr_retries:int=5) -> Flux:
+
+        retry = 0
+        while True:
+            try:
+                dat = self._read_track(revs, 0)
+            except CmdError as error:
+                # An error occurred. We may retry on transient overflows.
+                if error.code == Ack.FluxOverflow and retry < nr_retries:
+                    retry += 1
+                else:
+                    raise error
+            else:
+                # Success!
+                break
+
+        index_list: Union[List[int], array]
+        try:
+            index_list = self.get_index_times(revs + 1)
+        except CmdError as err:
+            # Older firmware: Find the index pulses in the flux stream.
+            if err.code != Ack.BadCommand:
+                raise
+            try:
+                _, index_list = optimised.decode_flux(dat)
+            except AttributeError:
+                _, index_list = self._decode_flux(dat)
+
+        return Flux(index_list, [], self.sample_freq, index_cued=False)
+
+
     ## write_track:
     ## Write the given flux stream to the current track via Greaseweazle.
     def write_track(self, flux_list, terminate_at_index,
                     cue_at_index=True, nr_retries=5,
                     hard_sector_ticks=0) -> None:
+        self.write_track_stream(self._encode_flux(flux_list),
+                                terminate_at_index = terminate_at_index,
+                                cue_at_index = cue_at_index,
+                                nr_retries = nr_retries,
+                                hard_sector_ticks = hard_sector_ticks)
+
+
+    ## encode_track:
+    ## Encode flux timings (in Greaseweazle ticks) for write_track_stream().
+    ## The encoded stream may be written any number of times.
+    def encode_track(self, flux_list) -> bytes:
+        return self._encode_flux(flux_list)
+
+
+    ## write_track_stream:
+    ## Write an encoded flux stream, from encode_track(), to the current track.
+    def write_track_stream(self, dat: bytes, terminate_at_index,
+                           cue_at_index=True, nr_retries=5,
+                           hard_sector_ticks=0) -> None:
 
-        # Create encoded data stream.
-        dat = self._encode_flux(flux_list)
-        
         retry = 0
         while True:
             try:
@@ -531,6 +831,10 @@ Track0 signal %s after seek to cylinder %d
     ## erase_track:
     ## Erase the current track via Greaseweazle.
     def erase_track(self, ticks) -> None:
+        # Greaseweazle erases as soon as it receives the command: Complete
+        # and check any batched seek first, so we never erase the wrong track.
+        if self._batch:
+            self._flush_batch()
         self._send_cmd(struct.pack("<2BI", Cmd.EraseFlux, 6, int(ticks)))
         self.ser.read(1) # Sync with Greaseweazle
         self._send_cmd(struct.pack("2B", Cmd.GetFluxStatus, 2))
@@ -563,6 +867,124 @@ Track0 signal %s after seek to cylinder %d
         return min_bw, max_bw
 
 
+
+## AsyncUnit: asyncio interface to a Greaseweazle Unit.
+## Pyserial offers only blocking I/O, so the Unit's commands run on a
+## dedicated thread, one at a time and in the order they are awaited.
+## Coroutines on the event loop may meanwhile decode flux, write image
+## files, or drive other units.
+class AsyncUnit:
+
+    ## AsyncUnit(unit):
+    ## Accepts an open Unit. Commands must not be sent to it directly while
+    ## it is in use by the AsyncUnit.
+    def __init__(self, unit: Unit) -> None:
+        self.unit = unit
+        self._io = ThreadPoolExecutor(max_workers = 1)
+
+    @property
+    def sample_freq(self) -> float:
+        return self.unit.sample_freq
+
+    async def __aenter__(self) -> AsyncUnit:
+        return self
+
+    async def __aexit__(self, type, value, tb) -> None:
+        # Waiting for the I/O thread blocks: Keep it off the event loop.
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.close)
+
+    ## close:
+    ## Wait for outstanding commands, and stop the I/O thread.
+    def close(self) -> None:
+        self._io.shutdown()
+
+    async def _call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._io, functools.partial(fn, *args, **kwargs))
+
+    ## reset:
+    ## Resets communications with Greaseweazle.
+    async def reset(self) -> None:
+        await self._call(self.unit.reset)
+
+    ## power_on_reset:
+    ## Re-initialise to power-on defaults.
+    async def power_on_reset(self) -> None:
+        await self._call(self.unit.power_on_reset)
+
+    ## set_bus_type:
+    ## Set the floppy bus type.
+    async def set_bus_type(self, type) -> None:
+        await self._call(self.unit.set_bus_type, type)
+
+    ## drive_select:
+    ## Select the specified drive unit.
+    async def drive_select(self, unit) -> None:
+        await self._call(self.unit.drive_select, unit)
+
+    ## drive_deselect:
+    ## Deselect currently-selected drive unit (if any).
+    async def drive_deselect(self) -> None:
+        await self._call(self.unit.drive_deselect)
+
+    ## drive_motor:
+    ## Turn the specified drive's motor on/off.
+    async def drive_motor(self, unit, state) -> None:
+        await self._call(self.unit.drive_motor, unit, state)
+
+    ## set_pin:
+    ## Set a pin level.
+    async def set_pin(self, pin, level) -> None:
+        await self._call(self.unit.set_pin, pin, level)
+
+    ## forget_position:
+    ## Forget the drive heads' cached position: The next seek() steps the
+    ## heads even if they should already be on the specified cylinder.
+    async def forget_position(self) -> None:
+        await self._call(self.unit.forget_position)
+
+    ## seek:
+    ## Seek the selected drive's heads to the specified track (cyl, head).
+    async def seek(self, cyl, head) -> None:
+        await self._call(self.unit.seek, cyl, head)
+
+    ## get_pin:
+    ## Get a pin level.
+    async def get_pin(self, pin) -> bool:
+        return await self._call(self.unit.get_pin, pin)
+
+    ## read_track:
+    ## Read and decode flux and index timings for the current track.
+    async def read_track(self, revs:int, ticks:int=0,
+                         nr_retries:int=5) -> Flux:
+        return await self._call(self.unit.read_track, revs, ticks = ticks,
+                                nr_retries = nr_retries)
+
+    ## read_index:
+    ## Read index timings for the current track, without decoding flux.
+    async def read_index(self, revs:int, nr_retries:int=5) -> Flux:
+        return await self._call(self.unit.read_index, revs,
+                                nr_retries = nr_retries)
+
+    ## write_track:
+    ## Write the given flux stream to the current track via Greaseweazle.
+    async def write_track(self, flux_list, terminate_at_index,
+                          cue_at_index=True, nr_retries=5,
+                          hard_sector_ticks=0) -> None:
+        await self._call(self.unit.write_track, flux_list,
+                         terminate_at_index = terminate_at_index,
+                         cue_at_index = cue_at_index,
+                         nr_retries = nr_retries,
+                         hard_sector_ticks = hard_sector_ticks)
+
+    ## erase_track:
+    ## Erase the current track via Greaseweazle.
+    async def erase_track(self, ticks) -> None:
+        await self._call(self.unit.erase_track, ticks)
+
+
 # Local variables:
 # python-indent: 4
 # End:
@@ -0,0 +1,736 @@
+# greaseweazle/virtual.py
+#
+# A software Greaseweazle: Serves the USB command protocol from flux images.
+#
+# Written & released by Keir Fraser <keir.xen@gmail.com>
+#
+# This is free and unencumbered software released into the public domain.
+# See the file COPYING for more details, or visit <http://unlicense.org>.
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+import struct, time, bisect
+import itertools as it
+from array import array
+
+from greaseweazle import error, optimised
+from greaseweazle.flux import Flux, resample_flux
+from greaseweazle.usb import Cmd, Ack, GetInfo, Params, ControlCmd, FluxOp
+from greaseweazle.usb import MAX_INDEX_TIMES
+
+# Firmware version and capabilities reported by GetInfo.
+VERSION = (1, 6)
+SAMPLE_FREQ = 72000000
+
+# Default drive delays: select (us), step (us), seek settle (ms),
+# motor on (ms), watchdog (ms), pre-write (us), post-write (us),
+# index mask (us).
+DEFAULT_DELAYS = (10, 10000, 15, 750, 10000, 100, 1000, 200)
+
+# Maximum cylinder accepted by Seek.
+MAX_CYL = 255
+
+
+## Track: The flux on one side of a cylinder, as one or more revolutions.
+## Each revolution is an array of flux positions, in ticks after the index
+## pulse. All revolutions have the same period.
+class Track:
+
+    def __init__(self, period: int, revs: List[array]) -> None:
+        self.period = period
+        self.revs = revs
+        self._diffs: Dict[int, array] = dict()
+
+    ## from_flux: Resample the revolutions of @flux to @sample_freq, with
+    ## period 60/@rpm seconds (default: the mean period of @flux).
+    @classmethod
+    def from_flux(cls, flux: Flux, sample_freq: float,
+                  rpm: Optional[float]) -> 'Track':
+        if not flux.index_cued:
+            flux.cue_at_index()
+        index = flux.index_list
+        if rpm is not None:
+            period = round(60 * sample_freq / rpm)
+        elif index:
+            period = round(sum(index) / len(index)
+                           * sample_freq / flux.sample_freq)
+        else:
+            period = round(0.2 * sample_freq)
+        revs = []
+        prefix, fl = flux.prefix_sums, flux.list
+        i, start = 0, 0.0
+        for ticks in index:
+            end = start + ticks
+            j = bisect.bisect_right(prefix, end, lo=i)
+            if i < j:
+                dat = resample_flux([prefix[i] - start, *fl[i+1:j]],
+                                    period / ticks)
+                rev = array('q', it.accumulate(dat))
+                while rev and rev[-1] >= period:
+                    rev.pop()
+                revs.append(rev)
+            else:
+                revs.append(array('q'))
+            i, start = j, end
+        return cls(period, revs)
+
+    def rev(self, k: int) -> array:
+        return self.revs[k % len(self.revs)] if self.revs else array('q')
+
+    ## diffs: Intervals between the flux of a revolution. The first is
+    ## measured from the index pulse.
+    def diffs(self, k: int) -> array:
+        k = k % len(self.revs) if self.revs else 0
+        d = self._diffs.get(k)
+        if d is None:
+            rev = self.rev(k)
+            d = array('q', (b - a for a, b in zip(it.chain([0], rev), rev)))
+            self._diffs[k] = d
+        return d
+
+    ## overwrite: Replace the flux between absolute times @start and @end
+    ## with @flux (absolute times). The track becomes a single revolution.
+    def overwrite(self, start: int, end: int, flux: List[int]) -> None:
+        p = self.period
+        if end - start >= p:
+            start = end - p
+            flux = [x for x in flux if x >= start]
+        s, e = start % p, end % p
+        if s < e or end == start:
+            keep = [x for x in self.rev(start // p) if x < s or x >= e]
+        else:
+            keep = [x for x in self.rev(start // p) if e <= x < s]
+        self.revs = [array('q', sorted(keep + [x % p for x in flux]))]
+        self._diffs.clear()
+
+
+## encode_flux: Encode flux intervals as a Greaseweazle read stream.
+def encode_flux(flux) -> bytes:
+    try:
+        # Threshold for no-flux areas is beyond the 28-bit limit: Never used.
+        # Strip the dummy final flux and the end-of-stream marker.
+        return optimised.encode_flux(flux, 1<<28, 1, 1)[:-2]
+    except AttributeError:
+        pass
+    dat = bytearray()
+    for val in flux:
+        if val == 0:
+            pass
+        elif val < 250:
+            dat.append(val)
+        elif val < 1525:
+            dat.append(250 + (val-250) // 255)
+            dat.append(1 + (val-250) % 255)
+        else:
+            dat += op28(FluxOp.Space, val - 249)
+            dat.append(249)
+    return bytes(dat)
+
+
+def op28(op: int, x: int) -> bytes:
+    return bytes([255, op, 1 | (x<<1) & 255, 1 | (x>>6) & 255,
+                  1 | (x>>13) & 255, 1 | (x>>20) & 255])
+
+
+## decode_write_stream: Decode a WriteFlux stream into flux intervals.
+## No-flux areas become a single long interval.
+def decode_write_stream(dat: bytes) -> List[int]:
+    flux, ticks, pos = [], 0, 0
+    while pos < len(dat) and dat[pos] != 0:
+        i = dat[pos]
+        if i == 255:
+            opcode = dat[pos+1]
+            x = ((dat[pos+2] >> 1) + ((dat[pos+3] & 254) << 6)
+                 + ((dat[pos+4] & 254) << 13) + ((dat[pos+5] & 254) << 20))
+            pos += 6
+            if opcode == FluxOp.Space:
+                ticks += x
+            elif opcode == FluxOp.Astable:
+                flux.append(ticks)
+                ticks = 0
+            continue
+        if i < 250:
+            val = i
+            pos += 1
+        else:
+            val = 250 + (i - 250) * 255 + dat[pos+1] - 1
+            pos += 2
+        flux.append(ticks + val)
+        ticks = 0
+    return flux
+
+
+## VirtualGreaseweazle:
+## A Pyserial-compatible object which behaves as a Greaseweazle with a
+## drive attached. Reads are served from the @image flux image (the disk is
+## blank if None). Written tracks replace the image's tracks, and are saved
+## to the @out image by save().
+## Disk rotation and USB transfers take no time unless @realtime, in which
+## case responses are delayed until they would arrive from a real drive.
+## If @bandwidth (bytes/sec) is specified, transfers are paced accordingly.
+class VirtualGreaseweazle:
+
+    # Consumer of data sent by the host after a command (eg. WriteFlux).
+    # Returns False if it requires more data.
+    _sink: Optional[Callable[[], bool]]
+
+    def __init__(self, image=None, out: Optional[str] = None,
+                 rpm: Optional[float] = None,
+                 bandwidth: Optional[float] = None,
+                 realtime: bool = False, wrprot: bool = False) -> None:
+        self.image, self.out = image, out
+        self.rpm, self.bandwidth = rpm, bandwidth
+        self.realtime, self.wrprot = realtime, wrprot
+        self.sample_freq = SAMPLE_FREQ
+        self.cyl = 0 # Physical position of the drive heads
+        self.tracks: Dict[Tuple[int,int], Track] = dict()
+        self.written: Dict[Tuple[int,int], Track] = dict()
+        self.is_open = True
+        self._baud = ControlCmd.Normal
+        self._epoch = time.monotonic()
+        self._ticks = 0
+        self.power_on_reset()
+        self.clear_comms()
+
+    ## power_on_reset: Drive and parameter state after Cmd.Reset.
+    def power_on_reset(self) -> None:
+        self.delays = list(DEFAULT_DELAYS)
+        self.bus: Optional[int] = None
+        self.unit: Optional[int] = None
+        self.motor = [False] * 3
+        self.cyl_valid = False
+        self.head = 0
+
+    ## clear_comms: Abort the current command and discard all buffered data.
+    def clear_comms(self) -> None:
+        self.reset_input_buffer()
+        self._tx = bytearray()
+        self._sink = None
+        self._flux_status = Ack.Okay
+        self._index_times: List[int] = []
+
+    ## Pyserial interface.
+
+    @property
+    def baudrate(self) -> int:
+        return self._baud
+
+    @baudrate.setter
+    def baudrate(self, baud: int) -> None:
+        self._baud = baud
+        if baud == ControlCmd.ClearComms:
+            self.clear_comms()
+
+    def open(self) -> None:
+        self.is_open = True
+
+    def close(self) -> None:
+        self.is_open = False
+
+    def reset_input_buffer(self) -> None:
+        self._rx, self._rx_pos, self._rx_ready = bytearray(), 0, 0
+        # Times at which received data becomes available:
+        # (end offset in self._rx, monotonic time).
+        self._rx_times: List[Tuple[int, float]] = []
+
+    def reset_output_buffer(self) -> None:
+        pass
+
+    ## _ready: Offset in the receive buffer up to which data is available.
+    def _ready(self, now: float) -> int:
+        rx_times = self._rx_times
+        while rx_times and rx_times[0][1] <= now:
+            self._rx_ready = rx_times.pop(0)[0]
+        return self._rx_ready if rx_times else len(self._rx)
+
+    @property
+    def in_waiting(self) -> int:
+        return self._ready(time.monotonic()) - self._rx_pos
+
+    ## _wait: Wait until @n bytes are available, or as many as will be
+    ## received in response to the commands sent so far.
+    def _wait(self, n: int) -> int:
+        n = min(n, len(self._rx) - self._rx_pos)
+        end = self._rx_pos + n
+        while self._ready(time.monotonic()) < end:
+            t = next(t for off, t in self._rx_times if off >= end)
+            time.sleep(max(t - time.monotonic(), 0))
+        return n
+
+    def read(self, n: int = 1) -> bytes:
+        n = self._wait(n)
+        dat = bytes(self._rx[self._rx_pos:self._rx_pos+n])
+        self._consume(n)
+        return dat
+
+    def readinto(self, b) -> int:
+        n = self._wait(len(b))
+        b[:n] = self._rx[self._rx_pos:self._rx_pos+n]
+        self._consume(n)
+        return n
+
+    def _consume(self, n: int) -> None:
+        self._rx_pos += n
+        if self._rx_pos == len(self._rx) and not self._rx_times:
+            self.reset_input_buffer()
+
+    def write(self, dat) -> int:
+        self._tx += dat
+        self._process()
+        return len(dat)
+
+    ## Virtual time.
+
+    ## _now: Current disk time, in ticks. In realtime mode, the disk keeps
+    ## rotating while the host is busy.
+    def _now(self) -> int:
+        if self.realtime:
+            wall = round((time.monotonic() - self._epoch) * self.sample_freq)
+            self._ticks = max(self._ticks, wall)
+        return self._ticks
+
+    ## _respond: Queue response data @dat. Each (offset, ticks) in @points
+    ## marks the disk time at which dat[:offset] is complete. The response
+    ## is sent after receiving @rx_bytes of data from the host.
+    def _respond(self, dat: bytes,
+                 points: Optional[List[Tuple[int,int]]] = None,
+                 rx_bytes: int = 0) -> None:
+        if not (self.realtime or self.bandwidth):
+            self._rx += dat
+            return
+        now = time.monotonic()
+        rx_times, base = self._rx_times, len(self._rx)
+        if not rx_times:
+            self._rx_ready = base
+        # Data is transmitted after any already queued.
+        prev = rx_times[-1][1] if rx_times else now
+        if self.bandwidth:
+            now += rx_bytes / self.bandwidth
+        for off, ticks in points or [(len(dat), 0)]:
+            t = now
+            if self.realtime:
+                t = max(t, self._epoch + ticks / self.sample_freq)
+            if self.bandwidth:
+                t = max(t, max(prev, now) + off / self.bandwidth)
+            t = max(t, rx_times[-1][1] if rx_times else t)
+            rx_times.append((base + off, t))
+        self._rx += dat
+
+    def _delay(self, ticks: float) -> None:
+        self._ticks = self._now() + round(ticks)
+
+    ## Command processing.
+
+    def _process(self) -> None:
+        tx = self._tx
+        while True:
+            if self._sink is not None:
+                if not self._sink():
+                    return
+                continue
+            if len(tx) < 2 or len(tx) < tx[1]:
+                return
+            cmd = bytes(tx[:tx[1]])
+            del tx[:tx[1]]
+            self._command(cmd)
+
+    def _ack(self, cmd: bytes, ack: int = Ack.Okay,
+             dat: bytes = b'') -> None:
+        self._respond(bytes([cmd[0], ack]) + dat)
+
+    def _command(self, cmd: bytes) -> None:
+        c, n = cmd[0], len(cmd)
+        fn = self._commands.get(c)
+        if fn is None or n < 2:
+            self._ack(cmd, Ack.BadCommand)
+            return
+        try:
+            fn(self, cmd)
+        except struct.error:
+            self._ack(cmd, Ack.BadCommand)
+
+    def _get_info(self, cmd: bytes) -> None:
+        idx, = struct.unpack('2xB', cmd)
+        if idx == GetInfo.Firmware:
+            dat = struct.pack('<4BI4B3H14x', *VERSION, 1, Cmd.NoClickStep,
+                              self.sample_freq, 0xff, 0, 1, 0, 0, 0, 0)
+        elif idx == GetInfo.BandwidthStats:
+            bw = round(self.bandwidth or 40e6)
+            dat = struct.pack('<4I16x', bw, 1000000, bw, 1000000)
+        elif idx == GetInfo.CurrentDrive:
+            flags = 0
+            if self.unit is not None:
+                if self.cyl_valid:
+                    flags |= 1
+                if self.motor[self.unit]:
+                    flags |= 2
+            dat = struct.pack('<Ii24x', flags, self.cyl)
+        else:
+            self._ack(cmd, Ack.BadCommand)
+            return
+        self._ack(cmd, dat=dat)
+
+    def _seek(self, cmd: bytes) -> None:
+        cyl, = struct.unpack('2xb' if len(cmd) == 3 else '<2xh', cmd)
+        if self.unit is None:
+            self._ack(cmd, Ack.NoUnit)
+            return
+        if not 0 <= cyl <= MAX_CYL:
+            self._ack(cmd, Ack.BadCylinder)
+            return
+        steps = abs(cyl - self.cyl) if self.cyl_valid else cyl + 80
+        if steps:
+            self._delay((steps * self.delays[1] * 1e-6
+                         + self.delays[2] * 1e-3) * self.sample_freq)
+        self.cyl, self.cyl_valid = cyl, True
+        self._ack(cmd)
+
+    def _head(self, cmd: bytes) -> None:
+        head, = struct.unpack('2xB', cmd)
+        self.head = head
+        self._ack(cmd, Ack.Okay if head <= 1 else Ack.BadCommand)
+
+    def _set_params(self, cmd: bytes) -> None:
+        if cmd[2] != Params.Delays:
+            self._ack(cmd, Ack.BadCommand)
+            return
+        dat = struct.pack('<8H', *self.delays)
+        dat = cmd[3:] + dat[len(cmd)-3:]
+        self.delays = list(struct.unpack('<8H', dat[:16]))
+        self._ack(cmd)
+
+    def _get_params(self, cmd: bytes) -> None:
+        idx, nr = struct.unpack('2x2B', cmd)
+        if idx != Params.Delays:
+            self._ack(cmd, Ack.BadCommand)
+            return
+        dat = struct.pack('<8H', *self.delays)
+        self._ack(cmd, dat=dat[:nr].ljust(nr, b'\0'))
+
+    def _motor(self, cmd: bytes) -> None:
+        unit, state = struct.unpack('2x2B', cmd)
+        if self.bus is None:
+            self._ack(cmd, Ack.NoBus)
+            return
+        if unit >= len(self.motor):
+            self._ack(cmd, Ack.BadUnit)
+            return
+        if state and not self.motor[unit]:
+            self._delay(self.delays[3] * 1e-3 * self.sample_freq)
+        self.motor[unit] = bool(state)
+        self._ack(cmd)
+
+    def _select(self, cmd: bytes) -> None:
+        unit, = struct.unpack('2xB', cmd)
+        if self.bus is None:
+            self._ack(cmd, Ack.NoBus)
+            return
+        if unit >= len(self.motor):
+            self._ack(cmd, Ack.BadUnit)
+            return
+        self.unit = unit
+        self._ack(cmd)
+
+    def _deselect(self, cmd: bytes) -> None:
+        self.unit = None
+        self._ack(cmd)
+
+    def _set_bus_type(self, cmd: bytes) -> None:
+        bus, = struct.unpack('2xB', cmd)
+        if bus not in (1, 2):
+            self._ack(cmd, Ack.BadCommand)
+            return
+        self.bus, self.unit, self.cyl_valid = bus, None, False
+        self._ack(cmd)
+
+    def _set_pin(self, cmd: bytes) -> None:
+        pin, level = struct.unpack('2x2B', cmd)
+        self._ack(cmd, Ack.Okay if pin in (2, 4, 6) else Ack.BadPin)
+
+    def _get_pin(self, cmd: bytes) -> None:
+        pin, = struct.unpack('2xB', cmd)
+        selected = self.unit is not None
+        if pin == 26:
+            level = not (selected and self.cyl == 0)
+        elif pin == 28:
+            level = not (selected and self.wrprot)
+        elif pin in (8, 34):
+            level = True
+        else:
+            self._ack(cmd, Ack.BadPin)
+            return
+        self._ack(cmd, dat=bytes([int(level)]))
+
+    def _reset(self, cmd: bytes) -> None:
+        self.power_on_reset()
+        self._ack(cmd)
+
+    def _switch_fw_mode(self, cmd: bytes) -> None:
+        mode, = struct.unpack('2xB', cmd)
+        self._ack(cmd, Ack.Okay if mode == 1 else Ack.BadCommand)
+
+    def _no_click_step(self, cmd: bytes) -> None:
+        self._ack(cmd, Ack.Okay if self.unit is not None else Ack.NoUnit)
+
+    ## _track: The track under the selected drive's heads, or None if the
+    ## drive is not ready.
+    def _track(self) -> Optional[Track]:
+        if self.unit is None or not self.motor[self.unit]:
+            return None
+        key = (self.cyl, self.head)
+        t = self.written.get(key) or self.tracks.get(key)
+        if t is None:
+            flux = None
+            if self.image is not None:
+                flux = self.image.get_track(*key)
+            if flux is not None:
+                flux = flux.flux()
+            if flux is None or not flux.index_list:
+                period = round(60 * self.sample_freq / (self.rpm or 300))
+                t = Track(period, [])
+            else:
+                t = Track.from_flux(flux, self.sample_freq, self.rpm)
+            self.tracks[key] = t
+        return t
+
+    def _read_flux(self, cmd: bytes) -> None:
+        ticks, max_index = struct.unpack('<2xIH', cmd)
+        if self.unit is None:
+            self._ack(cmd, Ack.NoUnit)
+            return
+        self._ack(cmd)
+        start = self._now()
+        if ticks == 0 and max_index == 0:
+            max_index = 1
+        limit = start + ticks if ticks else None
+        track = self._track()
+        self._index_times = []
+        if track is None:
+            # No index pulses: Time out after 2 seconds like real firmware.
+            end = start + (ticks or 2 * self.sample_freq)
+            self._flux_status = Ack.NoIndex if max_index else Ack.Okay
+            self._ticks = end
+            self._respond(b'\0', [(1, end)])
+            return
+        self._flux_status = Ack.Okay
+        dat, points = bytearray(), []
+        p, last, k = track.period, start, start // track.period
+        prev_index = start
+        while True:
+            base = k * p
+            if base > start:
+                if limit is not None and base > limit:
+                    end = limit
+                    break
+                dat += op28(FluxOp.Index, base - last)
+                self._index_times.append(base - prev_index)
+                prev_index = base
+                points.append((len(dat), base))
+                if max_index and len(self._index_times) >= max_index:
+                    end = base
+                    break
+            rev, diffs = track.rev(k), track.diffs(k)
+            lo = bisect.bisect_right(rev, start - base) if base <= start else 0
+            hi = len(rev)
+            if limit is not None and limit < base + p:
+                hi = bisect.bisect_right(rev, limit - base)
+            # Split the revolution into chunks which arrive progressively.
+            for i in range(lo, hi, 2048):
+                j = min(i + 2048, hi)
+                seg = array('q', [base + rev[i] - last]) + diffs[i+1:j]
+                dat += encode_flux(seg)
+                last = base + rev[j-1]
+                points.append((len(dat), last))
+            if limit is not None and limit < base + p:
+                end = limit
+                break
+            k += 1
+        dat.append(0)
+        points.append((len(dat), end))
+        self._ticks = end
+        self._respond(bytes(dat), points)
+
+    def _get_flux_status(self, cmd: bytes) -> None:
+        self._ack(cmd, self._flux_status)
+
+    def _get_index_times(self, cmd: bytes) -> None:
+        first, nr = struct.unpack('2x2B', cmd)
+        # Reject what real firmware rejects: It records only this many.
+        if first + nr > MAX_INDEX_TIMES:
+            self._ack(cmd, Ack.BadCommand)
+            return
+        times = self._index_times[first:first+nr]
+        times += [0] * (nr - len(times))
+        self._ack(cmd, dat=struct.pack(f'<{nr}I', *times))
+
+    def _write_flux(self, cmd: bytes) -> None:
+        cue_at_index, terminate_at_index = struct.unpack('2x2B', cmd[:4])
+        if self.unit is None:
+            self._ack(cmd, Ack.NoUnit)
+            return
+        if self.wrprot:
+            self._ack(cmd, Ack.Wrprot)
+            return
+        self._ack(cmd)
+        def sink() -> bool:
+            end = self._tx.find(0)
+            if end < 0:
+                return False
+            dat = bytes(self._tx[:end+1])
+            del self._tx[:end+1]
+            self._sink = None
+            self._write(decode_write_stream(dat), bool(cue_at_index),
+                        bool(terminate_at_index), len(dat))
+            return True
+        self._sink = sink
+
+    def _write(self, flux: List[int], cue_at_index: bool,
+               terminate_at_index: bool, rx_bytes: int) -> None:
+        track = self._track()
+        start = self._now()
+        if track is None:
+            self._flux_status = Ack.NoIndex
+            self._respond(b'\0', rx_bytes = rx_bytes)
+            return
+        p = track.period
+        if cue_at_index:
+            start = -(-start // p) * p
+        # The final (dummy) flux is never written.
+        pos = list(it.accumulate(flux[:-1], initial=start))[1:]
+        end = pos[-1] if pos else start
+        if terminate_at_index:
+            end = min(end, (start // p + 1) * p)
+            pos = [x for x in pos if x <= end]
+        track.overwrite(start, end, pos)
+        self.written[(self.cyl, self.head)] = track
+        self._flux_status = Ack.Okay
+        self._ticks = end
+        self._respond(b'\0', [(1, end)], rx_bytes)
+
+    def _erase_flux(self, cmd: bytes) -> None:
+        ticks, = struct.unpack('<2xI', cmd)
+        if self.unit is None:
+            self._ack(cmd, Ack.NoUnit)
+            return
+        if self.wrprot:
+            self._ack(cmd, Ack.Wrprot)
+            return
+        self._ack(cmd)
+        track = self._track()
+        start = self._now()
+        if track is None:
+            self._flux_status = Ack.NoIndex
+            self._respond(b'\0')
+            return
+        track.overwrite(start, start + ticks, [])
+        self.written[(self.cyl, self.head)] = track
+        self._flux_status = Ack.Okay
+        self._ticks = start + ticks
+        self._respond(b'\0', [(1, self._ticks)])
+
+    def _source_bytes(self, cmd: bytes) -> None:
+        nr, seed = struct.unpack('<2x2I', cmd)
+        self._ack(cmd)
+        self._respond(random_bytes(nr, seed))
+
+    def _sink_bytes(self, cmd: bytes) -> None:
+        nr, seed = struct.unpack('<2x2I', cmd)
+        self._ack(cmd)
+        def sink() -> bool:
+            if len(self._tx) < nr:
+                return False
+            dat = bytes(self._tx[:nr])
+            del self._tx[:nr]
+            self._sink = None
+            self._respond(bytes([dat != random_bytes(nr, seed)]),
+                          rx_bytes = nr)
+            return True
+        self._sink = sink
+
+    _commands = {
+        Cmd.GetInfo: _get_info,
+        Cmd.Seek: _seek,
+        Cmd.Head: _head,
+        Cmd.SetParams: _set_params,
+        Cmd.GetParams: _get_params,
+        Cmd.Motor: _motor,
+        Cmd.ReadFlux: _read_flux,
+        Cmd.WriteFlux: _write_flux,
+        Cmd.GetFluxStatus: _get_flux_status,
+        Cmd.GetIndexTimes: _get_index_times,
+        Cmd.SwitchFwMode: _switch_fw_mode,
+        Cmd.Select: _select,
+        Cmd.Deselect: _deselect,
+        Cmd.SetBusType: _set_bus_type,
+        Cmd.SetPin: _set_pin,
+        Cmd.Reset: _reset,
+        Cmd.EraseFlux: _erase_flux,
+        Cmd.SourceBytes: _source_bytes,
+        Cmd.SinkBytes: _sink_bytes,
+        Cmd.GetPin: _get_pin,
+        Cmd.NoClickStep: _no_click_step
+    }
+
+    ## save: Write the tracks written so far to the output image, if any.
+    def save(self) -> None:
+        if self.out is None or not self.written:
+            return
+        from greaseweazle.tools import util
+        image_class = util.get_image_class(self.out)
+        with image_class.to_file(self.out, None, False, dict()) as image:
+            for (cyl, head), t in sorted(self.written.items()):
+                rev = t.rev(0)
+                fl = [b - a for a, b in zip(it.chain([0], rev), rev)]
+                fl.append(t.period - (rev[-1] if rev else 0))
+                image.emit_track(cyl, head, Flux([t.period], fl,
+                                                 self.sample_freq))
+
+
+def random_bytes(nr: int, seed: int) -> bytes:
+    dat = bytearray()
+    r = seed
+    for i in range(nr):
+        dat.append(r&255)
+        if r & 1:
+            r = (r>>1) ^ 0x80000062
+        else:
+            r >>= 1
+    return bytes(dat)
+
+
+## open_device: Create a virtual Greaseweazle from a device specification
+## of the form <image>[::opt=val[:opt=val...]]. Options:
+##  out=<image>   Save written tracks to <image> on exit
+##  rpm=<n>       Rotate the disk at <n> rpm (default: as imaged)
+##  bandwidth=<n> Limit USB transfers to <n> bytes/sec
+##  realtime      Take as long as a real drive
+##  wrprot        Disk is write protected
+def open_device(spec: str) -> VirtualGreaseweazle:
+    import atexit
+    from greaseweazle.tools import util
+    name, opts = util.split_opts(spec)
+    image = None
+    if name:
+        image = util.get_image_class(name).from_file(name, None, dict())
+    def _float(opt: str) -> Optional[float]:
+        if opt not in opts:
+            return None
+        try:
+            return float(opts.pop(opt))
+        except ValueError:
+            raise error.Fatal(f'virtual: bad {opt} value')
+    rpm, bandwidth = _float('rpm'), _float('bandwidth')
+    dev = VirtualGreaseweazle(image, out = opts.pop('out', None),
+                              rpm = rpm, bandwidth = bandwidth,
+                              realtime = 'realtime' in opts,
+                              wrprot = 'wrprot' in opts)
+    opts.pop('realtime', None)
+    opts.pop('wrprot', None)
+    error.check(not opts, 'virtual: unknown option(s): ' + ', '.join(opts))
+    atexit.register(dev.save)
+    return dev
+
+
+# Local variables:
+# python-indent: 4
+# End: